@@ -0,0 +1,35 @@
+"""
+Configuración de gunicorn: la carga sola al arrancar desde la raíz del proyecto
+(render.yaml y Dockerfile).
+
+Los ganchos mantienen METRICAS_DIR (store/metrics.py) en el proceso master:
+vacía las instantáneas de la ejecución anterior al arrancar y consolida las de
+cada worker que termina.
+"""
+
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# settings.py aún no se ha cargado en el master: el .env se lee igual que allí
+load_dotenv(Path(__file__).resolve().parent / ".env")
+
+
+def on_starting(server):
+    directorio = os.environ.get("METRICAS_DIR")
+    if directorio:
+        from store.metrics import limpiar_directorio
+
+        limpiar_directorio(directorio)
+
+
+def child_exit(server, worker):
+    directorio = os.environ.get("METRICAS_DIR")
+    if directorio:
+        from store.metrics import consolidar
+
+        try:
+            consolidar(directorio, worker.pid)
+        except OSError:
+            server.log.exception("No se pudieron consolidar las métricas de %s", worker.pid)
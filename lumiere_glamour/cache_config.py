@@ -0,0 +1,38 @@
+"""
+Configuración de la caché a partir de una URL (variable CACHE_URL).
+
+Vive fuera de settings.py para poder importarla sin cargar los ajustes del
+proyecto: la usan settings.py, el comando benchmark_cache y las pruebas.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+LOCMEM = "django.core.cache.backends.locmem.LocMemCache"
+
+
+def cache_desde_url(url):
+    """
+    Configuración de un backend de caché a partir de CACHE_URL. Un esquema
+    desconocido (o mal escrito, como "redis:/host") lanza ImproperlyConfigured en
+    lugar de caer en silencio a la memoria del proceso.
+    """
+    if url.startswith(("redis://", "rediss://")):
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": url,
+        }
+    if url.startswith("file://") and len(url) > len("file://"):
+        return {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": url[len("file://"):],
+        }
+    if url in ("", "locmem://"):
+        return {"BACKEND": LOCMEM, "LOCATION": "lumiere-glamour"}
+    raise ImproperlyConfigured(
+        f"Unsupported CACHE_URL {url!r}: use redis://, rediss://, file:///path or locmem://"
+    )
+
+
+def es_compartida(configuracion):
+    """True si todos los procesos de la máquina ven la misma caché (no LocMem)."""
+    return configuracion["BACKEND"] != LOCMEM
@@ -1,10 +1,14 @@
 # Updated settings.py
 import os
+import sys
 from pathlib import Path
 
 import dj_database_url 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
+from lumiere_glamour.cache_config import cache_desde_url, es_compartida
+
 # Definir primero BASE_DIR
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -24,6 +28,9 @@ SECRET_KEY = os.environ.get(
 # DEBUG debe ser False en producción
 DEBUG = os.environ.get("DEBUG", "False").lower() == "true"
 
+# manage.py test: algunos ajustes de producción (caché compartida, Cloudinary) no aplican
+EJECUTANDO_PRUEBAS = sys.argv[1:2] == ["test"]
+
 # --- Seguridad y proxy detrás de Railway/Render ---
 
 # Fuerza HTTPS en producción (si no estás depurando)
@@ -95,6 +102,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para que el tiempo total incluya todo lo demás; inactivo salvo
+    # que INSTRUMENTACION_MUESTREO sea mayor que 0
+    "store.middleware.InstrumentacionMiddleware",
+    # Detector de N+1 para desarrollo y CI; inactivo salvo INSPECCION_CONSULTAS
+    "store.middleware.InspeccionConsultasMiddleware",
+    # Métricas para /metrics; inactivo salvo METRICAS_ACTIVAS
+    "store.middleware.MetricasMiddleware",
     "django.middleware.security.SecurityMiddleware",
     # NUEVO: Coloca este middleware justo después de SecurityMiddleware, como se solicitó.
     # Esto asegura que las redirecciones al dominio canónico se manejen muy pronto en la petición.
@@ -106,9 +120,32 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    #"store.middleware.CategoriaCacheMiddleware",
+    # Caché de página completa para anónimos; va después de CSRF y Auth (ver su docstring)
+    "store.middleware.PaginaCacheMiddleware",
 ]
 
+# Segundos que se guarda cada página del catálogo en la caché (0 la desactiva)
+PAGE_CACHE_TIMEOUT = int(os.environ.get("PAGE_CACHE_TIMEOUT", "600"))
+
+# Fracción de peticiones instrumentadas con Server-Timing y log (0 = desactivado,
+# 1 = todas). Ver store/middleware.py: InstrumentacionMiddleware
+INSTRUMENTACION_MUESTREO = float(os.environ.get("INSTRUMENTACION_MUESTREO", "0"))
+
+# Detector de consultas repetidas y lentas (store/query_inspection.py):
+# "" desactivado, "log" avisa en el log, "error" además hace fallar la petición
+INSPECCION_CONSULTAS = os.environ.get("INSPECCION_CONSULTAS", "")
+CONSULTAS_REPETIDAS_UMBRAL = int(os.environ.get("CONSULTAS_REPETIDAS_UMBRAL", "3"))
+CONSULTA_LENTA_MS = int(os.environ.get("CONSULTA_LENTA_MS", "100"))
+
+# Métricas en formato Prometheus en /metrics (store/metrics.py). Con varios
+# workers de gunicorn, METRICAS_DIR es un directorio compartido donde cada
+# proceso vuelca las suyas cada METRICAS_INTERVALO segundos (gunicorn.conf.py lo
+# vacía al arrancar); METRICAS_TOKEN exige "Authorization: Bearer <token>".
+METRICAS_ACTIVAS = os.environ.get("METRICAS_ACTIVAS", "False").lower() == "true"
+METRICAS_TOKEN = os.environ.get("METRICAS_TOKEN", "")
+METRICAS_DIR = os.environ.get("METRICAS_DIR", "")
+METRICAS_INTERVALO = int(os.environ.get("METRICAS_INTERVALO", "5"))
+
 ROOT_URLCONF = "lumiere_glamour.urls"
 
 TEMPLATES = [
@@ -128,6 +165,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "store.context_processors.configuracion_sitio",
             ],
         },
     },
@@ -155,6 +193,33 @@ DATABASES = {
     )
 }
 
+# --- Caché compartida ---
+# CACHE_URL elige el backend:
+#   redis://host:6379/0 (o rediss://)  -> Redis, compartido por todos los workers de gunicorn
+#   file:///ruta/a/carpeta             -> archivos en disco, compartido en una sola máquina
+#   locmem:// o vacío                  -> memoria del proceso (desarrollo y pruebas)
+# Los contadores de generación de store/cache.py (invalidación por señales) viven
+# en esta caché: con LocMem un cambio en el admin solo invalida el worker que lo
+# atendió. Por eso en producción (DEBUG False) se exige un backend compartido;
+# SKIP_DB_CHECK también lo salta para pasos de build como collectstatic.
+CACHE_URL = os.environ.get("CACHE_URL", "")
+CACHE_DEFAULT = cache_desde_url(CACHE_URL)
+if not (DEBUG or SKIP_DB_CHECK or EJECUTANDO_PRUEBAS) and not es_compartida(CACHE_DEFAULT):
+    raise ImproperlyConfigured(
+        "CACHE_URL must point to a shared cache (redis:// or file://) in production"
+    )
+
+CACHES = {
+    "default": {
+        **CACHE_DEFAULT,
+        # El prefijo separa varios entornos sobre el mismo Redis; subir la versión
+        # descarta de golpe todas las claves tras un despliegue incompatible.
+        "KEY_PREFIX": os.environ.get("CACHE_KEY_PREFIX", "lumiere"),
+        "VERSION": int(os.environ.get("CACHE_VERSION", "1")),
+        "TIMEOUT": 60 * 60,
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -222,6 +287,14 @@ CLOUDINARY_STORAGE = {
     "SECURE": True,
 }
 
+# Sin CLOUDINARY_CLOUD_NAME las URLs de imagen se construyen con una nube ficticia
+# ("local") para que las plantillas rendericen; solo en desarrollo y pruebas. En
+# producción la falta de credenciales debe fallar ("Must supply cloud_name").
+CLOUDINARY_NUBE_LOCAL = (
+    os.environ.get("CLOUDINARY_NUBE_LOCAL", str(DEBUG or EJECUTANDO_PRUEBAS)).lower()
+    == "true"
+)
+
 # Configura Cloudinary como el sistema de almacenamiento por defecto para archivos de medios
 DEFAULT_FILE_STORAGE = "cloudinary_storage.storage.MediaCloudinaryStorage"
 
@@ -240,4 +313,24 @@ LOGIN_REDIRECT_URL = "/"
 
 # Configuración para el número de WhatsApp (si no lo tienes en SiteSetting)
 # Esto es un fallback, la idea es que venga de SiteSetting en la DB
-WHATSAPP_NUMBER = os.environ.get("WHATSAPP_NUMBER", "573007221200")
\ No newline at end of file
+WHATSAPP_NUMBER = os.environ.get("WHATSAPP_NUMBER", "573007221200")
+# Logs a la consola (los recoge la plataforma de despliegue). LOG_LEVEL=DEBUG
+# muestra también los mensajes de depuración de las vistas de la tienda.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "simple": {"format": "{levelname} {name} {message}", "style": "{"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "simple"},
+    },
+    "root": {"handlers": ["console"], "level": "WARNING"},
+    "loggers": {
+        "store": {
+            "handlers": ["console"],
+            "level": os.environ.get("LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
@@ -305,7 +305,9 @@ window.toggleSubmenu = function(button) {
 
 // --- Lógica de selección de color para variantes de producto ---
 function setupColorOptions() {
-    document.querySelectorAll('.color-option').forEach(colorOption => {
+    // :not([data-listo]) evita duplicar escuchadores en tarjetas cargadas por scroll infinito
+    document.querySelectorAll('.color-option:not([data-listo])').forEach(colorOption => {
+        colorOption.dataset.listo = '1';
         colorOption.addEventListener('click', function() {
             const parentProductDiv = this.closest('[data-product-id]');
             const productId = parentProductDiv ? parentProductDiv.dataset.productId : null;
@@ -345,7 +347,8 @@ function setupColorOptions() {
 
 // Lógica para el botón de "más colores"
 function setupMoreColorsButton() {
-    document.querySelectorAll('.more-colors-button').forEach(button => {
+    document.querySelectorAll('.more-colors-button:not([data-listo])').forEach(button => {
+        button.dataset.listo = '1';
         button.addEventListener('click', function() {
             const productId = this.dataset.productId;
             const additionalColorsContainer = document.getElementById(`additional-colors-${productId}`);
@@ -359,9 +362,10 @@ function setupMoreColorsButton() {
 
 // Lógica para añadir al carrito (unificada para todos los botones .btn-agregar-carrito)
 function setupAddToCartButtons() {
-    const botonesAgregar = document.querySelectorAll(".btn-agregar-carrito");
+    const botonesAgregar = document.querySelectorAll(".btn-agregar-carrito:not([data-listo])");
 
     botonesAgregar.forEach(function (boton) {
+        boton.dataset.listo = '1';
         boton.addEventListener("click", function () {
             const productId = boton.getAttribute("data-product-id");
             const productName = boton.getAttribute("data-product-name");
@@ -632,6 +636,14 @@ document.addEventListener("DOMContentLoaded", function () {
     setupMoreColorsButton();
     setupAddToCartButtons();
 
+    // Tarjetas añadidas por pagination.js (scroll infinito o cambio de página)
+    document.addEventListener('productos:cargados', function () {
+        setupColorOptions();
+        setupMoreColorsButton();
+        setupAddToCartButtons();
+        updateFavoritesView();
+    });
+
     // --- Miniaturas que cambian la imagen principal (detalle de producto) ---
     const mainImage = document.getElementById("main-product-image");
     const thumbnails = document.querySelectorAll(".thumbnail-image");
@@ -639,7 +651,10 @@ document.addEventListener("DOMContentLoaded", function () {
     thumbnails.forEach((thumbnail) => {
         thumbnail.addEventListener("click", function () {
             if (mainImage) {
-                mainImage.src = this.src;
+                // La miniatura es una variante pequeña: se muestra la grande y se quita
+                // el srcset de la imagen anterior para que el navegador no lo prefiera
+                mainImage.removeAttribute("srcset");
+                mainImage.src = this.dataset.imagenGrande || this.src;
             }
             thumbnails.forEach(t => t.classList.remove("ring-2", "ring-pink-500"));
             this.classList.add("ring-2", "ring-pink-500");
@@ -42,7 +42,8 @@ document.addEventListener('DOMContentLoaded', function() {
     function setupPaginationListeners() {
         if (!paginacionContainer) return;
 
-        const paginationLinks = paginacionContainer.querySelectorAll('a[href]');
+        // "Ver más productos" (paginación por cursor) se maneja con cargarSiguientePagina
+        const paginationLinks = paginacionContainer.querySelectorAll('a[href]:not(.btn-ver-mas)');
 
         paginationLinks.forEach(link => {
             // Elimina escuchadores anteriores para evitar duplicados
@@ -69,7 +70,8 @@ document.addEventListener('DOMContentLoaded', function() {
         showLoading();
 
         try {
-            const response = await fetch(url);
+            // X-Fragment: el servidor devuelve solo la cuadrícula y el paginador
+            const response = await fetch(url, { headers: { 'X-Fragment': '1' } });
             console.log("DEBUG → Estado de la respuesta:", response.status);
 
             if (!response.ok) {
@@ -78,7 +80,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
             const html = await response.text();
 
-            // Parsea el HTML recibido en un documento temporal
+            // Parsea el fragmento recibido en un documento temporal
             const parser = new DOMParser();
             const doc = parser.parseFromString(html, 'text/html');
 
@@ -100,6 +102,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
             // Vuelve a asignar los eventos a los nuevos enlaces de paginación
             setupPaginationListeners();
+            notificarProductosCargados();
             
             // Llama a la función de animaciones si existe
             if (typeof initProductAnimations === 'function') {
@@ -113,6 +116,88 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    /**
+     * Avisa a main.js (carrito, colores, favoritos) de que hay tarjetas nuevas.
+     */
+    function notificarProductosCargados() {
+        document.dispatchEvent(new CustomEvent('productos:cargados'));
+    }
+
+    // =================================================================
+    // Scroll infinito con paginación por cursor
+    // El servidor deja en #productos-grid la URL de /api/productos/ para la
+    // página siguiente; cada carga es una sola consulta por rango en la BD.
+    // =================================================================
+    let cargandoSiguiente = false;
+
+    async function cargarSiguientePagina() {
+        if (!productosContainer || cargandoSiguiente) return;
+        const url = productosContainer.dataset.siguienteUrl;
+        if (!url) return;
+
+        cargandoSiguiente = true;
+        if (loadingSpinner) loadingSpinner.classList.remove('hidden');
+        try {
+            const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+            if (!response.ok) {
+                throw new Error('La respuesta de la red no fue exitosa');
+            }
+            const data = await response.json();
+            productosContainer.insertAdjacentHTML('beforeend', data.html);
+
+            if (data.siguiente_url) {
+                productosContainer.dataset.siguienteUrl = data.siguiente_url;
+            } else {
+                delete productosContainer.dataset.siguienteUrl;
+                finalizarScrollInfinito();
+            }
+            notificarProductosCargados();
+            if (typeof initProductAnimations === 'function') {
+                initProductAnimations();
+            }
+        } catch (error) {
+            console.error("Error al cargar más productos:", error);
+        } finally {
+            cargandoSiguiente = false;
+            if (loadingSpinner) loadingSpinner.classList.add('hidden');
+        }
+    }
+
+    let observador = null;
+    let centinela = null;
+
+    function finalizarScrollInfinito() {
+        if (observador) observador.disconnect();
+        if (centinela) centinela.remove();
+        const verMas = paginacionContainer ? paginacionContainer.querySelector('.btn-ver-mas') : null;
+        if (verMas) verMas.remove();
+    }
+
+    function setupScrollInfinito() {
+        if (!productosContainer || !productosContainer.dataset.siguienteUrl) return;
+
+        const verMas = paginacionContainer ? paginacionContainer.querySelector('.btn-ver-mas') : null;
+        if (verMas) {
+            verMas.addEventListener('click', function(e) {
+                e.preventDefault();
+                cargarSiguientePagina();
+            });
+        }
+
+        if (!('IntersectionObserver' in window)) return; // Queda el botón "Ver más"
+
+        centinela = document.createElement('div');
+        centinela.setAttribute('aria-hidden', 'true');
+        productosContainer.after(centinela);
+        observador = new IntersectionObserver((entradas) => {
+            if (entradas.some(entrada => entrada.isIntersecting)) {
+                cargarSiguientePagina();
+            }
+        }, { rootMargin: '600px 0px' });
+        observador.observe(centinela);
+    }
+
     // Llama a la función al inicio para que los enlaces de la primera página funcionen
     setupPaginationListeners();
+    setupScrollInfinito();
 });
\ No newline at end of file
@@ -116,6 +116,7 @@ class ProductoAdmin(admin.ModelAdmin):
         "categoria",
         "precio",
         "descuento",
+        "precio_final",
         "is_active",
         "stock",
         "fecha_creacion",
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "store"
+
+    def ready(self):
+        # Registra los receptores de señales (invalidación de cachés, etc.)
+        from . import signals  # noqa: F401
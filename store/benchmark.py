@@ -0,0 +1,260 @@
+"""
+Banco de pruebas de rendimiento de las vistas del catálogo (comando
+benchmark_catalog).
+
+sembrar_catalogo() crea un catálogo sintético con bulk_create: un árbol de
+categorías de varios niveles, productos con imágenes y variaciones, y dos
+categorías "escala" con pocos y con una página completa de productos. medir()
+recorre las vistas con el cliente de pruebas y registra consultas, latencias
+(p50/p95) y memoria asignada (tracemalloc). escalado() compara las consultas de
+cada vista con pocos y con muchos elementos: si crecen hay un N+1.
+"""
+
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .pagination import PRODUCTOS_POR_PAGINA
+
+PREFIJO = "bench"
+# Elementos de la variante pequeña del escalado; la grande es una página completa
+ESCALA_PEQUENA = 2
+
+
+def percentil(valores, p):
+    """Percentil 'p' (0-100) por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    indice = min(len(ordenados) - 1, round(p / 100 * (len(ordenados) - 1)))
+    return ordenados[indice]
+
+
+# --- Catálogo sintético ---
+
+
+def _crear_productos(categorias, cantidad, variaciones, imagenes, nombre, inicio=0):
+    from .models import ProductImage, Producto, Variacion
+
+    productos = []
+    for i in range(inicio, inicio + cantidad):
+        producto = Producto(
+            nombre=f"{nombre} {i}",
+            slug=f"{PREFIJO}-{nombre.lower().replace(' ', '-')}-{i}",
+            categoria=categorias[i % len(categorias)],
+            precio=Decimal(1000 + (i * 37) % 90000),
+            descuento=Decimal("0.10") if i % 4 == 0 else Decimal("0"),
+            stock=i % 50,
+            badge=("", "nuevo", "tendencia", "oferta")[i % 4],
+            descripcion=f"Producto sintético número {i} para el benchmark.",
+            imagen=f"{PREFIJO}/producto-{i}",
+        )
+        producto.search_document = producto.build_search_document()
+        productos.append(producto)
+    Producto.objects.bulk_create(productos, batch_size=500)
+
+    Variacion.objects.bulk_create(
+        [
+            Variacion(
+                producto=producto,
+                nombre="Tono",
+                valor=f"Tono {j}",
+                color_hex=f"#{(j * 40) % 256:02x}3366",
+                price_override=Decimal(2000 + j * 100) if j % 2 else None,
+            )
+            for producto in productos
+            for j in range(variaciones)
+        ],
+        batch_size=500,
+    )
+    ProductImage.objects.bulk_create(
+        [
+            ProductImage(
+                producto=producto,
+                image=f"{PREFIJO}/galeria-{producto.pk}-{j}",
+                alt_text=f"{producto.nombre} {j}",
+                order=j,
+            )
+            for producto in productos
+            for j in range(imagenes)
+        ],
+        batch_size=500,
+    )
+    return productos
+
+
+def sembrar_catalogo(productos=2000, profundidad=3, ramas=3, variaciones=3, imagenes=2):
+    """
+    Crea el catálogo sintético y devuelve lo que necesitan los escenarios: las
+    categorías y productos de escala pequeña y grande.
+    """
+    from .models import Categoria
+    from .typeahead import invalidar as invalidar_typeahead
+
+    # Categoria.save() mantiene la ruta materializada: el árbol es pequeño
+    nivel = [None]
+    hojas = []
+    for n in range(profundidad):
+        siguiente = []
+        for padre in nivel:
+            for r in range(ramas):
+                sufijo = f"{padre.pk}-{r}" if padre else str(r)
+                siguiente.append(
+                    Categoria.objects.create(
+                        nombre=f"Categoría {n}-{sufijo}",
+                        slug=f"{PREFIJO}-{n}-{sufijo}",
+                        padre=padre,
+                    )
+                )
+        nivel = siguiente
+        hojas = siguiente
+    _crear_productos(hojas, productos, variaciones, imagenes, "Producto")
+
+    escala = {}
+    for tamano, cantidad in (("pequena", ESCALA_PEQUENA), ("grande", PRODUCTOS_POR_PAGINA)):
+        categoria = Categoria.objects.create(
+            nombre=f"Escala {tamano}", slug=f"{PREFIJO}-escala-{tamano}"
+        )
+        # La variante grande también tiene más variaciones e imágenes por producto
+        extra = 1 if tamano == "pequena" else max(variaciones, 3)
+        escala[tamano] = {
+            "categoria": categoria,
+            "productos": _crear_productos(
+                [categoria], cantidad, extra, extra, f"Escala {tamano}"
+            ),
+        }
+
+    # bulk_create no dispara señales: el índice del typeahead se reconstruye
+    invalidar_typeahead()
+    return escala
+
+
+# --- Escenarios ---
+
+
+def _carrito(client, productos):
+    """Guarda en la sesión del cliente un carrito con una línea por producto."""
+    cart = []
+    for producto in productos:
+        variacion = producto.variaciones.order_by("id").first()
+        # variant_id == id del producto significa "sin variación"
+        variant_id = producto.pk
+        if variacion is not None and variacion.pk != producto.pk:
+            variant_id = variacion.pk
+        cart.append(
+            {"id": producto.pk, "name": producto.nombre, "price": float(producto.precio_final),
+             "quantity": 1, "variant_id": variant_id, "color": "N/A", "imageUrl": ""}
+        )
+    session = client.session
+    session["cart"] = cart
+    session.save()
+
+
+def escenarios(escala):
+    """
+    {vista: {tamaño: (preparar(client), url)}} para "pequena" y "grande". Las
+    latencias y la memoria se miden con la variante grande.
+    """
+    resultado = {}
+    for tamano, datos in escala.items():
+        categoria, productos = datos["categoria"], datos["productos"]
+        ids = ",".join(str(p.pk) for p in productos)
+
+        def sin_preparar(client):
+            pass
+
+        def con_carrito(client, productos=productos):
+            _carrito(client, productos)
+
+        vistas = {
+            "inicio": (sin_preparar, f"{reverse('home')}?categoria={categoria.pk}"),
+            "productos_por_categoria": (
+                sin_preparar, reverse("categoria", args=[categoria.slug])
+            ),
+            "producto_detalle": (
+                sin_preparar, reverse("producto_detalle", args=[productos[0].pk])
+            ),
+            "ver_carrito": (con_carrito, reverse("ver_carrito")),
+            "api_buscar_productos": (
+                sin_preparar, f"{reverse('api_buscar_productos')}?q=escala+{tamano}"
+            ),
+            "api_favoritos": (sin_preparar, f"{reverse('api_favoritos')}?ids={ids}"),
+        }
+        for vista, escenario in vistas.items():
+            resultado.setdefault(vista, {})[tamano] = escenario
+    return resultado
+
+
+# --- Medición ---
+
+
+def _consultas(client, url, fria):
+    if fria:
+        cache.clear()
+    with CaptureQueriesContext(connection) as capturadas:
+        response = client.get(url, secure=True)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} respondió {response.status_code}")
+    return len(capturadas)
+
+
+def medir_vista(preparar, url, repeticiones=20):
+    """Consultas (en frío y en caliente), latencias y memoria de una URL."""
+    client = Client()
+    preparar(client)
+    frias = _consultas(client, url, fria=True)
+    calientes = _consultas(client, url, fria=False)
+
+    latencias = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        client.get(url, secure=True)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        client.get(url, secure=True)
+        actual, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "url": url,
+        "consultas_frio": frias,
+        "consultas_caliente": calientes,
+        "p50_ms": round(percentil(latencias, 50), 3),
+        "p95_ms": round(percentil(latencias, 95), 3),
+        "memoria_pico_kib": round(pico / 1024, 1),
+        "memoria_retenida_kib": round(actual / 1024, 1),
+    }
+
+
+def escalado(preparar_pequena, url_pequena, preparar_grande, url_grande):
+    """Consultas en frío con pocos y con muchos elementos; 'ok' si no crecen."""
+    consultas = {}
+    for tamano, preparar, url in (
+        ("pequena", preparar_pequena, url_pequena),
+        ("grande", preparar_grande, url_grande),
+    ):
+        client = Client()
+        preparar(client)
+        consultas[tamano] = _consultas(client, url, fria=True)
+    return {**consultas, "ok": consultas["grande"] <= consultas["pequena"]}
+
+
+def medir(escala, repeticiones=20):
+    """Ejecuta todos los escenarios: {vista: {...métricas, "escalado": {...}}}."""
+    resultados = {}
+    for vista, tamanos in escenarios(escala).items():
+        resultados[vista] = {
+            **medir_vista(*tamanos["grande"], repeticiones=repeticiones),
+            "escalado": escalado(*tamanos["pequena"], *tamanos["grande"]),
+        }
+    return resultados
@@ -0,0 +1,108 @@
+"""
+Utilidades de caché de la tienda.
+
+* Contadores de generación por espacio de nombres ("catalogo", ...) guardados en
+  la caché compartida. Las claves que incluyen la generación quedan invalidadas
+  de golpe cuando las señales la incrementan, sin tener que borrarlas una a una.
+* clave(): construye claves versionadas por espacio de nombres.
+* LRUCache: caché local al proceso, acotada en tamaño y con expiración (TTL).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+GENERACION_KEY = "store:generacion:{}"
+
+# Espacio de nombres que cubre productos, imágenes, variaciones y categorías
+CATALOGO = "catalogo"
+# Espacios de nombres por modelo para los fragmentos de plantilla cacheados
+CATEGORIAS = "categorias"
+MENU = "menu"
+ANUNCIOS = "anuncios"
+# Ajustes clave/valor del sitio (SiteSetting)
+CONFIGURACION = "configuracion"
+
+
+def _generacion_inicial():
+    # Se parte de la hora en milisegundos y no de 1: si la caché compartida se
+    # vacía, las generaciones nuevas nunca coinciden con las que aún guardan las
+    # cachés locales de los procesos.
+    return int(time.time() * 1000)
+
+
+def get_generacion(namespace):
+    """Devuelve la generación actual de un espacio de nombres."""
+    clave = GENERACION_KEY.format(namespace)
+    generacion = cache.get(clave)
+    if generacion is None:
+        cache.add(clave, _generacion_inicial(), None)
+        generacion = cache.get(clave)
+    return generacion
+
+
+def get_generaciones(*namespaces):
+    """Generaciones de varios espacios de nombres con una sola lectura de la caché."""
+    claves = {namespace: GENERACION_KEY.format(namespace) for namespace in namespaces}
+    encontradas = cache.get_many(list(claves.values()))
+    return [
+        encontradas[clave] if clave in encontradas else get_generacion(namespace)
+        for namespace, clave in claves.items()
+    ]
+
+
+def clave(namespace, *partes):
+    """
+    Clave "store:<namespace>:<generación>:<partes...>" para datos que dependen de
+    un espacio de nombres: queda obsoleta en cuanto las señales lo incrementan.
+    """
+    return ":".join(["store", namespace, str(get_generacion(namespace)), *map(str, partes)])
+
+
+def incrementar_generacion(namespace):
+    """Invalida todas las entradas cacheadas con la generación anterior."""
+    clave = GENERACION_KEY.format(namespace)
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        # La clave no existía (caché vacía o expulsada): se empieza de nuevo
+        cache.add(clave, _generacion_inicial(), None)
+        return cache.incr(clave)
+
+
+class LRUCache:
+    """Caché en memoria del proceso con tamaño máximo y tiempo de vida por entrada."""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return default
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return default
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
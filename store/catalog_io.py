@@ -0,0 +1,400 @@
+"""
+Importación y exportación masiva del catálogo (comandos import_catalog y
+export_catalog).
+
+Formato: un registro por producto, en CSV o JSON Lines. El slug del producto es
+la clave de sincronización: si ya existe se actualiza, si no se crea. Campos:
+
+    slug, nombre, categoria (slug), precio, descuento, stock, badge, is_active,
+    descripcion, imagen, variaciones, imagenes
+
+'variaciones' es una lista de objetos {nombre, valor, color, color_hex, tono,
+presentacion, price_override, imagen} y 'imagenes' una lista de imágenes de la
+galería (cadena de Cloudinary o {image, alt_text}). En CSV ambas columnas van
+codificadas como JSON. Un valor vacío no modifica el campo del producto.
+
+Los registros se procesan por lotes: cada lote resuelve categorías, productos y
+variaciones existentes con una consulta por tabla y escribe con bulk_create /
+bulk_update dentro de una transacción, sin el bucle de slugs de Producto.save().
+"""
+
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from cloudinary import CloudinaryResource
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+CAMPOS_PRODUCTO = (
+    "slug",
+    "nombre",
+    "categoria",
+    "precio",
+    "descuento",
+    "stock",
+    "badge",
+    "is_active",
+    "descripcion",
+    "imagen",
+)
+CAMPOS_VARIACION = (
+    "nombre",
+    "valor",
+    "color",
+    "color_hex",
+    "tono",
+    "presentacion",
+    "price_override",
+    "imagen",
+)
+COLUMNAS = CAMPOS_PRODUCTO + ("variaciones", "imagenes")
+
+VERDADEROS = {"1", "true", "si", "sí", "yes", "y"}
+
+
+class RegistroInvalido(ValueError):
+    pass
+
+
+# --- Lectura y escritura de archivos ---
+
+
+def leer_registros(archivo, formato):
+    """Genera (número de línea, dict) sin cargar el archivo completo en memoria."""
+    if formato == "csv":
+        for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+            registro = {clave: valor for clave, valor in fila.items() if clave}
+            for clave in ("variaciones", "imagenes"):
+                if registro.get(clave):
+                    try:
+                        registro[clave] = json.loads(registro[clave])
+                    except ValueError:
+                        registro[clave] = RegistroInvalido(f"{clave}: JSON inválido")
+            yield numero, registro
+    else:
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                yield numero, json.loads(linea)
+            except ValueError:
+                yield numero, RegistroInvalido("JSON inválido")
+
+
+class EscritorCSV:
+    def __init__(self, archivo):
+        self.writer = csv.DictWriter(archivo, fieldnames=COLUMNAS)
+        self.writer.writeheader()
+
+    def escribir(self, registro):
+        fila = dict(registro)
+        for clave in ("variaciones", "imagenes"):
+            fila[clave] = json.dumps(fila[clave], ensure_ascii=False) if fila[clave] else ""
+        self.writer.writerow(fila)
+
+
+class EscritorJSONL:
+    def __init__(self, archivo):
+        self.archivo = archivo
+
+    def escribir(self, registro):
+        self.archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def escritor(archivo, formato):
+    return EscritorCSV(archivo) if formato == "csv" else EscritorJSONL(archivo)
+
+
+# --- Exportación ---
+
+
+def _imagen(valor):
+    """Valor de un CloudinaryField tal como se guarda en la base de datos."""
+    if not valor:
+        return ""
+    if isinstance(valor, CloudinaryResource):
+        return valor.get_prep_value()
+    return str(valor)
+
+
+def _texto(valor):
+    return "" if valor is None else str(valor)
+
+
+def serializar(producto):
+    """Registro de exportación de un producto (con categoría, variaciones e imágenes precargadas)."""
+    return {
+        "slug": producto.slug,
+        "nombre": producto.nombre,
+        "categoria": producto.categoria.slug if producto.categoria_id else "",
+        "precio": str(producto.precio),
+        "descuento": str(producto.descuento),
+        "stock": producto.stock,
+        "badge": producto.badge,
+        "is_active": producto.is_active,
+        "descripcion": producto.descripcion or "",
+        "imagen": _imagen(producto.imagen),
+        "variaciones": [
+            {
+                "nombre": variacion.nombre,
+                "valor": variacion.valor,
+                "color": _texto(variacion.color),
+                "color_hex": _texto(variacion.color_hex),
+                "tono": _texto(variacion.tono),
+                "presentacion": _texto(variacion.presentacion),
+                "price_override": _texto(variacion.price_override),
+                "imagen": _imagen(variacion.imagen),
+            }
+            for variacion in producto.variaciones.all()
+        ],
+        "imagenes": [
+            {"image": _imagen(imagen.image), "alt_text": imagen.alt_text}
+            for imagen in producto.images.all()
+        ],
+    }
+
+
+def productos_para_exportar(chunk_size=500):
+    """Recorre el catálogo por bloques: tres consultas por bloque, memoria acotada."""
+    from .models import Producto
+
+    return (
+        Producto.objects.para_listado()
+        .order_by("pk")
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+# --- Importación ---
+
+
+def _decimal(valor, campo):
+    try:
+        return Decimal(str(valor).strip())
+    except (InvalidOperation, ValueError):
+        raise RegistroInvalido(f"{campo}: número inválido ({valor!r})")
+
+
+def _entero(valor, campo):
+    try:
+        return int(str(valor).strip())
+    except ValueError:
+        raise RegistroInvalido(f"{campo}: entero inválido ({valor!r})")
+
+
+def _presente(valor):
+    return valor is not None and valor != ""
+
+
+def normalizar(registro):
+    """Valida y convierte un registro; devuelve solo los campos con valor."""
+    if isinstance(registro, Exception):
+        raise registro
+    if not isinstance(registro, dict):
+        raise RegistroInvalido("el registro debe ser un objeto")
+
+    datos = {}
+    for campo in CAMPOS_PRODUCTO:
+        valor = registro.get(campo)
+        if not _presente(valor):
+            continue
+        if campo in ("precio", "descuento"):
+            valor = _decimal(valor, campo)
+        elif campo == "stock":
+            valor = _entero(valor, campo)
+        elif campo == "is_active":
+            valor = valor if isinstance(valor, bool) else str(valor).strip().lower() in VERDADEROS
+        else:
+            valor = str(valor).strip()
+        datos[campo] = valor
+
+    if not datos.get("slug"):
+        if not datos.get("nombre"):
+            raise RegistroInvalido("falta 'slug' o 'nombre'")
+        datos["slug"] = slugify(datos["nombre"])
+    datos["slug"] = slugify(datos["slug"])
+    if not datos["slug"]:
+        raise RegistroInvalido("slug inválido")
+
+    for clave in ("variaciones", "imagenes"):
+        valor = registro.get(clave)
+        if isinstance(valor, Exception):
+            raise valor
+        if _presente(valor):
+            if not isinstance(valor, list):
+                raise RegistroInvalido(f"{clave}: se esperaba una lista")
+            datos[clave] = valor
+
+    variaciones = []
+    for variacion in datos.get("variaciones", []):
+        if not isinstance(variacion, dict) or not variacion.get("nombre") or not variacion.get("valor"):
+            raise RegistroInvalido("cada variación necesita 'nombre' y 'valor'")
+        normalizada = {
+            campo: str(variacion[campo]).strip()
+            for campo in CAMPOS_VARIACION
+            if _presente(variacion.get(campo))
+        }
+        if "price_override" in normalizada:
+            normalizada["price_override"] = _decimal(normalizada["price_override"], "price_override")
+        variaciones.append(normalizada)
+    if "variaciones" in datos:
+        datos["variaciones"] = variaciones
+
+    if "imagenes" in datos:
+        datos["imagenes"] = [
+            imagen if isinstance(imagen, dict) else {"image": imagen}
+            for imagen in datos["imagenes"]
+            if imagen
+        ]
+    return datos
+
+
+class Importador:
+    """
+    Sincroniza lotes de registros con la base de datos. Lleva la cuenta de creados,
+    actualizados y errores, y cachea las categorías por slug entre lotes.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.categorias = {}
+        self.creados = 0
+        self.actualizados = 0
+        self.variaciones = 0
+        self.imagenes = 0
+        self.errores = []
+
+    def _resolver_categorias(self, slugs):
+        from .models import Categoria
+
+        faltantes = set(slugs) - self.categorias.keys()
+        if faltantes:
+            for categoria in Categoria.objects.filter(slug__in=faltantes):
+                self.categorias[categoria.slug] = categoria
+
+    def importar_lote(self, lote):
+        """Procesa [(línea, registro)] en una transacción (revertida en dry-run)."""
+        validos = {}
+        for numero, registro in lote:
+            try:
+                datos = normalizar(registro)
+            except RegistroInvalido as e:
+                self.errores.append((numero, str(e)))
+                continue
+            # Si un slug se repite dentro del lote gana el último registro
+            validos[datos["slug"]] = (numero, datos)
+
+        with transaction.atomic():
+            self._escribir(validos)
+            if self.dry_run:
+                transaction.set_rollback(True)
+
+    def _escribir(self, validos):
+        from .models import Producto
+
+        self._resolver_categorias(
+            datos["categoria"] for _, datos in validos.values() if "categoria" in datos
+        )
+        existentes = Producto.objects.select_related("categoria").in_bulk(
+            list(validos), field_name="slug"
+        )
+
+        nuevos, actualizados, campos = [], [], set()
+        for slug, (numero, datos) in validos.items():
+            producto = existentes.get(slug)
+            if "categoria" in datos:
+                categoria = self.categorias.get(datos["categoria"])
+                if categoria is None:
+                    self.errores.append((numero, f"categoría inexistente: {datos['categoria']}"))
+                    continue
+            elif producto is None:
+                self.errores.append((numero, "falta 'categoria' para un producto nuevo"))
+                continue
+            if producto is None and not datos.get("nombre"):
+                self.errores.append((numero, "falta 'nombre' para un producto nuevo"))
+                continue
+
+            if producto is None:
+                producto = Producto(slug=slug)
+                nuevos.append(producto)
+            else:
+                actualizados.append(producto)
+            for campo in CAMPOS_PRODUCTO:
+                if campo == "categoria" and campo in datos:
+                    producto.categoria = categoria
+                    campos.add("categoria")
+                elif campo in datos and campo != "slug":
+                    setattr(producto, campo, datos[campo])
+                    campos.add(campo)
+            # Lo que Producto.save() calcula; bulk_create/bulk_update ponen precio_final
+            producto.search_document = producto.build_search_document()
+            producto._registro = datos
+
+        Producto.objects.bulk_create(nuevos)
+        if actualizados and campos:
+            # bulk_update no aplica auto_now
+            ahora = timezone.now()
+            for producto in actualizados:
+                producto.ultima_actualizacion = ahora
+            campos |= {"search_document", "ultima_actualizacion"}
+            Producto.objects.bulk_update(actualizados, sorted(campos))
+        self.creados += len(nuevos)
+        self.actualizados += len(actualizados)
+
+        productos = nuevos + actualizados
+        self._escribir_variaciones(productos)
+        self._escribir_imagenes(productos)
+
+    def _escribir_variaciones(self, productos):
+        from .models import Variacion
+
+        con_variaciones = [p for p in productos if "variaciones" in p._registro]
+        if not con_variaciones:
+            return
+        existentes = {
+            (v.producto_id, v.nombre, v.valor): v
+            for v in Variacion.objects.filter(producto__in=con_variaciones)
+        }
+        nuevas, actualizadas, campos = [], [], set()
+        for producto in con_variaciones:
+            for datos in producto._registro["variaciones"]:
+                variacion = existentes.get((producto.pk, datos["nombre"], datos["valor"]))
+                if variacion is None:
+                    variacion = Variacion(producto=producto)
+                    nuevas.append(variacion)
+                else:
+                    actualizadas.append(variacion)
+                # El precio final de la variación usa precio y descuento del producto
+                variacion.producto = producto
+                for campo, valor in datos.items():
+                    setattr(variacion, campo, valor)
+                    campos.add(campo)
+        Variacion.objects.bulk_create(nuevas)
+        campos -= {"nombre", "valor"}
+        if actualizadas:
+            # Con 'producto' en los campos bulk_update recalcula precio_final
+            Variacion.objects.bulk_update(actualizadas, sorted(campos | {"producto"}))
+        self.variaciones += len(nuevas) + len(actualizadas)
+
+    def _escribir_imagenes(self, productos):
+        from .models import ProductImage
+
+        con_imagenes = [p for p in productos if "imagenes" in p._registro]
+        if not con_imagenes:
+            return
+        # La galería del registro reemplaza la actual, en el orden del archivo
+        ProductImage.objects.filter(producto__in=con_imagenes).delete()
+        imagenes = [
+            ProductImage(
+                producto=producto,
+                image=datos.get("image", ""),
+                alt_text=datos.get("alt_text", "") or "",
+                order=orden,
+            )
+            for producto in con_imagenes
+            for orden, datos in enumerate(producto._registro["imagenes"])
+        ]
+        ProductImage.objects.bulk_create(imagenes)
+        self.imagenes += len(imagenes)
@@ -0,0 +1,105 @@
+"""
+Árbol de categorías precalculado.
+
+Carga toda la lista de adyacencia de Categoria en una sola consulta, calcula
+hijos, conjuntos de descendientes y rutas completas, y guarda el resultado en la
+caché de Django. Las señales de store/signals.py lo invalidan cuando una
+categoría se guarda o se elimina.
+"""
+
+from django.core.cache import cache
+
+CACHE_KEY = "store:category_tree"
+CACHE_TIMEOUT = 60 * 60 * 24  # 24 horas; las señales lo invalidan antes si hay cambios
+
+
+class CategoryTree:
+    """Vista en memoria de la jerarquía de categorías."""
+
+    def __init__(self, categorias):
+        self.por_id = {c.id: c for c in categorias}
+        self.por_slug = {c.slug: c for c in categorias}
+        self.principales = []
+        self._descendientes = {}
+        self._rutas = {}
+
+        for categoria in categorias:
+            # Lista de hijos directos accesible desde las plantillas (categoria.hijos)
+            categoria.hijos = []
+
+        for categoria in categorias:
+            padre = self.por_id.get(categoria.padre_id)
+            if padre is None:
+                self.principales.append(categoria)
+            else:
+                padre.hijos.append(categoria)
+                # Deja el padre en la caché de la relación para que
+                # categoria.padre y ruta_completa no consulten la base de datos.
+                categoria.padre = padre
+
+        for categoria in categorias:
+            self._descendientes[categoria.id] = self._calcular_descendientes(categoria)
+            self._rutas[categoria.id] = self._calcular_ruta(categoria)
+
+    @staticmethod
+    def _calcular_descendientes(categoria):
+        ids = {categoria.id}
+        pendientes = list(categoria.hijos)
+        while pendientes:
+            actual = pendientes.pop()
+            if actual.id in ids:  # Protege contra ciclos en datos corruptos
+                continue
+            ids.add(actual.id)
+            pendientes.extend(actual.hijos)
+        return frozenset(ids)
+
+    def _calcular_ruta(self, categoria):
+        nombres = []
+        visitados = set()
+        actual = categoria
+        while actual is not None and actual.id not in visitados:
+            visitados.add(actual.id)
+            nombres.append(actual.nombre)
+            actual = self.por_id.get(actual.padre_id)
+        return " > ".join(reversed(nombres))
+
+    def get(self, slug):
+        """Devuelve la categoría con ese slug o None."""
+        return self.por_slug.get(slug)
+
+    def hijos(self, categoria_id):
+        """Subcategorías directas de una categoría."""
+        categoria = self.por_id.get(categoria_id)
+        return categoria.hijos if categoria is not None else []
+
+    def descendientes_ids(self, categoria_id, incluir_propia=True):
+        """IDs de todas las subcategorías (a cualquier profundidad) de una categoría."""
+        ids = self._descendientes.get(categoria_id, frozenset())
+        if not incluir_propia:
+            ids = ids - {categoria_id}
+        return ids
+
+    def ruta_completa(self, categoria_id):
+        """Ruta tipo 'Maquillaje > Labios > Labiales' sin recorrer la base de datos."""
+        return self._rutas.get(categoria_id, "")
+
+
+def build_category_tree():
+    """Construye el árbol con una única consulta a Categoria."""
+    from .models import Categoria
+
+    return CategoryTree(list(Categoria.objects.order_by("id")))
+
+
+def get_category_tree():
+    """Devuelve el árbol desde la caché, construyéndolo si hace falta."""
+    tree = cache.get(CACHE_KEY)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(CACHE_KEY, tree, CACHE_TIMEOUT)
+    return tree
+
+
+def invalidate_category_tree():
+    """Elimina el árbol de la caché; la siguiente lectura lo reconstruye."""
+    cache.delete(CACHE_KEY)
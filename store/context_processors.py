@@ -0,0 +1,16 @@
+from django.conf import settings
+
+from .site_config import get_configuracion
+
+
+def configuracion_sitio(request):
+    """
+    Expone el menú y los ajustes del sitio a todas las plantillas. Se sirven desde
+    store/site_config.py, así que no añaden consultas a cada página.
+    """
+    configuracion = get_configuracion()
+    return {
+        "menu_items": configuracion.menu_items,
+        "site_settings": configuracion.ajustes,
+        "whatsapp_number": configuracion.get("whatsapp_number", settings.WHATSAPP_NUMBER),
+    }
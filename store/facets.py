@@ -0,0 +1,174 @@
+"""
+Índice de facetas del catálogo para el filtrado por categoría, etiqueta, rango de
+precio, color, tono y disponibilidad.
+
+Cada producto activo ocupa una posición fija y cada valor de faceta guarda un
+bitset (un int de Python) con las posiciones de los productos que lo cumplen. Un
+filtro es entonces un AND entre facetas y un OR dentro de la misma faceta, y los
+conteos salen de contar bits, sin volver a consultar la base de datos.
+
+El índice se construye con dos consultas y se guarda por proceso junto con la
+generación del catálogo (store/cache.py): cualquier cambio en productos,
+variaciones o categorías lo invalida y se reconstruye en la siguiente petición.
+"""
+
+import threading
+from collections import defaultdict
+
+from .cache import CATALOGO, get_generacion
+
+# Rangos de precio final (mínimo incluido, máximo excluido; None = sin límite)
+RANGOS_PRECIO = (
+    ("0-20000", 0, 20000),
+    ("20000-50000", 20000, 50000),
+    ("50000-100000", 50000, 100000),
+    ("100000-", 100000, None),
+)
+
+FACETAS = ("categoria", "badge", "precio", "color", "tono", "disponible")
+
+
+def _rango_precio(precio):
+    for clave, minimo, maximo in RANGOS_PRECIO:
+        if precio >= minimo and (maximo is None or precio < maximo):
+            return clave
+    return None
+
+
+class FacetIndex:
+    """Bitsets por valor de faceta sobre la lista de productos activos."""
+
+    def __init__(self):
+        self.generacion = None
+        self.ids = []  # posición -> producto_id, en el orden del catálogo
+        self.posiciones = {}  # producto_id -> posición
+        self.bits = {faceta: {} for faceta in FACETAS}
+        self.todos = 0
+
+    def construir(self, generacion=None):
+        """Carga productos activos y sus variaciones con dos consultas."""
+        from .models import Producto, Variacion
+
+        bits = {faceta: defaultdict(int) for faceta in FACETAS}
+        ids = []
+        posiciones = {}
+        filas = Producto.objects.activos().values_list(
+            "id", "categoria__ruta", "badge", "precio_final", "stock"
+        )
+        for posicion, (producto_id, ruta, badge, precio_final, stock) in enumerate(filas):
+            bit = 1 << posicion
+            ids.append(producto_id)
+            posiciones[producto_id] = posicion
+            # El producto cuenta para su categoría y para todas sus ancestras
+            for categoria_id in (ruta or "").strip("/").split("/"):
+                if categoria_id:
+                    bits["categoria"][int(categoria_id)] |= bit
+            if badge:
+                bits["badge"][badge] |= bit
+            rango = _rango_precio(precio_final)
+            if rango:
+                bits["precio"][rango] |= bit
+            if stock > 0:
+                bits["disponible"]["1"] |= bit
+
+        variaciones = Variacion.objects.filter(producto__is_active=True).values_list(
+            "producto_id", "color_hex", "tono"
+        )
+        for producto_id, color_hex, tono in variaciones:
+            posicion = posiciones.get(producto_id)
+            if posicion is None:
+                continue
+            if color_hex:
+                bits["color"][color_hex.strip().upper()] |= 1 << posicion
+            if tono and tono.strip():
+                bits["tono"][tono.strip()] |= 1 << posicion
+
+        self.ids = ids
+        self.posiciones = posiciones
+        self.bits = {faceta: dict(valores) for faceta, valores in bits.items()}
+        self.todos = (1 << len(ids)) - 1
+        self.generacion = generacion
+
+    def __len__(self):
+        return len(self.ids)
+
+    def mascara_ids(self, producto_ids):
+        """Bitset con las posiciones de una lista de IDs (ej. resultados de búsqueda)."""
+        mascara = 0
+        for producto_id in producto_ids:
+            posicion = self.posiciones.get(producto_id)
+            if posicion is not None:
+                mascara |= 1 << posicion
+        return mascara
+
+    def _mascara_faceta(self, faceta, valores):
+        """OR de los valores seleccionados de una faceta."""
+        mascara = 0
+        for valor in valores:
+            mascara |= self.bits[faceta].get(valor, 0)
+        return mascara
+
+    def filtrar(self, selecciones, base=None):
+        """
+        Aplica las selecciones ({faceta: [valores]}) y devuelve (mascara, conteos).
+
+        Los conteos de cada faceta ignoran su propia selección para que el usuario
+        vea cuántos productos obtendría al marcar otro valor de la misma faceta.
+        """
+        base = self.todos if base is None else base & self.todos
+        por_faceta = {
+            faceta: self._mascara_faceta(faceta, valores)
+            for faceta, valores in selecciones.items()
+            if faceta in self.bits and valores
+        }
+
+        mascara = base
+        for bits_faceta in por_faceta.values():
+            mascara &= bits_faceta
+
+        conteos = {}
+        for faceta, valores in self.bits.items():
+            sin_faceta = base
+            for otra, bits_faceta in por_faceta.items():
+                if otra != faceta:
+                    sin_faceta &= bits_faceta
+            conteos[faceta] = {
+                valor: (bits_valor & sin_faceta).bit_count()
+                for valor, bits_valor in valores.items()
+                if bits_valor & sin_faceta
+            }
+        return mascara, conteos
+
+    def ids_de(self, mascara, offset=0, limite=None):
+        """IDs de producto de una máscara, en el orden del catálogo."""
+        # bin() recorre el entero una sola vez; el bit menos significativo es la posición 0
+        posiciones = (i for i, bit in enumerate(reversed(bin(mascara)[2:])) if bit == "1")
+        resultado = []
+        for n, posicion in enumerate(posiciones):
+            if n < offset:
+                continue
+            if limite is not None and len(resultado) >= limite:
+                break
+            resultado.append(self.ids[posicion])
+        return resultado
+
+
+_indice = FacetIndex()
+_lock = threading.Lock()
+
+
+def get_facet_index():
+    """
+    Devuelve el índice del proceso, reconstruyéndolo si cambió el catálogo. El
+    índice nuevo se construye aparte y se publica de una vez, así las peticiones
+    concurrentes nunca ven uno a medio construir.
+    """
+    global _indice
+    generacion = get_generacion(CATALOGO)
+    if _indice.generacion != generacion:
+        with _lock:
+            if _indice.generacion != generacion:
+                nuevo = FacetIndex()
+                nuevo.construir(generacion)
+                _indice = nuevo
+    return _indice
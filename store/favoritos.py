@@ -0,0 +1,68 @@
+"""
+Favoritos del visitante sin depender de la sesión en base de datos.
+
+Los IDs se guardan en una cookie firmada ('favoritos'). Las páginas del catálogo
+no los leen (main.js marca los corazones desde localStorage); solo /favoritos/ y
+toggle_favorito. La sesión y la fila de Favorito solo se crean en la primera
+escritura (toggle_favorito). Para visitantes antiguos que aún no tienen la
+cookie se recurre a la tabla Favorito, solo si ya traen cookie de sesión, y
+sincronizar_cookie() escribe el resultado en la cookie para que la consulta no
+se repita.
+"""
+
+from django.conf import settings
+
+from .models import Favorito
+
+FAVORITOS_COOKIE = "favoritos"
+FAVORITOS_SALT = "store.favoritos"
+FAVORITOS_MAX_AGE = 60 * 60 * 24 * 365
+MAX_FAVORITOS = 200
+
+
+def leer_favoritos(request):
+    """IDs de productos favoritos del visitante (lista de int, los más recientes primero)."""
+    valor = request.get_signed_cookie(
+        FAVORITOS_COOKIE, default=None, salt=FAVORITOS_SALT, max_age=FAVORITOS_MAX_AGE
+    )
+    if valor is not None:
+        return list(dict.fromkeys(int(i) for i in valor.split(",") if i.isdigit()))
+
+    # Sin cookie: solo se consulta la tabla si ya existe una sesión (nunca se crea)
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.session.session_key:
+        ids = list(
+            Favorito.objects.filter(session_key=request.session.session_key)
+            .order_by("-id")
+            .values_list("producto_id", flat=True)
+        )
+        # Aunque esté vacía: sincronizar_cookie la guarda y no se vuelve a consultar
+        request.favoritos_sin_cookie = ids
+        return ids
+    return []
+
+
+def sincronizar_cookie(request, response):
+    """Guarda en la cookie los favoritos que leer_favoritos sacó de la tabla."""
+    ids = getattr(request, "favoritos_sin_cookie", None)
+    if ids is not None:
+        guardar_favoritos(response, ids)
+    return response
+
+
+def guardar_favoritos(response, favoritos_ids):
+    """
+    Escribe la cookie firmada con los favoritos. Se respeta el orden recibido
+    (los más recientes primero): al superar MAX_FAVORITOS se pierden los más
+    antiguos.
+    """
+    ids = list(dict.fromkeys(int(i) for i in favoritos_ids))[:MAX_FAVORITOS]
+    response.set_signed_cookie(
+        FAVORITOS_COOKIE,
+        ",".join(str(i) for i in ids),
+        salt=FAVORITOS_SALT,
+        max_age=FAVORITOS_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+    return response
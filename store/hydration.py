@@ -0,0 +1,117 @@
+"""
+Hidratación por lotes de productos para favoritos y carrito.
+
+Las páginas que reciben una lista de IDs (favoritos guardados en el navegador,
+líneas del carrito) no deben consultar la base de datos por cada elemento. Aquí
+se cargan todos los productos pedidos de una vez con para_listado() (producto y
+categoría, imágenes y variaciones: tres consultas en total, sin importar cuántos
+elementos haya) y se serializan a diccionarios simples.
+
+Cada producto serializado se guarda además en la caché compartida con la
+generación del catálogo en la clave, así que las peticiones siguientes solo
+consultan los productos que aún no estén cacheados y cualquier cambio en el
+catálogo (señales de store/signals.py) los invalida.
+"""
+
+from django.core.cache import cache
+
+from .cache import CATALOGO, clave
+from .images import url_imagen
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def _url_imagen(campo):
+    try:
+        return url_imagen(campo) or None
+    except Exception:
+        return None
+
+
+def serializar_producto(producto):
+    """Datos de un producto (y de sus variaciones) que necesitan favoritos y carrito."""
+    return {
+        "id": producto.id,
+        "nombre": producto.nombre,
+        "precio_final": producto.precio_final,
+        "imagen": producto.get_primary_image_url(),
+        "url": producto.get_absolute_url(),
+        "categoria": producto.categoria.nombre if producto.categoria else "",
+        "is_active": producto.is_active,
+        "variaciones": {
+            variacion.id: {
+                "id": variacion.id,
+                "precio_final": variacion.precio_final,
+                "color": variacion.color,
+                "imagen": _url_imagen(variacion.imagen),
+            }
+            for variacion in producto.variaciones.all()
+        },
+    }
+
+
+def productos_serializados(producto_ids, usar_cache=True):
+    """
+    Devuelve {producto_id: datos} para los IDs pedidos que existan. Los que no estén
+    en la caché se cargan juntos con para_listado().
+    """
+    from .models import Producto
+
+    ids = {int(pk) for pk in producto_ids}
+    if not ids:
+        return {}
+
+    prefijo = clave(CATALOGO, "producto")
+    claves = {pk: f"{prefijo}:{pk}" for pk in ids}
+    encontrados = {}
+    if usar_cache:
+        guardados = cache.get_many(list(claves.values()))
+        encontrados = {pk: guardados[k] for pk, k in claves.items() if k in guardados}
+
+    faltantes = ids - encontrados.keys()
+    if faltantes:
+        nuevos = {
+            producto.id: serializar_producto(producto)
+            for producto in Producto.objects.para_listado().filter(id__in=faltantes)
+        }
+        if usar_cache and nuevos:
+            cache.set_many({claves[pk]: datos for pk, datos in nuevos.items()}, CACHE_TIMEOUT)
+        encontrados.update(nuevos)
+    return encontrados
+
+
+def hidratar(pares, usar_cache=True):
+    """
+    Recibe pares (producto_id, variant_id) y devuelve, en el mismo orden, un
+    diccionario por par con el producto serializado, la variación (o None), el
+    precio final, la imagen y el color que corresponden. Si el producto ya no
+    existe el elemento es None; un variant_id que no pertenece al producto se
+    ignora y se usa el producto base.
+    """
+    pares = [(int(producto_id), variant_id) for producto_id, variant_id in pares]
+    productos = productos_serializados(
+        [producto_id for producto_id, _ in pares], usar_cache=usar_cache
+    )
+
+    items = []
+    for producto_id, variant_id in pares:
+        producto = productos.get(producto_id)
+        if producto is None:
+            items.append(None)
+            continue
+        variacion = None
+        if variant_id and str(variant_id) != str(producto_id):
+            try:
+                variacion = producto["variaciones"].get(int(variant_id))
+            except (TypeError, ValueError):
+                variacion = None
+        items.append(
+            {
+                "producto": producto,
+                "variacion": variacion,
+                "precio_final": (variacion or producto)["precio_final"],
+                "imagen": (variacion and variacion["imagen"]) or producto["imagen"],
+                "color": variacion["color"] if variacion else None,
+            }
+        )
+    return items
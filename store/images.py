@@ -0,0 +1,125 @@
+"""
+URLs HTTPS de las imágenes de Cloudinary, memorizadas por proceso.
+
+Cada acceso a campo.url construye la URL en Python (opciones, firma de la
+transformación, formato...) y una cuadrícula de productos lo repite varias veces
+por tarjeta. La URL solo depende del public_id, la versión, el formato y la
+transformación pedida, así que se calcula una vez y se guarda en una LRUCache
+acotada. Las plantillas usan el filtro |imagen_url de store_tags.
+
+Para imágenes responsive se generan variantes de ancho fijo (ANCHOS_RESPONSIVE)
+con formato y calidad automáticos (f_auto, q_auto), que el navegador elige con
+srcset/sizes según el ancho en pantalla.
+
+Construir la URL no usa la red. Si no hay cloud_name configurado y
+CLOUDINARY_NUBE_LOCAL está activo (por defecto con DEBUG) se usa NUBE_LOCAL para
+que las plantillas rendericen igual; si no, cloudinary_url lanza "Must supply
+cloud_name" y la falta de credenciales no pasa inadvertida.
+"""
+
+import cloudinary
+from cloudinary import CloudinaryResource
+from cloudinary.utils import cloudinary_url
+from django.conf import settings
+
+from .cache import LRUCache
+
+# Anchos (px) de las variantes responsive; pocos valores fijos para que la CDN de
+# Cloudinary reutilice las transformaciones ya generadas
+ANCHOS_RESPONSIVE = (160, 320, 480, 640, 960, 1280)
+
+NUBE_LOCAL = "local"
+
+# Una entrada por (imagen, transformación); las URLs no caducan, el TTL solo
+# acota lo que sobrevive si cambia la configuración de Cloudinary.
+_urls = LRUCache(maxsize=4096, ttl=60 * 60 * 24)
+
+
+def forzar_https(url):
+    """Convierte URLs http:// o relativas al protocolo (//...) en https://."""
+    if not url:
+        return url
+    if url.startswith("//"):
+        return "https:" + url
+    if url.startswith("http://"):
+        return "https://" + url[len("http://"):]
+    return url
+
+
+def _nube():
+    nube = cloudinary.config().cloud_name
+    if not nube and getattr(settings, "CLOUDINARY_NUBE_LOCAL", settings.DEBUG):
+        return NUBE_LOCAL
+    return nube
+
+
+def _clave(recurso, transformacion, nube):
+    # La nube forma parte de la clave: cambiar de cuenta no sirve URLs antiguas
+    return (
+        nube,
+        recurso.public_id,
+        recurso.format,
+        recurso.version,
+        recurso.type,
+        recurso.resource_type,
+        transformacion,
+    )
+
+
+def url_imagen(recurso, transformacion=""):
+    """
+    URL HTTPS de una imagen de Cloudinary (CloudinaryResource, public_id o URL ya
+    construida). 'transformacion' es una transformación cruda de Cloudinary, por
+    ejemplo "w_400,c_fill,f_auto,q_auto". Devuelve "" si no hay imagen.
+    """
+    if not recurso:
+        return ""
+    if isinstance(recurso, str):
+        if recurso.startswith(("http://", "https://", "//", "/")):
+            return forzar_https(recurso)
+        recurso = CloudinaryResource(recurso)
+    if not recurso.public_id:
+        return ""
+
+    nube = _nube()
+    clave = _clave(recurso, transformacion, nube)
+    url = _urls.get(clave)
+    if url is None:
+        opciones = {
+            "format": recurso.format,
+            "version": recurso.version,
+            "type": recurso.type,
+            "resource_type": recurso.resource_type or "image",
+            "secure": True,
+            "cloud_name": nube,
+        }
+        if transformacion:
+            opciones["raw_transformation"] = transformacion
+        url = forzar_https(cloudinary_url(recurso.public_id, **opciones)[0])
+        _urls.set(clave, url)
+    return url
+
+
+def transformacion_ancho(ancho):
+    """Transformación de una variante: ancho máximo, formato y calidad automáticos."""
+    return f"c_limit,w_{int(ancho)},f_auto,q_auto"
+
+
+def url_ancho(recurso, ancho):
+    """URL de la variante de 'ancho' px de una imagen de Cloudinary."""
+    if not isinstance(recurso, CloudinaryResource):
+        # Una URL ya construida (o el fallback estático) no admite transformaciones
+        return url_imagen(recurso)
+    return url_imagen(recurso, transformacion_ancho(ancho))
+
+
+def srcset(recurso, anchos=ANCHOS_RESPONSIVE):
+    """Valor del atributo srcset ("url 160w, url 320w, ...") o "" si no aplica."""
+    if not isinstance(recurso, CloudinaryResource) or not recurso.public_id:
+        return ""
+    return ", ".join(f"{url_ancho(recurso, ancho)} {ancho}w" for ancho in anchos)
+
+
+def limpiar_cache():
+    """Vacía las URLs memorizadas (pruebas o cambio de configuración)."""
+    _urls.clear()
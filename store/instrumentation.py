@@ -0,0 +1,168 @@
+"""
+Instrumentación por petición: consultas SQL (número y tiempo), tiempo de
+renderizado de plantillas, aciertos y fallos de la caché y tiempo total.
+
+La recoge InstrumentacionMiddleware (store/middleware.py) en una fracción de las
+peticiones (INSTRUMENTACION_MUESTREO) y la publica en la cabecera Server-Timing
+y en el logger "store.instrumentacion". Las consultas se miden con
+connection.execute_wrapper solo durante la petición muestreada. Plantillas y
+caché no tienen ganchos propios, así que instalar() envuelve una única vez
+Template.render del backend de Django y get/get_many de la caché por defecto;
+fuera de una petición muestreada los envoltorios solo leen una ContextVar.
+"""
+
+import functools
+import time
+from contextvars import ContextVar
+
+_medicion_actual = ContextVar("store_medicion", default=None)
+_instalado = False
+
+
+class Medicion:
+    """Contadores de una petición."""
+
+    __slots__ = (
+        "consultas",
+        "tiempo_db",
+        "tiempo_plantillas",
+        "cache_aciertos",
+        "cache_fallos",
+        "_en_cache",
+        "_en_plantilla",
+    )
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.tiempo_plantillas = 0.0
+        self.cache_aciertos = 0
+        self.cache_fallos = 0
+        self._en_cache = False
+        self._en_plantilla = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # Firma de connection.execute_wrapper
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_db += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+def medicion_actual():
+    """La Medicion de la petición en curso, o None si no se está muestreando."""
+    return _medicion_actual.get()
+
+
+def activar(medicion):
+    return _medicion_actual.set(medicion)
+
+
+def desactivar(token):
+    _medicion_actual.reset(token)
+
+
+# --- Envoltorios de plantillas y caché ---
+
+
+def _medir_plantilla(render):
+    @functools.wraps(render)
+    def envoltorio(self, *args, **kwargs):
+        medicion = _medicion_actual.get()
+        # Solo el render de nivel superior: render_to_string dentro de una vista
+        # que ya está renderizando no se cuenta dos veces
+        if medicion is None or medicion._en_plantilla:
+            return render(self, *args, **kwargs)
+        medicion._en_plantilla = True
+        inicio = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            medicion.tiempo_plantillas += time.perf_counter() - inicio
+            medicion._en_plantilla = False
+
+    return envoltorio
+
+
+def _medir_get(get):
+    @functools.wraps(get)
+    def envoltorio(self, key, default=None, *args, **kwargs):
+        medicion = _medicion_actual.get()
+        # BaseCache.get_many llama a get() por clave en algunos backends
+        if medicion is None or medicion._en_cache:
+            return get(self, key, default, *args, **kwargs)
+        medicion._en_cache = True
+        try:
+            valor = get(self, key, default, *args, **kwargs)
+        finally:
+            medicion._en_cache = False
+        if valor is default:
+            medicion.cache_fallos += 1
+        else:
+            medicion.cache_aciertos += 1
+        return valor
+
+    return envoltorio
+
+
+def _medir_get_many(get_many):
+    @functools.wraps(get_many)
+    def envoltorio(self, keys, *args, **kwargs):
+        medicion = _medicion_actual.get()
+        if medicion is None or medicion._en_cache:
+            return get_many(self, keys, *args, **kwargs)
+        keys = list(keys)
+        medicion._en_cache = True
+        try:
+            valores = get_many(self, keys, *args, **kwargs)
+        finally:
+            medicion._en_cache = False
+        medicion.cache_aciertos += len(valores)
+        medicion.cache_fallos += len(keys) - len(valores)
+        return valores
+
+    return envoltorio
+
+
+def instalar():
+    """Envuelve plantillas y caché (una sola vez por proceso)."""
+    global _instalado
+    if _instalado:
+        return
+    from django.core.cache import caches
+    from django.template.backends.django import Template
+
+    Template.render = _medir_plantilla(Template.render)
+    clase_cache = type(caches["default"])
+    clase_cache.get = _medir_get(clase_cache.get)
+    clase_cache.get_many = _medir_get_many(clase_cache.get_many)
+    _instalado = True
+
+
+# --- Salida ---
+
+
+def metricas(medicion, total):
+    """Dict con las métricas en milisegundos (para logs y Server-Timing)."""
+    return {
+        "total_ms": round(total * 1000, 2),
+        "db_ms": round(medicion.tiempo_db * 1000, 2),
+        "consultas": medicion.consultas,
+        "plantillas_ms": round(medicion.tiempo_plantillas * 1000, 2),
+        "cache_aciertos": medicion.cache_aciertos,
+        "cache_fallos": medicion.cache_fallos,
+    }
+
+
+def server_timing(datos):
+    """Valor de la cabecera Server-Timing."""
+    return ", ".join(
+        [
+            f'db;dur={datos["db_ms"]};desc="{datos["consultas"]} queries"',
+            f'tpl;dur={datos["plantillas_ms"]};desc="templates"',
+            f'cache;desc="{datos["cache_aciertos"]} hits, {datos["cache_fallos"]} misses"',
+            f'total;dur={datos["total_ms"]};desc="view"',
+        ]
+    )
@@ -0,0 +1,139 @@
+import shutil
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from lumiere_glamour.cache_config import cache_desde_url
+from store.benchmark import percentil
+from store.models import Categoria, Producto
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure page-cache hit ratio and latency of the catalog views under one "
+        "or more cache backends (locmem, file or a redis:// URL)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backend",
+            action="append",
+            dest="backends",
+            help="locmem, file or a CACHE_URL such as redis://localhost:6379/15 "
+            "(repeatable; default: locmem and file)",
+        )
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=20,
+            help="Requests per URL (the first one is always a miss)",
+        )
+        parser.add_argument(
+            "--operaciones",
+            type=int,
+            default=1000,
+            help="Raw cache.get/cache.set calls measured per backend",
+        )
+
+    def urls(self):
+        urls = [reverse("home")]
+        urls += [
+            reverse("categoria", args=[slug])
+            for slug in Categoria.objects.exclude(slug="")
+            .order_by("id")
+            .values_list("slug", flat=True)[:5]
+        ]
+        urls += [
+            reverse("producto_detalle", args=[pk])
+            for pk in Producto.objects.activos().values_list("pk", flat=True)[:5]
+        ]
+        return urls
+
+    def handle(self, *args, **options):
+        urls = self.urls()
+        self.stdout.write(f"{len(urls)} URLs x {options['repeticiones']} requests\n")
+
+        for backend in options["backends"] or ["locmem", "file"]:
+            directorio = None
+            if backend == "locmem":
+                url = "locmem://"
+            elif backend == "file":
+                directorio = tempfile.mkdtemp(prefix="benchmark-cache-")
+                url = f"file://{directorio}"
+            else:
+                url = backend
+            # Prefijo propio por ejecución: en un Redis compartido no se pisan ni
+            # se borran claves reales, y las del benchmark caducan solas.
+            configuracion = {
+                "default": {
+                    **cache_desde_url(url),
+                    "KEY_PREFIX": f"benchmark-{time.time_ns()}",
+                    "TIMEOUT": 300,
+                }
+            }
+            if backend == "locmem":
+                configuracion["default"]["LOCATION"] = "benchmark"
+            try:
+                with override_settings(
+                    CACHES=configuracion,
+                    PAGE_CACHE_TIMEOUT=600,
+                    ALLOWED_HOSTS=["testserver"],
+                ):
+                    resultado = self.medir(urls, options)
+            except Exception as e:
+                self.stderr.write(self.style.WARNING(f"{backend}: skipped ({e})"))
+                continue
+            finally:
+                if directorio:
+                    shutil.rmtree(directorio, ignore_errors=True)
+            self.informe(backend, resultado)
+
+    def medir(self, urls, options):
+        client = Client()
+        latencias = {"HIT": [], "MISS": []}
+        for _ in range(options["repeticiones"]):
+            for url in urls:
+                inicio = time.perf_counter()
+                response = client.get(url, secure=True)
+                duracion = (time.perf_counter() - inicio) * 1000
+                latencias.setdefault(response.get("X-Cache", "MISS"), []).append(duracion)
+
+        operaciones = options["operaciones"]
+        inicio = time.perf_counter()
+        for i in range(operaciones):
+            cache.set(f"benchmark:{i % 100}", i)
+        tiempo_set = (time.perf_counter() - inicio) / max(operaciones, 1) * 1e6
+        inicio = time.perf_counter()
+        for i in range(operaciones):
+            cache.get(f"benchmark:{i % 100}")
+        tiempo_get = (time.perf_counter() - inicio) / max(operaciones, 1) * 1e6
+
+        return {
+            "latencias": latencias,
+            "set_us": tiempo_set,
+            "get_us": tiempo_get,
+        }
+
+    def informe(self, backend, resultado):
+        aciertos = resultado["latencias"]["HIT"]
+        fallos = resultado["latencias"]["MISS"]
+        total = len(aciertos) + len(fallos)
+        todas = aciertos + fallos
+        self.stdout.write(self.style.SUCCESS(backend))
+        self.stdout.write(
+            f"  hit ratio   {len(aciertos) / total if total else 0:.1%} "
+            f"({len(aciertos)} hits / {len(fallos)} misses)"
+        )
+        for nombre, valores in (("all", todas), ("hit", aciertos), ("miss", fallos)):
+            self.stdout.write(
+                f"  {nombre:<5} p50 {percentil(valores, 50):7.2f} ms   "
+                f"p95 {percentil(valores, 95):7.2f} ms"
+            )
+        self.stdout.write(
+            f"  cache.get {resultado['get_us']:.1f} us   "
+            f"cache.set {resultado['set_us']:.1f} us"
+        )
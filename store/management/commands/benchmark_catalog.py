@@ -0,0 +1,126 @@
+import json
+import subprocess
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+
+from store.benchmark import medir, sembrar_catalogo
+from store.typeahead import invalidar as invalidar_typeahead
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic catalog inside a rolled-back transaction and measure query "
+        "counts, p50/p95 latency and memory of the main store views; fails if a "
+        "view's query count grows with the number of items it renders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--productos", type=int, default=2000, help="Products to seed (default 2000)")
+        parser.add_argument("--profundidad", type=int, default=3, help="Category tree depth (default 3)")
+        parser.add_argument("--ramas", type=int, default=3, help="Subcategories per category (default 3)")
+        parser.add_argument("--variaciones", type=int, default=3, help="Variations per product (default 3)")
+        parser.add_argument("--imagenes", type=int, default=2, help="Gallery images per product (default 2)")
+        parser.add_argument("--repeticiones", type=int, default=20, help="Timed requests per view (default 20)")
+        parser.add_argument("--salida", metavar="FILE", help="Write the results as JSON to FILE")
+        parser.add_argument(
+            "--comparar",
+            metavar="FILE",
+            help="JSON results of a previous run to compare against",
+        )
+
+    def handle(self, *args, **options):
+        if options["profundidad"] < 1 or options["ramas"] < 1:
+            raise CommandError("--profundidad and --ramas must be at least 1")
+        parametros = {
+            clave: options[clave]
+            for clave in ("productos", "profundidad", "ramas", "variaciones", "imagenes", "repeticiones")
+        }
+
+        # Caché propia y sin caché de páginas: se mide el trabajo de las vistas
+        # y no se tocan las claves reales
+        configuracion = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "benchmark-catalogo",
+            }
+        }
+        with override_settings(
+            CACHES=configuracion, PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=["testserver"]
+        ):
+            # El catálogo sintético se descarta al terminar
+            with transaction.atomic():
+                escala = sembrar_catalogo(
+                    options["productos"],
+                    options["profundidad"],
+                    options["ramas"],
+                    options["variaciones"],
+                    options["imagenes"],
+                )
+                vistas = medir(escala, max(options["repeticiones"], 1))
+                transaction.set_rollback(True)
+        # El índice del typeahead del proceso contiene los productos descartados
+        invalidar_typeahead()
+
+        resultado = {
+            "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": self.commit(),
+            "parametros": parametros,
+            "vistas": vistas,
+        }
+        anterior = self.leer(options["comparar"]) if options["comparar"] else None
+        self.informe(vistas, anterior)
+        if options["salida"]:
+            with open(options["salida"], "w") as archivo:
+                json.dump(resultado, archivo, indent=2)
+            self.stdout.write(f"Results written to {options['salida']}")
+
+        crecen = [vista for vista, datos in vistas.items() if not datos["escalado"]["ok"]]
+        if crecen:
+            raise CommandError(f"Query count grows with page size: {', '.join(crecen)}")
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+
+    def leer(self, ruta):
+        try:
+            with open(ruta) as archivo:
+                return json.load(archivo)["vistas"]
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Cannot read {ruta}: {e}")
+
+    def informe(self, vistas, anterior):
+        self.stdout.write(
+            f"{'view':<24} {'queries':>9} {'p50 ms':>9} {'p95 ms':>9} {'peak KiB':>9}  scaling"
+        )
+        for vista, datos in vistas.items():
+            escalado = datos["escalado"]
+            estado = (
+                self.style.SUCCESS("ok")
+                if escalado["ok"]
+                else self.style.ERROR(f"GROWS {escalado['pequena']} -> {escalado['grande']}")
+            )
+            self.stdout.write(
+                f"{vista:<24} {datos['consultas_frio']:>4}/{datos['consultas_caliente']:<4} "
+                f"{datos['p50_ms']:>9.2f} {datos['p95_ms']:>9.2f} "
+                f"{datos['memoria_pico_kib']:>9.1f}  {estado}"
+            )
+            base = (anterior or {}).get(vista)
+            if base:
+                self.stdout.write(
+                    f"{'  vs baseline':<24} {datos['consultas_frio'] - base['consultas_frio']:>+4}"
+                    f"{'':<5} {self.delta(datos['p50_ms'], base['p50_ms']):>9} "
+                    f"{self.delta(datos['p95_ms'], base['p95_ms']):>9} "
+                    f"{self.delta(datos['memoria_pico_kib'], base['memoria_pico_kib']):>9}"
+                )
+
+    def delta(self, actual, base):
+        return f"{(actual - base) / base:+.0%}" if base else "n/a"
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import escritor, productos_para_exportar, serializar
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream every product with its variations and gallery images to a CSV or "
+        "JSON Lines file that import_catalog can read back"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "archivo", nargs="?", default="-", help="Output file (default: stdout)"
+        )
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            help="Output format (default: from the file extension, jsonl for stdout)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Products fetched per query chunk (default 500)",
+        )
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        formato = options["format"] or ("csv" if ruta.endswith(".csv") else "jsonl")
+        try:
+            archivo = (
+                self.stdout if ruta == "-" else open(ruta, "w", newline="", encoding="utf-8")
+            )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        inicio = time.monotonic()
+        total = 0
+        try:
+            salida = escritor(archivo, formato)
+            for producto in productos_para_exportar(max(options["chunk_size"], 1)):
+                salida.escribir(serializar(producto))
+                total += 1
+        finally:
+            if archivo is not self.stdout:
+                archivo.close()
+
+        duracion = time.monotonic() - inicio
+        # Con stdout como salida el resumen va a stderr para no mezclarse con los datos
+        informe = self.stderr if ruta == "-" else self.stdout
+        informe.write(
+            self.style.SUCCESS(
+                f"Exported {total} products in {duracion:.2f}s "
+                f"({total / duracion if duracion else 0:.0f}/s)"
+            )
+        )
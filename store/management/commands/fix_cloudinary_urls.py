@@ -1,42 +1,173 @@
-from django.apps import apps
-from django.core.management.base import BaseCommand
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from cloudinary.models import CloudinaryField
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.db.models import Q
+from django.db.models.functions import Cast
+
+from store.cache import ANUNCIOS, CATALOGO, CATEGORIAS, incrementar_generacion
+from store.category_tree import invalidate_category_tree
 
 
 class Command(BaseCommand):
-    help = "Replace http:// with https:// in CloudinaryField URLs across all models"
+    help = (
+        "Replace http:// with https:// in CloudinaryField URLs across all models, "
+        "streaming matching rows in chunks and writing them with bulk_update. "
+        "Only rows still containing http:// are read, so an interrupted run is "
+        "resumed by running it again"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows fetched per chunk and written per bulk_update (default 500)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change without writing anything",
+        )
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            metavar="APP_LABEL.MODEL",
+            help="Only process this model (repeatable; default: every model "
+            "with a CloudinaryField)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Models processed in parallel, one DB connection each "
+            "(forced to 1 on SQLite)",
+        )
 
     def handle(self, *args, **options):
-        total_fields = 0
-        total_objects = 0
+        self.batch_size = max(options["batch_size"], 1)
+        self.dry_run = options["dry_run"]
+        self.lock = threading.Lock()
 
-        for model in apps.get_models():
-            cloudinary_fields = [
-                field.name for field in model._meta.get_fields()
-                if isinstance(field, CloudinaryField)
-            ]
-            if not cloudinary_fields:
-                continue
-
-            queryset = model.objects.all()
-            for obj in queryset:
-                updated_fields = []
-                for field_name in cloudinary_fields:
-                    value = getattr(obj, field_name)
-                    if not value:
-                        continue
-                    value_str = str(value)
-                    if "http://" in value_str:
-                        setattr(obj, field_name, value_str.replace("http://", "https://"))
-                        updated_fields.append(field_name)
-
-                if updated_fields:
-                    obj.save(update_fields=updated_fields)
-                    total_objects += 1
-                    total_fields += len(updated_fields)
+        trabajos = self.modelos(options["models"])
+        workers = max(options["workers"], 1)
+        if workers > 1 and connection.vendor == "sqlite":
+            self.stderr.write(
+                self.style.WARNING("SQLite allows a single writer: using --workers 1")
+            )
+            workers = 1
+
+        inicio = time.monotonic()
+        resultados = []
+        if workers == 1:
+            resultados = [self.procesar(model, campos) for model, campos in trabajos]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futuros = [
+                    executor.submit(self.procesar_en_hilo, model, campos)
+                    for model, campos in trabajos
+                ]
+                resultados = [futuro.result() for futuro in as_completed(futuros)]
+
+        total_objects = sum(objetos for objetos, _ in resultados)
+        total_fields = sum(campos for _, campos in resultados)
 
+        if total_objects and not self.dry_run:
+            # bulk_update no dispara señales: se invalidan las cachés con URLs de imagen
+            for namespace in (CATALOGO, CATEGORIAS, ANUNCIOS):
+                incrementar_generacion(namespace)
+            invalidate_category_tree()
+
+        accion = "Would update" if self.dry_run else "Updated"
         self.stdout.write(
             self.style.SUCCESS(
-                f"Updated {total_fields} fields across {total_objects} objects"
+                f"{accion} {total_fields} fields across {total_objects} objects "
+                f"in {time.monotonic() - inicio:.1f}s"
             )
         )
+
+    def modelos(self, etiquetas):
+        """(modelo, [campos CloudinaryField]) de los modelos a procesar."""
+        if etiquetas:
+            try:
+                candidatos = [apps.get_model(etiqueta) for etiqueta in etiquetas]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+        else:
+            candidatos = apps.get_models()
+
+        trabajos = []
+        for model in candidatos:
+            campos = [
+                field.name
+                for field in model._meta.get_fields()
+                if isinstance(field, CloudinaryField)
+            ]
+            if campos:
+                trabajos.append((model, campos))
+        return trabajos
+
+    def escribir(self, mensaje):
+        with self.lock:
+            self.stdout.write(mensaje)
+
+    def procesar_en_hilo(self, model, campos):
+        try:
+            return self.procesar(model, campos)
+        finally:
+            # Cada hilo abre su propia conexión: se cierra al terminar
+            connection.close()
+
+    def procesar(self, model, campos):
+        """Recorre por pk las filas con alguna URL http:// y las corrige por lotes."""
+        etiqueta = model._meta.label
+
+        # Solo las filas afectadas, y el valor crudo de la columna: el
+        # CloudinaryResource que devuelve el campo separa el formato de la URL.
+        # Las filas ya corregidas no vuelven a salir, así que repetir el comando
+        # tras una interrupción continúa donde se quedó.
+        crudos = {f"_crudo_{campo}": Cast(campo, models.TextField()) for campo in campos}
+        condicion = Q()
+        for campo in campos:
+            condicion |= Q(**{f"{campo}__contains": "http://"})
+        queryset = model._default_manager.filter(condicion).order_by("pk")
+        filas = queryset.annotate(**crudos).values_list("pk", *crudos).iterator(
+            chunk_size=self.batch_size
+        )
+
+        total_objects = total_fields = escaneadas = 0
+        lote = []
+        for pk, *valores in filas:
+            escaneadas += 1
+            objeto = model(pk=pk)
+            cambiados = 0
+            for campo, valor in zip(campos, valores):
+                if valor and "http://" in valor:
+                    valor = valor.replace("http://", "https://")
+                    cambiados += 1
+                setattr(objeto, campo, valor)
+            if cambiados:
+                lote.append(objeto)
+                total_objects += 1
+                total_fields += cambiados
+            if len(lote) >= self.batch_size:
+                self.escribir_lote(model, campos, lote, escaneadas, total_objects)
+                lote = []
+        if lote:
+            self.escribir_lote(model, campos, lote, escaneadas, total_objects)
+
+        self.escribir(f"{etiqueta}: done, {total_objects} objects / {total_fields} fields")
+        return total_objects, total_fields
+
+    def escribir_lote(self, model, campos, lote, escaneadas, total_objects):
+        if not self.dry_run:
+            model._default_manager.bulk_update(lote, campos)
+        self.escribir(
+            f"{model._meta.label}: {escaneadas} rows scanned, {total_objects} "
+            f"{'to update' if self.dry_run else 'updated'} (last pk {lote[-1].pk})"
+        )
@@ -0,0 +1,90 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.cache import CATALOGO, incrementar_generacion
+from store.catalog_io import Importador, leer_registros
+from store.typeahead import invalidar as invalidar_typeahead
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products (matched by slug), variations and gallery images "
+        "from a streamed CSV or JSON Lines file, in batched transactions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="CSV or JSONL file, or - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            help="Input format (default: from the file extension, jsonl for stdin)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Records per transaction (default 500)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate and run every batch, then roll it back",
+        )
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        formato = options["format"] or ("csv" if ruta.endswith(".csv") else "jsonl")
+        batch_size = max(options["batch_size"], 1)
+        importador = Importador(dry_run=options["dry_run"])
+
+        try:
+            archivo = sys.stdin if ruta == "-" else open(ruta, newline="", encoding="utf-8")
+        except OSError as e:
+            raise CommandError(str(e))
+
+        inicio = time.monotonic()
+        leidos = 0
+        try:
+            lote = []
+            for numero, registro in leer_registros(archivo, formato):
+                lote.append((numero, registro))
+                if len(lote) >= batch_size:
+                    leidos += self.procesar(importador, lote, inicio, leidos)
+                    lote = []
+            if lote:
+                leidos += self.procesar(importador, lote, inicio, leidos)
+        finally:
+            if archivo is not sys.stdin:
+                archivo.close()
+
+        if (importador.creados or importador.actualizados) and not options["dry_run"]:
+            # bulk_create/bulk_update no disparan señales: se invalidan búsquedas,
+            # facetas, páginas cacheadas y el typeahead de todos los procesos
+            incrementar_generacion(CATALOGO)
+            invalidar_typeahead()
+
+        for numero, error in importador.errores:
+            self.stderr.write(self.style.WARNING(f"line {numero}: {error}"))
+
+        duracion = time.monotonic() - inicio
+        prefijo = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefijo}{leidos} records in {duracion:.2f}s "
+                f"({leidos / duracion if duracion else 0:.0f}/s): "
+                f"{importador.creados} created, {importador.actualizados} updated, "
+                f"{importador.variaciones} variations, {importador.imagenes} images, "
+                f"{len(importador.errores)} errors"
+            )
+        )
+
+    def procesar(self, importador, lote, inicio, leidos):
+        importador.importar_lote(lote)
+        leidos += len(lote)
+        duracion = time.monotonic() - inicio
+        self.stdout.write(
+            f"{leidos} records ({leidos / duracion if duracion else 0:.0f}/s)"
+        )
+        return len(lote)
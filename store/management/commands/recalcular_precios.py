@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Producto
+
+
+class Command(BaseCommand):
+    help = "Recalculate the stored precio_final of every Producto and Variacion"
+
+    def handle(self, *args, **options):
+        # recalcular_precios() invalida las cachés del catálogo si cambia algo
+        actualizados = Producto.objects.recalcular_precios()
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated precio_final on {actualizados} rows")
+        )
@@ -0,0 +1,323 @@
+"""
+Métricas del proceso en formato de exposición de Prometheus (vista /metrics).
+
+Registro propio, sin dependencias: contadores e histogramas con etiquetas,
+guardados en memoria y protegidos por un lock. Con gunicorn cada worker es un
+proceso distinto, así que en modo multiproceso (METRICAS_DIR) cada uno escribe
+periódicamente una instantánea en "<METRICAS_DIR>/metricas-<pid>-<uuid>.json" y
+/metrics suma las de todos los procesos. El uuid evita que un PID reutilizado
+sobrescriba la instantánea de otro proceso.
+
+Los ganchos de gunicorn.conf.py mantienen el directorio: al arrancar el master
+se vacía (limpiar_directorio) y al terminar un worker su instantánea se suma a
+"metricas-finalizados.json" (consolidar), así que los contadores no retroceden
+y el número de archivos no crece con cada reciclado de workers.
+
+Métricas de la tienda (se actualizan desde MetricasMiddleware y las vistas):
+
+* store_http_requests_total / store_http_request_duration_seconds por vista
+* store_db_queries_per_request por vista
+* store_page_cache_requests_total (hit/miss) de PaginaCacheMiddleware
+* store_search_queries_total, store_cart_adds_total, store_favorite_toggles_total
+"""
+
+import atexit
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+_lock = threading.Lock()
+_registro = {}
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.valores = {}
+        _registro[nombre] = self
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+        with _lock:
+            self.valores[clave] = self.valores.get(clave, 0) + cantidad
+        _quizas_volcar()
+
+    def exportar(self):
+        with _lock:
+            return [[list(clave), valor] for clave, valor in self.valores.items()]
+
+    @staticmethod
+    def sumar(a, b):
+        return a + b
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, buckets, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = tuple(buckets)
+        self.etiquetas = tuple(etiquetas)
+        self.valores = {}
+        _registro[nombre] = self
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+        # Primer bucket con límite >= valor; len(buckets) es +Inf
+        indice = bisect_left(self.buckets, valor)
+        with _lock:
+            datos = self.valores.get(clave)
+            if datos is None:
+                datos = self.valores[clave] = {
+                    "buckets": [0] * (len(self.buckets) + 1),
+                    "suma": 0.0,
+                    "cuenta": 0,
+                }
+            datos["buckets"][indice] += 1
+            datos["suma"] += valor
+            datos["cuenta"] += 1
+        _quizas_volcar()
+
+    def exportar(self):
+        with _lock:
+            return [
+                [list(clave), {**datos, "buckets": list(datos["buckets"])}]
+                for clave, datos in self.valores.items()
+            ]
+
+    @staticmethod
+    def sumar(a, b):
+        return {
+            "buckets": [x + y for x, y in zip(a["buckets"], b["buckets"])],
+            "suma": a["suma"] + b["suma"],
+            "cuenta": a["cuenta"] + b["cuenta"],
+        }
+
+
+PETICIONES = Contador(
+    "store_http_requests_total", "Requests served, by view", ("view", "method", "status")
+)
+LATENCIA = Histograma(
+    "store_http_request_duration_seconds", "Request latency, by view", BUCKETS_LATENCIA, ("view",)
+)
+CONSULTAS = Histograma(
+    "store_db_queries_per_request", "Database queries per request, by view", BUCKETS_CONSULTAS, ("view",)
+)
+CACHE_PAGINAS = Contador(
+    "store_page_cache_requests_total", "Full-page cache lookups", ("result",)
+)
+BUSQUEDAS = Contador("store_search_queries_total", "Product searches", ("endpoint",))
+CARRITO = Contador("store_cart_adds_total", "Products added to the cart")
+FAVORITOS = Contador("store_favorite_toggles_total", "Favorite toggles", ("action",))
+
+
+# --- Modo multiproceso ---
+
+
+def _directorio():
+    return getattr(settings, "METRICAS_DIR", "")
+
+
+ARCHIVO_FINALIZADOS = "metricas-finalizados.json"
+
+_identificador = (None, "")
+
+
+def _archivo():
+    global _identificador
+    # Se regenera tras un fork: cada proceso escribe su propio archivo
+    pid = os.getpid()
+    if _identificador[0] != pid:
+        _identificador = (pid, f"{pid}-{uuid.uuid4().hex[:12]}")
+    return os.path.join(_directorio(), f"metricas-{_identificador[1]}.json")
+
+
+def instantanea():
+    """Valores de este proceso: {nombre: [[etiquetas, valor], ...]}."""
+    return {nombre: metrica.exportar() for nombre, metrica in _registro.items()}
+
+
+_ultimo_volcado = 0.0
+
+
+def volcar():
+    """Escribe la instantánea del proceso en METRICAS_DIR (escritura atómica)."""
+    global _ultimo_volcado
+    if not _directorio():
+        return
+    _ultimo_volcado = time.monotonic()
+    ruta = _archivo()
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w") as archivo:
+        json.dump(instantanea(), archivo)
+    os.replace(temporal, ruta)
+
+
+def _quizas_volcar():
+    # Como mucho una escritura por intervalo y proceso: el coste por petición es
+    # una comparación
+    intervalo = getattr(settings, "METRICAS_INTERVALO", 5)
+    if _directorio() and time.monotonic() - _ultimo_volcado >= intervalo:
+        try:
+            volcar()
+        except OSError:
+            pass
+
+
+@atexit.register
+def _volcar_al_salir():
+    try:
+        volcar()
+    except Exception:
+        pass
+
+
+def _leer(ruta):
+    try:
+        with open(ruta) as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return {}  # Un worker escribiendo o un archivo corrupto
+
+
+def _sumar(total, datos):
+    """Suma una instantánea ({nombre: [[etiquetas, valor], ...]}) en 'total'."""
+    for nombre, valores in datos.items():
+        metrica = _registro.get(nombre)
+        if metrica is None:
+            continue
+        destino = total.setdefault(nombre, {})
+        for etiquetas, valor in valores:
+            clave = tuple(etiquetas)
+            destino[clave] = metrica.sumar(destino[clave], valor) if clave in destino else valor
+    return total
+
+
+def agregadas():
+    """Suma la instantánea propia (en vivo) con las de los demás procesos."""
+    total = {nombre: dict((tuple(k), v) for k, v in datos) for nombre, datos in instantanea().items()}
+    if not _directorio():
+        return total
+    propio = _archivo()
+    for ruta in glob.glob(os.path.join(_directorio(), "metricas-*.json")):
+        if ruta != propio:
+            _sumar(total, _leer(ruta))
+    return total
+
+
+# --- Ganchos de gunicorn (proceso master) ---
+
+
+def limpiar_directorio(directorio):
+    """Borra las instantáneas de una ejecución anterior (on_starting)."""
+    for ruta in glob.glob(os.path.join(directorio, "metricas-*.json*")):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def consolidar(directorio, pid):
+    """
+    Suma las instantáneas del worker 'pid', ya terminado, en ARCHIVO_FINALIZADOS
+    y las borra (child_exit). Solo lo llama el master, de uno en uno.
+    """
+    rutas = glob.glob(os.path.join(directorio, f"metricas-{pid}-*.json"))
+    if not rutas:
+        return
+    destino = os.path.join(directorio, ARCHIVO_FINALIZADOS)
+    total = _sumar({}, _leer(destino))
+    for ruta in rutas:
+        _sumar(total, _leer(ruta))
+    temporal = f"{destino}.tmp"
+    with open(temporal, "w") as archivo:
+        json.dump(
+            {
+                nombre: [[list(clave), valor] for clave, valor in valores.items()]
+                for nombre, valores in total.items()
+            },
+            archivo,
+        )
+    os.replace(temporal, destino)
+    for ruta in rutas:
+        os.remove(ruta)
+
+
+# --- Formato de exposición ---
+
+
+def _escapar(valor):
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = [*zip(nombres, valores), *extra]
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + "}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exposicion():
+    """Texto en formato de exposición de Prometheus (versión 0.0.4)."""
+    lineas = []
+    for nombre, valores in agregadas().items():
+        metrica = _registro[nombre]
+        lineas.append(f"# HELP {nombre} {metrica.ayuda}")
+        lineas.append(f"# TYPE {nombre} {metrica.tipo}")
+        for clave, valor in sorted(valores.items()):
+            if metrica.tipo == "counter":
+                lineas.append(f"{nombre}{_etiquetas(metrica.etiquetas, clave)} {_numero(valor)}")
+                continue
+            acumulado = 0
+            limites = [*map(_numero, metrica.buckets), "+Inf"]
+            for limite, cuenta in zip(limites, valor["buckets"]):
+                acumulado += cuenta
+                lineas.append(
+                    f"{nombre}_bucket"
+                    f"{_etiquetas(metrica.etiquetas, clave, [('le', limite)])} {acumulado}"
+                )
+            lineas.append(f"{nombre}_sum{_etiquetas(metrica.etiquetas, clave)} {_numero(valor['suma'])}")
+            lineas.append(f"{nombre}_count{_etiquetas(metrica.etiquetas, clave)} {valor['cuenta']}")
+    return "\n".join(lineas) + "\n"
+
+
+def vista_metricas(request):
+    """
+    /metrics: 404 si METRICAS_ACTIVAS es False. Con METRICAS_TOKEN exige la
+    cabecera "Authorization: Bearer <token>".
+    """
+    if not getattr(settings, "METRICAS_ACTIVAS", False):
+        raise Http404
+    token = getattr(settings, "METRICAS_TOKEN", "")
+    if token and not hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(exposicion(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def limpiar():
+    """Pone a cero las métricas del proceso (pruebas)."""
+    with _lock:
+        for metrica in _registro.values():
+            metrica.valores.clear()
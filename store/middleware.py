@@ -1,19 +1,293 @@
 # store/middleware.py
 
+import hashlib
+import logging
+import random
+import re
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.urls import Resolver404, resolve
+
+from . import instrumentation, metrics
+from .cache import (ANUNCIOS, CATALOGO, CATEGORIAS, CONFIGURACION, MENU,
+                    get_generaciones)
+from .query_inspection import ConsultasRepetidas, Inspector
+
+logger = logging.getLogger("store.instrumentacion")
+logger_consultas = logging.getLogger("store.consultas")
+
+# Páginas públicas del catálogo que se pueden servir desde la caché
+RUTAS_EXACTAS = ("/",)
+PREFIJOS_CACHEABLES = ("/categoria/", "/etiqueta/", "/producto/")
+
+# Parámetros que no cambian el contenido (campañas, anuncios) y no deben
+# fragmentar la caché
+PARAMETROS_IGNORADOS = ("fbclid", "gclid", "msclkid")
+
+# Cualquier cambio en estos modelos invalida todas las páginas cacheadas
+NAMESPACES_PAGINA = (CATALOGO, CATEGORIAS, MENU, ANUNCIOS, CONFIGURACION)
+
+PAGINA_KEY = "store:pagina:{}:{}"
+
+# El token CSRF es distinto en cada respuesta: se guarda un marcador en su lugar
+# y se rellena con un token nuevo al servir la página desde la caché.
+MARCADOR_CSRF = "__STORE_CSRF_TOKEN__"
+_CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def normalizar_query(query_dict):
+    """Query string ordenado, sin valores vacíos ni parámetros de seguimiento."""
+    pares = sorted(
+        (clave, valor)
+        for clave, valores in query_dict.lists()
+        for valor in valores
+        if valor.strip()
+        and not clave.startswith("utm_")
+        and clave not in PARAMETROS_IGNORADOS
+    )
+    return urlencode(pares)
+
+
+class PaginaCacheMiddleware:
+    """
+    Caché de página completa para visitantes anónimos en el catálogo (inicio,
+    categorías, etiquetas y detalle de producto).
+
+    * La clave incluye la ruta, el query string normalizado, la cabecera
+      X-Fragment y las generaciones del catálogo, categorías, menú, anuncios y
+      configuración, así que las señales de store/signals.py invalidan todas
+      las páginas de golpe.
+    * Lo que depende del visitante no se guarda: favoritos y contador del carrito
+      se hidratan en el navegador desde localStorage (main.js) y el token CSRF
+      se sustituye por uno nuevo en cada respuesta servida desde la caché.
+    * Cada respuesta lleva la cabecera X-Cache (HIT/MISS); aciertos y fallos se
+      cuentan en el proceso (store_page_cache_requests_total en /metrics), sin
+      escribir en la caché compartida en cada petición.
+
+    Debe ir después de CsrfViewMiddleware y AuthenticationMiddleware, para que
+    el token servido desde la caché lleve su cookie y se pueda distinguir a los
+    usuarios identificados. PAGE_CACHE_TIMEOUT = 0 la desactiva.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timeout = getattr(settings, "PAGE_CACHE_TIMEOUT", 600)
+        if not timeout or not self.es_cacheable(request):
+            return self.get_response(request)
+
+        clave = self.clave(request)
+        guardada = cache.get(clave)
+        if guardada is not None:
+            metrics.CACHE_PAGINAS.inc(result="hit")
+            return self.respuesta_desde_cache(request, guardada)
+
+        metrics.CACHE_PAGINAS.inc(result="miss")
+        response = self.get_response(request)
+        if request.method == "GET" and self.se_puede_guardar(response):
+            cache.set(clave, self.serializar(response), timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def es_cacheable(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return False
+        if request.path not in RUTAS_EXACTAS and not request.path.startswith(
+            PREFIJOS_CACHEABLES
+        ):
+            return False
+        # Sin cookie de sesión no hace falta cargar la sesión para saber que es anónimo
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                return False
+        return True
+
+    def clave(self, request):
+        generaciones = "-".join(str(g) for g in get_generaciones(*NAMESPACES_PAGINA))
+        partes = "|".join(
+            [
+                request.path,
+                normalizar_query(request.GET),
+                request.headers.get("X-Fragment", ""),
+            ]
+        )
+        return PAGINA_KEY.format(generaciones, hashlib.md5(partes.encode()).hexdigest())
+
+    def se_puede_guardar(self, response):
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return False
+        if not response.get("Content-Type", "").startswith("text/html"):
+            return False
+        cache_control = response.get("Cache-Control", "")
+        return "private" not in cache_control and "no-store" not in cache_control
+
+    def serializar(self, response):
+        contenido = _CSRF_INPUT_RE.sub(
+            rf"\g<1>{MARCADOR_CSRF}\g<2>", response.content.decode(response.charset)
+        )
+        cabeceras = {
+            nombre: valor
+            for nombre, valor in response.items()
+            if nombre.lower() not in ("set-cookie", "content-length")
+        }
+        return {"contenido": contenido, "cabeceras": cabeceras}
 
+    def respuesta_desde_cache(self, request, guardada):
+        contenido = guardada["contenido"]
+        if MARCADOR_CSRF in contenido:
+            # get_token() también hace que CsrfViewMiddleware envíe la cookie
+            contenido = contenido.replace(MARCADOR_CSRF, get_token(request))
+        response = HttpResponse(contenido)
+        for nombre, valor in guardada["cabeceras"].items():
+            response[nombre] = valor
+        response["X-Cache"] = "HIT"
+        return response
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide una fracción de las peticiones (INSTRUMENTACION_MUESTREO, de 0 a 1):
+    consultas SQL y su tiempo, tiempo de plantillas, aciertos y fallos de la
+    caché y tiempo total (ver store/instrumentation.py).
+
+    Las métricas van en la cabecera Server-Timing (visible en las herramientas
+    de desarrollo del navegador) y en una línea del logger "store.instrumentacion"
+    con los valores también en extra["instrumentacion"]. Con muestreo 0 (por
+    defecto) Django descarta el middleware y no cuesta nada. Debe ir el primero
+    para que el tiempo total incluya las páginas servidas desde la caché.
+    """
 
-class CategoriaCacheMiddleware:
     def __init__(self, get_response):
+        self.muestreo = getattr(settings, "INSTRUMENTACION_MUESTREO", 0)
+        if self.muestreo <= 0:
+            raise MiddlewareNotUsed
+        instrumentation.instalar()
         self.get_response = get_response
 
     def __call__(self, request):
-        # Solo cacheamos URLs que comiencen con /categoria/
-        if request.path.startswith("/categoria/"):
-            cache_key = f"categoria_{request.path}"
-            response = cache.get(cache_key)
-            if response is None:
+        if self.muestreo < 1 and random.random() >= self.muestreo:
+            return self.get_response(request)
+
+        medicion = instrumentation.Medicion()
+        token = instrumentation.activar(medicion)
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(medicion):
                 response = self.get_response(request)
-                cache.set(cache_key, response, 60 * 15)  # 15 minutos
-            return response
-        return self.get_response(request)
+        finally:
+            instrumentation.desactivar(token)
+        datos = instrumentation.metricas(medicion, time.perf_counter() - inicio)
+
+        response["Server-Timing"] = instrumentation.server_timing(datos)
+        logger.info(
+            "%s %s %s total=%.1fms db=%d/%.1fms tpl=%.1fms cache=%d/%d",
+            request.method,
+            request.path,
+            response.status_code,
+            datos["total_ms"],
+            datos["consultas"],
+            datos["db_ms"],
+            datos["plantillas_ms"],
+            datos["cache_aciertos"],
+            datos["cache_fallos"],
+            extra={
+                "instrumentacion": {
+                    "metodo": request.method,
+                    "ruta": request.path,
+                    "estado": response.status_code,
+                    **datos,
+                }
+            },
+        )
+        return response
+
+
+class InspeccionConsultasMiddleware:
+    """
+    Detecta consultas repetidas (N+1) y lentas en cada petición (ver
+    store/query_inspection.py). Para desarrollo y CI, según INSPECCION_CONSULTAS:
+
+    * "log": avisa en el logger "store.consultas" con la vista o plantilla de
+      origen de cada forma repetida CONSULTAS_REPETIDAS_UMBRAL veces o más, y de
+      cada consulta que tarde CONSULTA_LENTA_MS o más.
+    * "error": además lanza ConsultasRepetidas, de modo que las pruebas que
+      recorren las vistas con el cliente fallan.
+    * "" (por defecto): Django descarta el middleware.
+    """
+
+    def __init__(self, get_response):
+        self.modo = getattr(settings, "INSPECCION_CONSULTAS", "")
+        if not self.modo:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inspector = Inspector()
+        with connection.execute_wrapper(inspector):
+            response = self.get_response(request)
+
+        for duracion, forma in inspector.lentas:
+            logger_consultas.warning(
+                "Slow query (%.1fms) in %s %s: %s",
+                duracion * 1000, request.method, request.path, forma.describir(),
+            )
+        repetidas = inspector.repetidas()
+        if repetidas:
+            informe = inspector.informe()
+            logger_consultas.warning(
+                "Repeated queries in %s %s (%d total):\n%s",
+                request.method, request.path, inspector.total, informe,
+            )
+            if self.modo == "error":
+                raise ConsultasRepetidas(f"{request.method} {request.path}:\n{informe}")
+        return response
+
+
+class MetricasMiddleware:
+    """
+    Latencia, estado y consultas SQL de cada petición por vista, para /metrics
+    (ver store/metrics.py). Activo con METRICAS_ACTIVAS; cuenta también las
+    páginas servidas desde la caché, por eso va antes de PaginaCacheMiddleware.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICAS_ACTIVAS", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        consultas = [0]
+
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contar):
+            response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        vista = self.vista(request)
+        metrics.PETICIONES.inc(view=vista, method=request.method, status=response.status_code)
+        metrics.LATENCIA.observar(duracion, view=vista)
+        metrics.CONSULTAS.observar(consultas[0], view=vista)
+        return response
+
+    def vista(self, request):
+        # Una página servida desde la caché no llega a resolver la URL
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return "unmatched"
+        return match.view_name
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:36
+
+from django.db import migrations, models
+
+
+def rellenar_rutas(apps, schema_editor):
+    """Calcula 'ruta' y 'nivel' de las categorías existentes a partir de 'padre'."""
+    Categoria = apps.get_model("store", "Categoria")
+    filas = dict(Categoria.objects.values_list("pk", "padre_id"))
+    rutas = {}
+
+    def ruta_de(pk, visitados=()):
+        if pk not in rutas:
+            padre_id = filas.get(pk)
+            if padre_id is None or padre_id not in filas or padre_id in visitados:
+                rutas[pk] = f"/{pk}/"
+            else:
+                rutas[pk] = f"{ruta_de(padre_id, visitados + (pk,))}{pk}/"
+        return rutas[pk]
+
+    categorias = list(Categoria.objects.only("pk"))
+    for categoria in categorias:
+        categoria.ruta = ruta_de(categoria.pk)
+        categoria.nivel = categoria.ruta.count("/") - 2
+    Categoria.objects.bulk_update(categorias, ["ruta", "nivel"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0014_remove_producto_etiqueta_producto_badge"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="categoria",
+            name="nivel",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="categoria",
+            name="ruta",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(rellenar_rutas, migrations.RunPython.noop),
+    ]
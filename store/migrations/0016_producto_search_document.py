@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+from store.search import desinstalar_indice, documento_busqueda, instalar_indice
+
+
+def rellenar_documentos(apps, schema_editor):
+    """Calcula search_document para los productos existentes."""
+    Producto = apps.get_model("store", "Producto")
+    productos = list(Producto.objects.select_related("categoria"))
+    for producto in productos:
+        producto.search_document = documento_busqueda(
+            producto.nombre,
+            producto.categoria.nombre if producto.categoria_id else "",
+            producto.descripcion,
+        )
+    Producto.objects.bulk_update(productos, ["search_document"], batch_size=500)
+
+
+def crear_indice(apps, schema_editor):
+    instalar_indice(schema_editor.connection)
+
+
+def eliminar_indice(apps, schema_editor):
+    desinstalar_indice(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0015_categoria_ruta_materializada"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="producto",
+            name="search_document",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(rellenar_documentos, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
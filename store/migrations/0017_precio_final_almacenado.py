@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:42
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+from store.pricing import aplicar_descuento
+
+
+def rellenar_precios(apps, schema_editor):
+    """Calcula precio_final de los productos y variaciones existentes."""
+    Producto = apps.get_model("store", "Producto")
+    Variacion = apps.get_model("store", "Variacion")
+
+    productos = list(Producto.objects.only("pk", "precio", "descuento"))
+    for producto in productos:
+        producto.precio_final = aplicar_descuento(producto.precio, producto.descuento)
+    Producto.objects.bulk_update(productos, ["precio_final"], batch_size=500)
+
+    variaciones = list(
+        Variacion.objects.select_related("producto").only(
+            "pk", "price_override", "producto__precio", "producto__descuento"
+        )
+    )
+    for variacion in variaciones:
+        base = (
+            variacion.price_override
+            if variacion.price_override is not None
+            else variacion.producto.precio
+        )
+        variacion.precio_final = aplicar_descuento(base, variacion.producto.descuento)
+    Variacion.objects.bulk_update(variaciones, ["precio_final"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0016_producto_search_document"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="producto",
+            name="precio_final",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=0,
+                default=Decimal("0"),
+                editable=False,
+                max_digits=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="variacion",
+            name="precio_final",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=Decimal("0"),
+                editable=False,
+                max_digits=10,
+            ),
+        ),
+        migrations.RunPython(rellenar_precios, migrations.RunPython.noop),
+    ]
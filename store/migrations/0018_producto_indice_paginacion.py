@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0017_precio_final_almacenado"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                fields=["-fecha_creacion", "-id"], name="producto_fecha_id_idx"
+            ),
+        ),
+    ]
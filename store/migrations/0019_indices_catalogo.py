@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0018_producto_indice_paginacion"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="anuncio",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["order"],
+                name="anuncio_activo_orden_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-fecha_creacion", "-id"],
+                name="producto_activo_fecha_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["categoria", "-fecha_creacion", "-id"],
+                name="producto_cat_activo_fecha_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["badge", "-fecha_creacion", "-id"],
+                name="producto_badge_activo_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                condition=models.Q(("descuento__gt", 0), ("is_active", True)),
+                fields=["-fecha_creacion", "-id"],
+                name="producto_oferta_fecha_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["precio_final", "-fecha_creacion", "-id"],
+                name="producto_activo_precio_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0019_indices_catalogo"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-precio_final", "-fecha_creacion", "-id"],
+                name="producto_activo_precdesc_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:33
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0020_indice_precio_desc"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="producto",
+            name="producto_fecha_id_idx",
+        ),
+        migrations.AlterField(
+            model_name="producto",
+            name="precio_final",
+            field=models.DecimalField(
+                decimal_places=0, default=Decimal("0"), editable=False, max_digits=10
+            ),
+        ),
+        migrations.AlterField(
+            model_name="variacion",
+            name="precio_final",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0"), editable=False, max_digits=10
+            ),
+        ),
+    ]
@@ -1,15 +1,23 @@
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from decimal import Decimal, InvalidOperation
 from urllib.parse import urljoin
 
 from ckeditor.fields import RichTextField
 from cloudinary.models import CloudinaryField
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Count
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat, Substr
 from django.templatetags.static import static
+from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 
+from .cache import CATALOGO, incrementar_generacion
+from .images import forzar_https, url_imagen
+from .pricing import aplicar_descuento
+from .search import documento_busqueda
+
 
 # Custom QuerySet para el modelo Categoria
 class CategoriaQuerySet(models.QuerySet):
@@ -26,6 +34,22 @@ class CategoriaQuerySet(models.QuerySet):
         """Devuelve las subcategorías de una categoría específica."""
         return self.filter(padre=categoria)
 
+    def descendientes(self, categoria, incluir_propia=True):
+        """
+        Devuelve la categoría y todas sus subcategorías a cualquier profundidad
+        con una sola consulta por prefijo sobre la ruta materializada. Sin ruta
+        (categoría sin guardar o sin migrar) un prefijo vacío coincidiría con todas:
+        se devuelve solo la propia categoría.
+        """
+        if not categoria.ruta:
+            if incluir_propia and categoria.pk is not None:
+                return self.filter(pk=categoria.pk)
+            return self.none()
+        queryset = self.filter(ruta__startswith=categoria.ruta)
+        if not incluir_propia:
+            queryset = queryset.exclude(pk=categoria.pk)
+        return queryset
+
 
 # Custom Manager para el modelo Categoria
 class CategoriaManager(models.Manager):
@@ -36,6 +60,47 @@ class CategoriaManager(models.Manager):
         """Devuelve las categorías principales con su conteo de productos anotado."""
         return self.get_queryset().principales().con_productos()
 
+    def descendientes(self, categoria, incluir_propia=True):
+        return self.get_queryset().descendientes(categoria, incluir_propia)
+
+    def reconstruir_rutas(self):
+        """
+        Recalcula 'ruta' y 'nivel' de todas las categorías a partir de 'padre'.
+        Lee la tabla en una consulta y solo actualiza las filas que cambian.
+        """
+        filas = {
+            pk: padre_id for pk, padre_id in self.get_queryset().values_list("pk", "padre_id")
+        }
+        rutas = {}
+
+        def ruta_de(pk, visitados=()):
+            if pk not in rutas:
+                padre_id = filas.get(pk)
+                if padre_id is None or padre_id not in filas or padre_id in visitados:
+                    rutas[pk] = f"/{pk}/"
+                else:
+                    rutas[pk] = f"{ruta_de(padre_id, visitados + (pk,))}{pk}/"
+            return rutas[pk]
+
+        cambiadas = []
+        for categoria in self.get_queryset().only("pk", "ruta", "nivel"):
+            ruta = ruta_de(categoria.pk)
+            nivel = ruta.count("/") - 2
+            if categoria.ruta != ruta or categoria.nivel != nivel:
+                categoria.ruta, categoria.nivel = ruta, nivel
+                cambiadas.append(categoria)
+        self.get_queryset().bulk_update(cambiadas, ["ruta", "nivel"], batch_size=500)
+        return len(cambiadas)
+
+    def arbol(self):
+        """
+        Devuelve el árbol de categorías precalculado (ver store/category_tree.py).
+        Se sirve desde la caché: cero consultas si está caliente, una si no.
+        """
+        from .category_tree import get_category_tree
+
+        return get_category_tree()
+
 
 class Categoria(models.Model):
     nombre = models.CharField(max_length=255)  # Aumentado a 255
@@ -55,6 +120,10 @@ class Categoria(models.Model):
         null=True,
         help_text="Imagen circular para la categoría (ej. para la página de inicio)",
     )  # NUEVO CAMPO
+    # Ruta materializada con los IDs de los ancestros, ej: "/1/4/9/".
+    # Permite consultar toda la rama de una categoría con un prefijo indexado.
+    ruta = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+    nivel = models.PositiveSmallIntegerField(default=0, editable=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_modificacion = models.DateTimeField(auto_now=True)
 
@@ -78,17 +147,69 @@ class Categoria(models.Model):
             while Categoria.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
                 self.slug = f"{original_slug}-{contador}"
                 contador += 1
+        ruta_anterior, nivel_anterior = self.ruta, self.nivel
         super().save(*args, **kwargs)
+        self._actualizar_ruta(ruta_anterior, nivel_anterior)
+
+    def _actualizar_ruta(self, ruta_anterior, nivel_anterior):
+        """Mantiene 'ruta'/'nivel' propios y de toda la rama si cambió el padre."""
+        padre = self.padre if self.padre_id else None
+        if padre is not None and padre.ruta:
+            self.ruta = f"{padre.ruta}{self.pk}/"
+        else:
+            self.ruta = f"/{self.pk}/"
+        self.nivel = self.ruta.count("/") - 2
+        if self.ruta == ruta_anterior and self.nivel == nivel_anterior:
+            return
+
+        Categoria.objects.filter(pk=self.pk).update(ruta=self.ruta, nivel=self.nivel)
+        if ruta_anterior:
+            # Reescribe el prefijo de todos los descendientes en una sola sentencia
+            Categoria.objects.filter(ruta__startswith=ruta_anterior).exclude(
+                pk=self.pk
+            ).update(
+                ruta=Concat(Value(self.ruta), Substr("ruta", len(ruta_anterior) + 1)),
+                nivel=F("nivel") + (self.nivel - nivel_anterior),
+            )
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.padre_id:
+            if self.padre_id == self.pk or f"/{self.pk}/" in (self.padre.ruta or ""):
+                raise ValidationError(
+                    {"padre": "Una categoría no puede ser subcategoría de sí misma."}
+                )
 
     def __str__(self):
         return self.nombre
 
+    def get_absolute_url(self):
+        return reverse("categoria", args=[self.slug])
+
+    def ancestros(self):
+        """
+        Devuelve la lista de ancestros, de la raíz al padre directo.
+        Usa la cadena de padres ya cacheada (árbol de categorías) si existe;
+        si no, una única consulta por los IDs de la ruta materializada.
+        """
+        ancestros = []
+        actual = self
+        while (
+            actual.padre_id
+            and Categoria.padre.is_cached(actual)
+            and len(ancestros) <= self.nivel
+        ):
+            actual = actual.padre
+            ancestros.append(actual)
+        if not actual.padre_id:
+            return list(reversed(ancestros))
+        ids = [int(pk) for pk in self.ruta.strip("/").split("/") if pk][:-1]
+        return list(Categoria.objects.filter(pk__in=ids).order_by("nivel"))
+
     @property
     def ruta_completa(self):
         """Devuelve la ruta completa de la categoría, ej: 'Electrónica > Smartphones'."""
-        if self.padre:
-            return f"{self.padre.ruta_completa} > {self.nombre}"
-        return self.nombre
+        return " > ".join([c.nombre for c in self.ancestros()] + [self.nombre])
 
 
 class Favorito(models.Model):
@@ -110,14 +231,133 @@ class Favorito(models.Model):
     def __str__(self):
         return f"Favorito: {self.producto.nombre} - Session: {self.session_key}"
 
-def _force_https(url: str) -> str:
-    if not url:
-        return url
-    if url.startswith("//"):
-        return "https:" + url
-    if url.startswith("http://"):
-        return "https://" + url[len("http://"):]
-    return url
+# Campos de los que depende el precio final almacenado
+CAMPOS_PRECIO_PRODUCTO = frozenset({"precio", "descuento"})
+CAMPOS_PRECIO_VARIACION = frozenset({"price_override", "producto", "producto_id"})
+
+
+# Custom QuerySet para el modelo Producto
+class ProductoQuerySet(models.QuerySet):
+    def activos(self):
+        """Devuelve solo los productos activos."""
+        return self.filter(is_active=True)
+
+    def en_categoria(self, categoria):
+        """Productos de la categoría y de todas sus subcategorías (prefijo de ruta)."""
+        if not categoria.ruta:
+            # Un prefijo vacío coincidiría con todo el catálogo
+            if categoria.pk is None:
+                return self.none()
+            return self.filter(categoria_id=categoria.pk)
+        return self.filter(categoria__ruta__startswith=categoria.ruta)
+
+    def para_listado(self):
+        """
+        Prepara el QuerySet para las cuadrículas de productos: trae la categoría en el
+        mismo JOIN y precarga imágenes y variaciones ya ordenadas, de modo que
+        get_primary_image_url() y product_card.html no hagan consultas por producto.
+        """
+        return self.select_related("categoria").prefetch_related(
+            models.Prefetch(
+                "images", queryset=ProductImage.objects.order_by("order", "id")
+            ),
+            models.Prefetch("variaciones", queryset=Variacion.objects.order_by("id")),
+        )
+
+    def en_rango_precio(self, minimo=None, maximo=None):
+        """Filtra por el precio final almacenado (con descuento aplicado)."""
+        queryset = self
+        if minimo is not None:
+            queryset = queryset.filter(precio_final__gte=minimo)
+        if maximo is not None:
+            queryset = queryset.filter(precio_final__lte=maximo)
+        return queryset
+
+    def update(self, **kwargs):
+        """
+        update() no pasa por save() ni dispara señales: si cambia el precio o el
+        descuento se recalcula después el precio final de los productos
+        afectados, y si cambia alguna fila se invalidan las cachés del catálogo.
+        """
+        if CAMPOS_PRECIO_PRODUCTO.intersection(kwargs):
+            pks = list(self.values_list("pk", flat=True))
+            filas = super().update(**kwargs)
+            self.model._default_manager.filter(pk__in=pks)._recalcular_precios()
+        else:
+            filas = super().update(**kwargs)
+        if filas:
+            incrementar_generacion(CATALOGO)
+        return filas
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for producto in objs:
+            producto.precio_final = producto.get_precio_final()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if not CAMPOS_PRECIO_PRODUCTO.intersection(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        for producto in objs:
+            producto.precio_final = producto.get_precio_final()
+        if "precio_final" not in fields:
+            fields.append("precio_final")
+        filas = super().bulk_update(objs, fields, *args, **kwargs)
+        Variacion.objects.filter(producto__in=[p.pk for p in objs]).recalcular_precios()
+        return filas
+
+    def recalcular_precios(self):
+        """
+        Recalcula 'precio_final' de los productos del QuerySet y de sus
+        variaciones, guardando solo las filas que cambian, e invalida las cachés
+        del catálogo si cambia alguna. Devuelve cuántas filas se actualizaron.
+        """
+        actualizadas = self._recalcular_precios()
+        if actualizadas:
+            incrementar_generacion(CATALOGO)
+        return actualizadas
+
+    def _recalcular_precios(self):
+        cambiados = []
+        pks = []
+        for producto in self.only("pk", "precio", "descuento", "precio_final").iterator():
+            pks.append(producto.pk)
+            precio_final = producto.get_precio_final()
+            if producto.precio_final != precio_final:
+                producto.precio_final = precio_final
+                cambiados.append(producto)
+        super().bulk_update(cambiados, ["precio_final"], batch_size=500)
+        return len(cambiados) + Variacion.objects.filter(
+            producto__in=pks
+        )._recalcular_precios()
+
+
+# Custom Manager para el modelo Producto
+class ProductoManager(models.Manager):
+    def get_queryset(self):
+        return ProductoQuerySet(self.model, using=self._db)
+
+    def activos(self):
+        return self.get_queryset().activos()
+
+    def en_categoria(self, categoria):
+        return self.get_queryset().en_categoria(categoria)
+
+    def para_listado(self):
+        """Productos listos para renderizar en un listado (ver ProductoQuerySet.para_listado)."""
+        return self.get_queryset().para_listado()
+
+    def en_rango_precio(self, minimo=None, maximo=None):
+        return self.get_queryset().en_rango_precio(minimo, maximo)
+
+    def recalcular_precios(self):
+        return self.get_queryset().recalcular_precios()
+
+
 class Producto(models.Model):
     # Opciones para la etiqueta del producto (renombrado de ETIQUETA_CHOICES a BADGE_CHOICES)
     BADGE_CHOICES = [
@@ -166,11 +406,64 @@ class Producto(models.Model):
         verbose_name="Etiqueta/Insignia",  # verbose_name actualizado
         help_text="Selecciona una etiqueta o insignia para mostrar en el producto (solo se mostrará una)",
     )
+    # Precio con descuento ya aplicado, para ordenar y filtrar en la base de datos
+    # (los índices parciales de Meta.indexes cubren los listados por precio)
+    precio_final = models.DecimalField(
+        max_digits=10,
+        decimal_places=0,
+        default=Decimal("0"),
+        editable=False,
+    )
+    # Texto normalizado para la búsqueda de texto completo (ver store/search.py)
+    search_document = models.TextField(blank=True, default="", editable=False)
+
+    objects = ProductoManager()
 
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         ordering = ["-fecha_creacion"]
+        indexes = [
+            # Los listados de la tienda solo muestran productos activos: índices
+            # parciales (más pequeños) con el orden del catálogo para cada filtro,
+            # también para la paginación por cursor (store/pagination.py)
+            models.Index(
+                fields=["-fecha_creacion", "-id"],
+                condition=models.Q(is_active=True),
+                name="producto_activo_fecha_idx",
+            ),
+            # Categoría: JOIN por categoria_id desde las categorías de la rama
+            models.Index(
+                fields=["categoria", "-fecha_creacion", "-id"],
+                condition=models.Q(is_active=True),
+                name="producto_cat_activo_fecha_idx",
+            ),
+            # productos_por_etiqueta
+            models.Index(
+                fields=["badge", "-fecha_creacion", "-id"],
+                condition=models.Q(is_active=True),
+                name="producto_badge_activo_idx",
+            ),
+            # Filtro de ofertas (?ofertas=true)
+            models.Index(
+                fields=["-fecha_creacion", "-id"],
+                condition=models.Q(is_active=True, descuento__gt=0),
+                name="producto_oferta_fecha_idx",
+            ),
+            # Orden y rango por precio final, en los dos sentidos: el desempate
+            # (más recientes primero) no cambia, así que el índice ascendente
+            # no sirve recorrido al revés para precio_desc
+            models.Index(
+                fields=["precio_final", "-fecha_creacion", "-id"],
+                condition=models.Q(is_active=True),
+                name="producto_activo_precio_idx",
+            ),
+            models.Index(
+                fields=["-precio_final", "-fecha_creacion", "-id"],
+                condition=models.Q(is_active=True),
+                name="producto_activo_precdesc_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -180,20 +473,61 @@ class Producto(models.Model):
             while Producto.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
                 self.slug = f"{original_slug}-{contador}"
                 contador += 1
+        self.search_document = self.build_search_document()
+        self.precio_final = self.get_precio_final()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if CAMPOS_PRECIO_PRODUCTO & update_fields:
+                update_fields.add("precio_final")
+            if {"nombre", "descripcion", "categoria"} & update_fields:
+                update_fields.add("search_document")
+            kwargs["update_fields"] = update_fields
+
+        # Un producto nuevo aún no tiene variaciones que recalcular
+        precios_cargados = getattr(self, "_precios_cargados", None)
+        precios_cambiaron = not self._state.adding and precios_cargados != (
+            self.precio,
+            self.descuento,
+        )
         super().save(*args, **kwargs)
+        self._precios_cargados = (self.precio, self.descuento)
+        if precios_cambiaron:
+            # Las variaciones sin precio propio heredan precio y descuento
+            Variacion.objects.filter(producto=self).recalcular_precios()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Permite saber en save() si hay que recalcular las variaciones
+        instancia._precios_cargados = (
+            instancia.__dict__.get("precio"),
+            instancia.__dict__.get("descuento"),
+        )
+        return instancia
+
+    def build_search_document(self):
+        """Texto indexado por la búsqueda: nombre, categoría y descripción."""
+        return documento_busqueda(
+            self.nombre,
+            self.categoria.nombre if self.categoria_id else "",
+            self.descripcion,
+        )
 
     def get_precio_final(self):
-        precio_decimal = Decimal(self.precio)
-        descuento_decimal = Decimal(self.descuento)
-        if descuento_decimal > 0:
-            final_price = precio_decimal * (1 - descuento_decimal)
-            # Redondea a 0 decimales usando ROUND_HALF_UP (redondeo tradicional)
-            return final_price.quantize(Decimal("1"), rounding=ROUND_HALF_UP)
-        return precio_decimal
+        """
+        Calcula el precio con descuento a partir de 'precio' y 'descuento'. Para
+        mostrar un producto ya guardado basta con el campo 'precio_final'.
+        """
+        return aplicar_descuento(self.precio, self.descuento)
 
     def __str__(self):
         return self.nombre
-    
+
+    def get_absolute_url(self):
+        return reverse("producto_detalle", args=[self.pk])
+
     def get_precio_schema(self) -> str:
         """
         Devuelve el precio para schema.org con punto decimal y 2 decimales (e.g. '12000.00').
@@ -207,6 +541,19 @@ class Producto(models.Model):
             return ""
 
     
+    def get_primary_image(self):
+        """
+        Imagen principal como recurso de Cloudinary (campo imagen o primera de la
+        galería), para generar variantes responsive. None si no hay ninguna.
+        """
+        if self.imagen:
+            return self.imagen
+        if self.pk:
+            # images.all() reutiliza el prefetch de para_listado()
+            for imagen in self.images.all():
+                return imagen.image or None
+        return None
+
     def get_primary_image_url(self, absolute: bool = False) -> str:
         """
         Devuelve la URL de la imagen principal del producto:
@@ -220,24 +567,26 @@ class Producto(models.Model):
         # 1) Imagen principal
         if getattr(self, "imagen", None):
             try:
-                url = self.imagen.url
+                url = url_imagen(self.imagen)
             except Exception:
                 url = None
 
-        # 2) Primera imagen de la galería
-        if not url and hasattr(self, "images") and self.images.exists():
-            first = self.images.first()
-            try:
-                url = first.image.url  # ajusta si tu campo se llama distinto
-            except Exception:
-                url = None
+        # 2) Primera imagen de la galería. Se itera images.all() en lugar de
+        # exists()/first() para reutilizar el prefetch de para_listado().
+        if not url and self.pk:
+            first = next(iter(self.images.all()), None)
+            if first is not None:
+                try:
+                    url = url_imagen(first.image)  # ajusta si tu campo se llama distinto
+                except Exception:
+                    url = None
 
         # 3) Fallback estático
         if not url:
             url = static("img/sin_imagen.jpg")
 
-        # Forzar HTTPS
-        url = _force_https(url)
+        # Forzar HTTPS (url_imagen ya la devuelve así; queda por el fallback estático)
+        url = forzar_https(url)
 
         # Volver absoluta si se pide y la URL es relativa (empieza por "/")
         if absolute and url.startswith("/"):
@@ -283,6 +632,76 @@ class ProductImage(models.Model):
         return f"Imagen para {self.producto.nombre} (Orden: {self.order})"
 
 
+class VariacionQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Como ProductoQuerySet.update(): recalcula el precio final si hace falta e
+        invalida las cachés del catálogo.
+        """
+        if CAMPOS_PRECIO_VARIACION.intersection(kwargs):
+            pks = list(self.values_list("pk", flat=True))
+            filas = super().update(**kwargs)
+            self.model._default_manager.filter(pk__in=pks)._recalcular_precios()
+        else:
+            filas = super().update(**kwargs)
+        if filas:
+            incrementar_generacion(CATALOGO)
+        return filas
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for variacion in objs:
+            variacion.precio_final = variacion.calcular_precio_final()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if CAMPOS_PRECIO_VARIACION.intersection(fields):
+            for variacion in objs:
+                variacion.precio_final = variacion.calcular_precio_final()
+            if "precio_final" not in fields:
+                fields.append("precio_final")
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def recalcular_precios(self):
+        """
+        Recalcula 'precio_final', guarda solo las filas que cambian e invalida
+        las cachés del catálogo si cambia alguna.
+        """
+        actualizadas = self._recalcular_precios()
+        if actualizadas:
+            incrementar_generacion(CATALOGO)
+        return actualizadas
+
+    def _recalcular_precios(self):
+        cambiadas = []
+        variaciones = self.select_related("producto").only(
+            "pk",
+            "price_override",
+            "precio_final",
+            "producto__precio",
+            "producto__descuento",
+        )
+        for variacion in variaciones.iterator():
+            precio_final = variacion.calcular_precio_final()
+            if variacion.precio_final != precio_final:
+                variacion.precio_final = precio_final
+                cambiadas.append(variacion)
+        super().bulk_update(cambiadas, ["precio_final"], batch_size=500)
+        return len(cambiadas)
+
+
+class VariacionManager(models.Manager):
+    def get_queryset(self):
+        return VariacionQuerySet(self.model, using=self._db)
+
+    def recalcular_precios(self):
+        return self.get_queryset().recalcular_precios()
+
+
 class Variacion(models.Model):
     producto = models.ForeignKey(
         Producto, on_delete=models.CASCADE, related_name="variaciones"
@@ -311,6 +730,15 @@ class Variacion(models.Model):
         null=True,
         help_text="Opcional: Precio para esta variación. Si está vacío, usa el precio del producto principal.",
     )
+    # Precio con el descuento del producto aplicado (ver calcular_precio_final)
+    precio_final = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal("0"),
+        editable=False,
+    )
+
+    objects = VariacionManager()
 
     class Meta:
         unique_together = ("producto", "nombre", "valor")
@@ -329,19 +757,21 @@ class Variacion(models.Model):
             parts.append(self.presentacion)
         return " - ".join(parts)
 
-    @property
-    def precio_final(self):
+    def save(self, *args, **kwargs):
+        self.precio_final = self.calcular_precio_final()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and CAMPOS_PRECIO_VARIACION & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"precio_final"}
+        super().save(*args, **kwargs)
+
+    def calcular_precio_final(self):
+        """Precio propio (o el del producto) con el descuento del producto aplicado."""
         base_price = (
             self.price_override
             if self.price_override is not None
             else self.producto.precio
         )
-        base_price_decimal = Decimal(base_price)  # Asegurarse de que sea Decimal
-        if self.producto.descuento and self.producto.descuento > 0:
-            final_price = base_price_decimal * (1 - Decimal(self.producto.descuento))
-            # Redondea a 0 decimales usando ROUND_HALF_UP (redondeo tradicional)
-            return final_price.quantize(Decimal("1"), rounding=ROUND_HALF_UP)
-        return base_price_decimal
+        return aplicar_descuento(base_price, self.producto.descuento)
 
 
 class MenuItem(models.Model):
@@ -399,6 +829,14 @@ class Anuncio(models.Model):
         verbose_name = "Anuncio"
         verbose_name_plural = "Anuncios"
         ordering = ["order", "-fecha_creacion"]
+        indexes = [
+            # Carrusel de inicio: activos por orden
+            models.Index(
+                fields=["order"],
+                condition=models.Q(is_active=True),
+                name="anuncio_activo_orden_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.titulo
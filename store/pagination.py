@@ -0,0 +1,141 @@
+"""
+Paginación por cursor (keyset) para los listados de productos.
+
+En lugar de COUNT(*) + OFFSET, cada página pide las filas que van "después" de
+la última fila de la página anterior según el orden del listado, por ejemplo
+(fecha_creacion, id). Con un índice sobre esas columnas, la página 1 y la 500
+cuestan lo mismo: una consulta por rango. El cursor es la tupla de valores de
+esa última fila codificada en base64 para la URL.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import re
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+
+from .cache import CATALOGO, clave as clave_cache
+
+# Orden por defecto del catálogo; 'id' desempata productos creados a la vez
+ORDEN_CATALOGO = ("-fecha_creacion", "-id")
+
+PRODUCTOS_POR_PAGINA = 12
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class PaginaCursor:
+    """Una página de resultados y el cursor para pedir la siguiente."""
+
+    es_cursor = True
+
+    def __init__(self, object_list, siguiente_cursor=None):
+        self.object_list = object_list
+        self.siguiente_cursor = siguiente_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.siguiente_cursor is not None
+
+
+class CursorPaginator:
+    """
+    Pagina un QuerySet por cursor sobre 'orden', una tupla de campos con '-'
+    opcional para orden descendente. El último campo debe ser único (el id) para
+    que el orden sea total y ninguna fila se repita o se salte entre páginas.
+    """
+
+    def __init__(self, queryset, por_pagina=PRODUCTOS_POR_PAGINA, orden=ORDEN_CATALOGO):
+        self.queryset = queryset.order_by(*orden)
+        self.por_pagina = por_pagina
+        self.orden = [
+            (campo.lstrip("-"), campo.startswith("-")) for campo in orden
+        ]
+
+    def codificar(self, objeto):
+        valores = [getattr(objeto, campo) for campo, _ in self.orden]
+        texto = json.dumps([None if v is None else str(v) for v in valores])
+        return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+    def decodificar(self, cursor):
+        try:
+            relleno = "=" * (-len(cursor) % 4)
+            valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        except (binascii.Error, ValueError, UnicodeDecodeError):
+            raise CursorInvalido(cursor)
+        if not isinstance(valores, list) or len(valores) != len(self.orden):
+            raise CursorInvalido(cursor)
+        modelo = self.queryset.model
+        try:
+            return [
+                None if valor is None else modelo._meta.get_field(campo).to_python(valor)
+                for (campo, _), valor in zip(self.orden, valores)
+            ]
+        except Exception:
+            raise CursorInvalido(cursor)
+
+    def _despues_de(self, valores):
+        """
+        Condición "fila > cursor" en el orden del listado, expandida campo a campo:
+        (a < x) OR (a = x AND b < y) OR ... para columnas descendentes.
+        """
+        condicion = Q()
+        iguales = {}
+        for (campo, descendente), valor in zip(self.orden, valores):
+            operador = "lt" if descendente else "gt"
+            condicion |= Q(**iguales, **{f"{campo}__{operador}": valor})
+            iguales[campo] = valor
+        return condicion
+
+    def pagina(self, cursor=None):
+        """Devuelve la página que sigue al cursor (la primera si no hay cursor)."""
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self._despues_de(self.decodificar(cursor)))
+        # Se pide una fila extra solo para saber si hay página siguiente
+        filas = list(queryset[: self.por_pagina + 1])
+        siguiente = None
+        if len(filas) > self.por_pagina:
+            filas = filas[: self.por_pagina]
+            siguiente = self.codificar(filas[-1])
+        return PaginaCursor(filas, siguiente)
+
+
+_FILAS_PLAN_RE = re.compile(r"rows=(\d+)")
+
+
+def total_estimado(queryset):
+    """
+    Número aproximado de resultados, para mostrar "~N productos" sin un COUNT
+    en cada página. En PostgreSQL se usa la estimación del planificador; en los
+    demás motores, un COUNT cacheado hasta el siguiente cambio del catálogo.
+    """
+    queryset = queryset.order_by()
+    conexion = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    if conexion.vendor == "postgresql":
+        with conexion.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}", params)
+            coincidencia = _FILAS_PLAN_RE.search(cursor.fetchone()[0])
+        if coincidencia:
+            return int(coincidencia.group(1))
+
+    huella = hashlib.md5(repr((sql, [str(p) for p in params])).encode()).hexdigest()
+    clave = clave_cache(CATALOGO, "total", huella)
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, 60 * 60)
+    return total
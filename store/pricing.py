@@ -0,0 +1,16 @@
+"""Cálculo del precio final con descuento, compartido por modelos y migraciones."""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+
+def aplicar_descuento(precio, descuento):
+    """
+    Aplica un descuento porcentual (0.10 = 10%) a un precio.
+    Con descuento, redondea a 0 decimales usando ROUND_HALF_UP (redondeo tradicional).
+    """
+    precio_decimal = Decimal(precio or 0)
+    descuento_decimal = Decimal(descuento or 0)
+    if descuento_decimal > 0:
+        final_price = precio_decimal * (1 - descuento_decimal)
+        return final_price.quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+    return precio_decimal
@@ -0,0 +1,149 @@
+"""
+Detector de consultas repetidas (N+1) y lentas, para desarrollo y CI.
+
+Inspector se instala con connection.execute_wrapper y agrupa las consultas por
+su forma: el SQL con literales y listas IN (...) sustituidos por "?", de modo
+que "WHERE producto_id = 3" y "WHERE producto_id = 7" cuentan como la misma.
+Una forma que se repite UMBRAL veces o más en una petición suele ser un bucle
+que consulta por elemento. Cada forma guarda su origen: la primera línea del
+proyecto en la pila (vista, modelo...) y, si se lanzó al renderizar, la
+plantilla y línea.
+
+* InspeccionConsultasMiddleware (store/middleware.py) lo aplica a cada petición
+  y avisa en el logger "store.consultas" o lanza ConsultasRepetidas.
+* sin_consultas_repetidas() hace fallar un bloque de una prueba.
+"""
+
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+UMBRAL_REPETICIONES = 3
+
+_LITERALES_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTA_IN_RE = re.compile(r"\bIN \((?:\s*(?:\?|%s)\s*,?)+\)", re.IGNORECASE)
+_ESPACIOS_RE = re.compile(r"\s+")
+# Control de transacciones: se repite por diseño y no es un N+1
+_IGNORADAS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT", "BEGIN", "COMMIT")
+
+_ESTE_ARCHIVO = os.path.abspath(__file__)
+
+
+class ConsultasRepetidas(AssertionError):
+    """Se lanzó la misma forma de consulta demasiadas veces (N+1)."""
+
+
+def forma_sql(sql):
+    """SQL con literales y listas IN normalizados: identifica consultas 'iguales'."""
+    forma = _LITERALES_RE.sub("?", sql)
+    forma = _LISTA_IN_RE.sub("IN (...)", forma)
+    return _ESPACIOS_RE.sub(" ", forma).strip()
+
+
+def _origen():
+    """(línea del proyecto, línea de plantilla) que lanzó la consulta."""
+    raiz = str(settings.BASE_DIR)
+    codigo = plantilla = None
+    frame = sys._getframe(2)
+    while frame is not None and (codigo is None or plantilla is None):
+        archivo = frame.f_code.co_filename
+        if (
+            codigo is None
+            and archivo.startswith(raiz)
+            and archivo != _ESTE_ARCHIVO
+            and "site-packages" not in archivo
+        ):
+            codigo = f"{os.path.relpath(archivo, raiz)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        if plantilla is None and frame.f_code.co_name == "render_annotated":
+            # Node.render_annotated(self, context) de django.template.base: el nodo
+            # más interno que se está renderizando
+            nodo = frame.f_locals.get("self")
+            origen = getattr(nodo, "origin", None)
+            token = getattr(nodo, "token", None)
+            if origen is not None and token is not None:
+                plantilla = f"{origen.template_name}:{token.lineno}"
+        frame = frame.f_back
+    return codigo, plantilla
+
+
+class Forma:
+    __slots__ = ("sql", "veces", "tiempo", "origen", "plantilla")
+
+    def __init__(self, sql, origen, plantilla):
+        self.sql = sql
+        self.veces = 0
+        self.tiempo = 0.0
+        self.origen = origen
+        self.plantilla = plantilla
+
+    def describir(self):
+        donde = self.origen or "?"
+        if self.plantilla:
+            donde += f" (template {self.plantilla})"
+        return f"{self.veces}x {self.tiempo * 1000:.1f}ms {donde}: {self.sql[:300]}"
+
+
+class Inspector:
+    """Callable para connection.execute_wrapper que agrupa las consultas por forma."""
+
+    def __init__(self, umbral_lenta_ms=None):
+        if umbral_lenta_ms is None:
+            umbral_lenta_ms = getattr(settings, "CONSULTA_LENTA_MS", 100)
+        self.umbral_lenta = umbral_lenta_ms / 1000
+        self.formas = {}
+        self.lentas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            if not sql.lstrip().upper().startswith(_IGNORADAS):
+                forma = forma_sql(sql)
+                registro = self.formas.get(forma)
+                if registro is None:
+                    registro = self.formas[forma] = Forma(forma, *_origen())
+                registro.veces += 1
+                registro.tiempo += duracion
+                if duracion >= self.umbral_lenta:
+                    self.lentas.append((duracion, registro))
+
+    @property
+    def total(self):
+        return sum(forma.veces for forma in self.formas.values())
+
+    def repetidas(self, umbral=None):
+        """Formas lanzadas 'umbral' veces o más, de la más repetida a la menos."""
+        umbral = umbral or getattr(settings, "CONSULTAS_REPETIDAS_UMBRAL", UMBRAL_REPETICIONES)
+        return sorted(
+            (forma for forma in self.formas.values() if forma.veces >= umbral),
+            key=lambda forma: -forma.veces,
+        )
+
+    def informe(self, umbral=None):
+        return "\n".join(forma.describir() for forma in self.repetidas(umbral))
+
+
+@contextmanager
+def inspeccionar_consultas(umbral_lenta_ms=None):
+    """Inspecciona las consultas del bloque: 'with inspeccionar_consultas() as i'."""
+    inspector = Inspector(umbral_lenta_ms)
+    with connection.execute_wrapper(inspector):
+        yield inspector
+
+
+@contextmanager
+def sin_consultas_repetidas(umbral=None):
+    """Para pruebas: lanza ConsultasRepetidas si el bloque tiene un N+1."""
+    with inspeccionar_consultas() as inspector:
+        yield inspector
+    if inspector.repetidas(umbral):
+        raise ConsultasRepetidas(
+            f"Consultas repetidas ({inspector.total} en total):\n{inspector.informe(umbral)}"
+        )
@@ -0,0 +1,273 @@
+"""
+Búsqueda de texto completo de productos.
+
+Cada Producto guarda en 'search_document' su nombre, categoría y descripción ya
+normalizados (minúsculas, sin tildes) y reducidos a su raíz en español. Sobre esa
+columna se construye un índice según el motor de base de datos:
+
+* PostgreSQL: columna generada 'search_vector' (tsvector) con índice GIN.
+* SQLite: tabla virtual FTS5 'store_producto_fts' sincronizada por triggers.
+* Otros motores: búsqueda por subcadena sobre 'search_document'.
+
+Como el texto se normaliza igual al guardar y al consultar, los tres backends
+dan los mismos resultados: "Pestañas" encuentra "pestana" y "labiales" encuentra
+"labial".
+"""
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Func, Q, Value
+from django.db.models.expressions import Expression, RawSQL
+
+FTS_TABLE = "store_producto_fts"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Sufijos que se recortan para agrupar singular/plural y género (ej. bases -> bas,
+# base -> bas, labiales -> labial). Es una raíz ligera pensada para nombres cortos
+# de productos, no un stemmer lingüístico completo.
+_SUFIJOS_PLURAL = ("es", "s")
+_VOCALES_FINALES = ("a", "e", "o")
+
+
+def normalizar(texto):
+    """Pasa a minúsculas y elimina tildes y diéresis ('Sérum Ñu' -> 'serum nu')."""
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    """Divide un texto normalizado en palabras alfanuméricas."""
+    return _TOKEN_RE.findall(normalizar(texto))
+
+
+def raiz(token):
+    """Reduce una palabra a su raíz aproximada en español."""
+    if len(token) > 4 and token.endswith(_SUFIJOS_PLURAL[0]):
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith(_SUFIJOS_PLURAL[1]):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith(_VOCALES_FINALES):
+        token = token[:-1]
+    return token
+
+
+def documento_busqueda(*textos):
+    """Construye el contenido de Producto.search_document a partir de varios textos."""
+    return " ".join(raiz(token) for texto in textos for token in tokenizar(texto))
+
+
+def terminos_consulta(consulta):
+    """Raíces de la consulta del usuario, sin repetir y en orden."""
+    return list(dict.fromkeys(raiz(token) for token in tokenizar(consulta)))
+
+
+class ColumnaSinCampo(Expression):
+    """
+    Columna de la tabla del modelo que no es un campo de Django (search_vector).
+    Toma el alias de la tabla de la clave primaria resuelta, así que sigue siendo
+    correcta dentro de subconsultas, uniones o joins que renombran la tabla.
+    """
+
+    def __init__(self, columna, output_field=None):
+        super().__init__(output_field)
+        self.columna = columna
+        self.pk = F("pk")
+
+    def get_source_expressions(self):
+        return [self.pk]
+
+    def set_source_expressions(self, exprs):
+        (self.pk,) = exprs
+
+    def as_sql(self, compiler, connection):
+        alias = compiler.quote_name_unless_alias(self.pk.alias)
+        return f"{alias}.{connection.ops.quote_name(self.columna)}", []
+
+
+class RelevanciaFTS5(Func):
+    """
+    -rank de la tabla FTS5 para la fila de la consulta externa: la subconsulta
+    correlacionada se enlaza con F("pk") resuelto, no con el nombre de la tabla.
+    """
+
+    # Func(match, pk) -> "... MATCH %s AND rowid = <alias>.id"
+    template = f"(SELECT -rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %(expressions)s)"
+    arg_joiner = " AND rowid = "
+    output_field = FloatField()
+
+    def __init__(self, match):
+        super().__init__(Value(match), F("pk"))
+
+
+class SearchBackend:
+    """Backend base: filtra por subcadena sobre 'search_document'."""
+
+    def filtrar(self, queryset, terminos):
+        condicion = Q()
+        for termino in terminos:
+            condicion &= Q(search_document__contains=termino)
+        return queryset.filter(condicion)
+
+    def buscar(self, queryset, consulta):
+        """
+        Filtra 'queryset' por la consulta y lo ordena por relevancia (anotada en
+        'relevancia' cuando el motor la soporta).
+        """
+        terminos = terminos_consulta(consulta)
+        if not terminos:
+            return queryset.none()
+        return self.filtrar(queryset, terminos)
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """Usa la tabla FTS5; cada término se busca como prefijo para la búsqueda en vivo."""
+
+    def expresion_match(self, terminos):
+        # Los términos solo contienen [a-z0-9], así que entre comillas son seguros.
+        return " ".join(f'"{termino}"*' for termino in terminos)
+
+    def filtrar(self, queryset, terminos):
+        match = self.expresion_match(terminos)
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            # bm25 devuelve valores más negativos cuanto más relevante es el producto
+            relevancia=RelevanciaFTS5(match)
+        ).order_by("-relevancia", "-fecha_creacion")
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Usa la columna generada 'search_vector' (tsvector) y su índice GIN."""
+
+    def expresion_tsquery(self, terminos):
+        return " & ".join(f"{termino}:*" for termino in terminos)
+
+    def filtrar(self, queryset, terminos):
+        tsquery = self.expresion_tsquery(terminos)
+        vector = ColumnaSinCampo("search_vector")
+        consulta = Func(Value(tsquery), template="to_tsquery('simple', %(expressions)s)")
+        return queryset.filter(
+            Func(
+                vector, consulta, template="%(expressions)s", arg_joiner=" @@ ",
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            relevancia=Func(vector, consulta, function="ts_rank", output_field=FloatField())
+        ).order_by("-relevancia", "-fecha_creacion")
+
+
+def get_backend():
+    """Devuelve el backend de búsqueda adecuado para la base de datos activa."""
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    if connection.vendor == "sqlite" and fts5_disponible():
+        return SQLiteFTS5Backend()
+    return SearchBackend()
+
+
+def buscar(queryset, consulta):
+    """Atajo: filtra y ordena por relevancia un QuerySet de Producto."""
+    return get_backend().buscar(queryset, consulta)
+
+
+# --- Instalación del índice (migraciones y post_migrate) ---
+
+_SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "search_document, content='store_producto', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON store_producto BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON store_producto BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+    "VALUES ('delete', old.id, old.search_document); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document "
+    "ON store_producto BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+    "VALUES ('delete', old.id, old.search_document); "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END",
+]
+
+_POSTGRES_FTS = [
+    "ALTER TABLE store_producto ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(search_document, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS store_producto_search_vector_gin "
+    "ON store_producto USING GIN (search_vector)",
+]
+
+
+_fts5_por_bd = {}
+
+
+def fts5_disponible():
+    """Indica si la tabla FTS5 existe en la base de datos SQLite activa (memorizado)."""
+    nombre = connection.settings_dict["NAME"]
+    if nombre not in _fts5_por_bd:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [FTS_TABLE],
+            )
+            _fts5_por_bd[nombre] = cursor.fetchone() is not None
+    return _fts5_por_bd[nombre]
+
+
+def instalar_indice(conn=None):
+    """
+    Crea (de forma idempotente) el índice de texto completo del motor activo.
+
+    En SQLite, Django reconstruye la tabla store_producto en algunas migraciones
+    y con ello se pierden los triggers; por eso también se llama en post_migrate,
+    y si faltaba algún trigger se reconstruye el contenido del índice.
+    """
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == "postgresql":
+            for sql in _POSTGRES_FTS:
+                cursor.execute(sql)
+        elif conn.vendor == "sqlite":
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f"{FTS_TABLE}_%"],
+            )
+            triggers_completos = cursor.fetchone()[0] == len(_SQLITE_FTS) - 1
+            for sql in _SQLITE_FTS:
+                cursor.execute(sql)
+            if not triggers_completos:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _fts5_por_bd.pop(conn.settings_dict["NAME"], None)
+
+
+def reparar_indice(conn=None):
+    """
+    Reinstala los triggers de FTS5 si una migración reconstruyó store_producto.
+    No hace nada si el índice aún no se ha creado (migración 0016 sin aplicar).
+    """
+    conn = conn or connection
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+        )
+        existe = cursor.fetchone() is not None
+    if existe:
+        instalar_indice(conn)
+
+
+def desinstalar_indice(conn=None):
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS store_producto_search_vector_gin")
+            cursor.execute("ALTER TABLE store_producto DROP COLUMN IF EXISTS search_vector")
+        elif conn.vendor == "sqlite":
+            for sufijo in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{sufijo}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts5_por_bd.pop(conn.settings_dict["NAME"], None)
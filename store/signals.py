@@ -0,0 +1,93 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .cache import (ANUNCIOS, CATALOGO, CATEGORIAS, CONFIGURACION, MENU,
+                    incrementar_generacion)
+from .category_tree import invalidate_category_tree
+from .models import (Anuncio, Categoria, MenuItem, ProductImage, Producto,
+                     SiteSetting, Variacion)
+from .search import reparar_indice
+from .typeahead import desindexar_producto, indexar_producto, reindexar_categoria
+
+
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Variacion)
+@receiver([post_save, post_delete], sender=Categoria)
+def invalidar_catalogo(sender, **kwargs):
+    """Nueva generación del catálogo: invalida búsquedas y demás datos derivados."""
+    incrementar_generacion(CATALOGO)
+
+
+@receiver([post_save, post_delete], sender=Categoria)
+def invalidar_arbol_categorias(sender, **kwargs):
+    """Cualquier alta, edición o baja de una categoría invalida el árbol cacheado."""
+    invalidate_category_tree()
+    incrementar_generacion(CATEGORIAS)
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def invalidar_menu(sender, **kwargs):
+    """Regenera los fragmentos de navegación y pie de página (base.html)."""
+    incrementar_generacion(MENU)
+
+
+@receiver([post_save, post_delete], sender=SiteSetting)
+def invalidar_configuracion(sender, **kwargs):
+    """Invalida la configuración cacheada del sitio (store/site_config.py)."""
+    incrementar_generacion(CONFIGURACION)
+
+
+@receiver([post_save, post_delete], sender=Anuncio)
+def invalidar_anuncios(sender, **kwargs):
+    """Regenera el fragmento del carrusel de anuncios (index.html)."""
+    incrementar_generacion(ANUNCIOS)
+
+
+@receiver(post_delete, sender=Categoria)
+def reconstruir_rutas_huerfanas(sender, instance, **kwargs):
+    """
+    Al borrar una categoría sus hijas quedan sin padre (SET_NULL) y conservan la
+    ruta antigua: se recalculan las rutas materializadas.
+    """
+    if instance.ruta and Categoria.objects.filter(ruta__startswith=instance.ruta).exists():
+        Categoria.objects.reconstruir_rutas()
+
+
+@receiver(post_save, sender=Categoria)
+def actualizar_documentos_busqueda(sender, instance, created, **kwargs):
+    """Si cambia el nombre de una categoría, se reindexan sus productos."""
+    if created:
+        return
+    productos = list(Producto.objects.filter(categoria=instance).select_related("categoria"))
+    cambiados = []
+    for producto in productos:
+        documento = producto.build_search_document()
+        if documento != producto.search_document:
+            producto.search_document = documento
+            cambiados.append(producto)
+    Producto.objects.bulk_update(cambiados, ["search_document"], batch_size=500)
+
+
+@receiver(post_save, sender=Categoria)
+def actualizar_typeahead_categoria(sender, instance, created, **kwargs):
+    if not created:
+        reindexar_categoria(instance)
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_typeahead_producto(sender, instance, **kwargs):
+    indexar_producto(instance)
+
+
+@receiver(post_delete, sender=Producto)
+def quitar_typeahead_producto(sender, instance, **kwargs):
+    desindexar_producto(instance.pk)
+
+
+@receiver(post_migrate)
+def reparar_indice_busqueda(sender, using, **kwargs):
+    """Restaura los triggers FTS5 que una reconstrucción de tabla de SQLite elimina."""
+    if sender.label == "store":
+        reparar_indice(connections[using])
@@ -0,0 +1,62 @@
+"""
+Configuración del sitio (SiteSetting) y elementos del menú (MenuItem) cacheados.
+
+Ambas tablas son pequeñas y se leen en casi todas las páginas, así que se cargan
+completas con dos consultas y se guardan en dos niveles:
+
+* la caché compartida de Django, con la generación de "menu" y "configuracion"
+  en la clave, para que todos los procesos vean los cambios del admin;
+* una LRUCache local al proceso con la misma clave, que evita incluso la lectura
+  de la caché compartida del objeto completo.
+
+Las señales de store/signals.py incrementan las generaciones al guardar o borrar
+un SiteSetting o un MenuItem.
+"""
+
+from django.core.cache import cache
+
+from .cache import CONFIGURACION, MENU, LRUCache, get_generaciones
+
+CACHE_KEY = "store:configuracion:{}"
+CACHE_TIMEOUT = 60 * 60 * 24  # 24 horas; las señales lo invalidan antes si hay cambios
+
+_local = LRUCache(maxsize=4, ttl=300)
+
+
+class ConfiguracionSitio:
+    """Ajustes clave/valor y menú ordenado, tal como se cargaron de la base de datos."""
+
+    def __init__(self, ajustes, menu_items):
+        self.ajustes = ajustes
+        self.menu_items = menu_items
+
+    def get(self, clave, default=None):
+        return self.ajustes.get(clave, default)
+
+
+def build_configuracion():
+    """Una consulta por tabla."""
+    from .models import MenuItem, SiteSetting
+
+    ajustes = dict(SiteSetting.objects.values_list("key", "value"))
+    menu_items = list(MenuItem.objects.order_by("order", "id"))
+    return ConfiguracionSitio(ajustes, menu_items)
+
+
+def get_configuracion():
+    """Devuelve la configuración vigente (caché local -> compartida -> base de datos)."""
+    version = "-".join(str(g) for g in get_generaciones(MENU, CONFIGURACION))
+    clave = CACHE_KEY.format(version)
+    configuracion = _local.get(clave)
+    if configuracion is None:
+        configuracion = cache.get(clave)
+        if configuracion is None:
+            configuracion = build_configuracion()
+            cache.set(clave, configuracion, CACHE_TIMEOUT)
+        _local.set(clave, configuracion)
+    return configuracion
+
+
+def get_setting(clave, default=None):
+    """Valor de un SiteSetting por clave, sin consultar la base de datos."""
+    return get_configuracion().get(clave, default)
@@ -5,13 +5,13 @@ from .models import Categoria, Producto
 class CategoriaSitemap(Sitemap):
     changefreq = "weekly"
     priority = 0.7
-    def items(self): return Categoria.objects.all()
+    def items(self): return Categoria.objects.order_by("ruta")
     def location(self, obj): return obj.get_absolute_url()
-    def lastmod(self, obj): return getattr(obj, "updated_at", None)
+    def lastmod(self, obj): return obj.fecha_modificacion
 
 class ProductoSitemap(Sitemap):
     changefreq = "weekly"
     priority = 0.6
-    def items(self): return Producto.objects.filter(activo=True)
+    def items(self): return Producto.objects.activos().order_by("pk")
     def location(self, obj): return obj.get_absolute_url()
-    def lastmod(self, obj): return getattr(obj, "updated_at", None)
\ No newline at end of file
+    def lastmod(self, obj): return obj.ultima_actualizacion
\ No newline at end of file
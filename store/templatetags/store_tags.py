@@ -0,0 +1,77 @@
+import logging
+
+from django import template
+from django.utils.html import format_html
+
+from ..cache import get_generaciones
+from ..images import srcset, url_ancho, url_imagen
+
+logger = logging.getLogger("store.imagenes")
+
+register = template.Library()
+
+
+@register.simple_tag
+def generacion(*namespaces):
+    """
+    Versión de uno o varios espacios de nombres de store/cache.py, para usarla
+    como parte de la clave de un {% cache %}:
+
+        {% generacion "categorias" "menu" as version %}
+        {% cache 21600 "nav" version active_page %}...{% endcache %}
+
+    Las señales incrementan la generación al guardar o borrar el modelo, así
+    que el fragmento se regenera sin tener que borrar la clave a mano.
+    """
+    return "-".join(str(valor) for valor in get_generaciones(*namespaces))
+
+
+@register.filter
+def imagen_url(imagen, transformacion=""):
+    """
+    URL HTTPS memorizada de una imagen de Cloudinary (ver store/images.py), con
+    una transformación opcional:
+
+        {{ producto.imagen|imagen_url }}
+        {{ img.image|imagen_url:"w_400,c_fill,f_auto,q_auto" }}
+
+    Devuelve "" si no hay imagen o no se puede construir la URL (el error queda
+    en el logger "store.imagenes"), así que admite |default como hacía campo.url.
+    """
+    try:
+        return url_imagen(imagen, transformacion)
+    except Exception:
+        logger.exception("No se pudo construir la URL de %r", imagen)
+        return ""
+
+
+@register.filter
+def imagen_ancho(imagen, ancho):
+    """
+    URL de la variante de 'ancho' px (formato y calidad automáticos) de una
+    imagen de Cloudinary: {{ producto.get_primary_image|imagen_ancho:480 }}.
+    """
+    try:
+        return url_ancho(imagen, ancho)
+    except Exception:
+        logger.exception("No se pudo construir la URL de %r", imagen)
+        return ""
+
+
+@register.simple_tag
+def atributos_srcset(imagen, sizes="100vw"):
+    """
+    Atributos srcset y sizes para un <img> con las variantes de ANCHOS_RESPONSIVE:
+
+        <img src="{{ imagen|imagen_ancho:480 }}" {% atributos_srcset imagen "50vw" %}>
+
+    No escribe nada si la imagen no es de Cloudinary (fallback estático, URL externa).
+    """
+    try:
+        valor = srcset(imagen)
+    except Exception:
+        logger.exception("No se pudo construir el srcset de %r", imagen)
+        valor = ""
+    if not valor:
+        return ""
+    return format_html('srcset="{}" sizes="{}"', valor, sizes)
@@ -1,8 +1,49 @@
+import json
+import os
+import re
+import tempfile
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from cloudinary import CloudinaryResource
+from cloudinary.utils import cloudinary_url
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Subquery
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from .models import Categoria, Producto, Variacion
+from lumiere_glamour.cache_config import cache_desde_url
+
+from .cache import LRUCache
+from .images import limpiar_cache as limpiar_cache_imagenes
+from .images import url_imagen
+from .models import (Anuncio, Categoria, Favorito, MenuItem, ProductImage,
+                     Producto, SiteSetting, Variacion)
+from .pagination import ORDEN_CATALOGO
+from .search import buscar, documento_busqueda
+from .site_config import get_configuracion, get_setting
+from .typeahead import get_index as get_typeahead_index
+from .views import ORDENES_PRECIO
+
+
+def ejecutar(comando, *args):
+    """Ejecuta un comando de gestión y devuelve (stdout, stderr)."""
+    salida, errores = StringIO(), StringIO()
+    call_command(comando, *args, stdout=salida, stderr=errores)
+    return salida.getvalue(), errores.getvalue()
+
+
+def directorio_temporal(prueba):
+    """Directorio temporal que se borra al terminar la prueba."""
+    directorio = tempfile.TemporaryDirectory()
+    prueba.addCleanup(directorio.cleanup)
+    return directorio.name
 
 
 class PrecioFinalTests(TestCase):
@@ -30,3 +71,1323 @@ class PrecioFinalTests(TestCase):
             price_override=Decimal("20000.00"),
         )
         self.assertEqual(variacion.precio_final, Decimal("18000"))
+
+    def test_precio_final_se_guarda_en_la_base_de_datos(self):
+        """El precio con descuento queda almacenado y se puede filtrar y ordenar en SQL."""
+        barato = Producto.objects.create(
+            nombre="Barato", categoria=self.categoria, precio=Decimal("5000")
+        )
+        self.assertEqual(
+            list(
+                Producto.objects.en_rango_precio(maximo=Decimal("9000"))
+                .order_by("-precio_final")
+                .values_list("pk", "precio_final")
+            ),
+            [(self.producto.pk, Decimal("9000")), (barato.pk, Decimal("5000"))],
+        )
+
+    def test_update_invalida_el_catalogo(self):
+        """update() no dispara señales: invalida la generación del catálogo él mismo."""
+        from .cache import CATALOGO, get_generacion
+
+        Variacion.objects.create(producto=self.producto, nombre="Tipo", valor="Val")
+        for queryset, cambios in (
+            (Producto.objects.filter(pk=self.producto.pk), {"descuento": Decimal("0.20")}),
+            (Producto.objects.filter(pk=self.producto.pk), {"stock": 3}),
+            (Variacion.objects.filter(producto=self.producto), {"tono": "Rosa"}),
+        ):
+            antes = get_generacion(CATALOGO)
+            queryset.update(**cambios)
+            self.assertNotEqual(get_generacion(CATALOGO), antes, cambios)
+        antes = get_generacion(CATALOGO)
+        Producto.objects.filter(pk=0).update(stock=1)
+        self.assertEqual(get_generacion(CATALOGO), antes)
+
+    def test_cambio_de_descuento_recalcula_variaciones(self):
+        """save(), update() y bulk_update() mantienen sincronizado el precio final."""
+        variacion = Variacion.objects.create(
+            producto=self.producto, nombre="Tipo", valor="Val"
+        )
+        self.producto.descuento = Decimal("0.50")
+        self.producto.save(update_fields=["descuento"])
+        variacion.refresh_from_db()
+        self.assertEqual(variacion.precio_final, Decimal("5000"))
+
+        Producto.objects.filter(pk=self.producto.pk).update(descuento=Decimal("0"))
+        self.producto.refresh_from_db()
+        variacion.refresh_from_db()
+        self.assertEqual(self.producto.precio_final, Decimal("10000"))
+        self.assertEqual(variacion.precio_final, Decimal("10000"))
+
+        self.producto.precio = Decimal("20000")
+        Producto.objects.bulk_update([self.producto], ["precio"])
+        variacion.refresh_from_db()
+        self.assertEqual(
+            Producto.objects.get(pk=self.producto.pk).precio_final, Decimal("20000")
+        )
+        self.assertEqual(variacion.precio_final, Decimal("20000"))
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)  # Se miden las consultas de la vista
+class ListadoProductosQueryTests(TestCase):
+    """La cuadrícula de productos debe costar un número fijo de consultas."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Labios", slug="labios")
+
+    def crear_productos(self, cantidad):
+        for i in range(cantidad):
+            producto = Producto.objects.create(
+                nombre=f"Labial {i}", categoria=self.categoria, precio=Decimal("1000")
+            )
+            ProductImage.objects.create(producto=producto, image="productos/labial")
+            Variacion.objects.create(producto=producto, nombre="Tono", valor=f"T{i}")
+
+    def contar_consultas_inicio(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("home"), secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_inicio_no_escala_con_productos_por_pagina(self):
+        """Renderizar 2 o 12 tarjetas ejecuta la misma cantidad de consultas."""
+        self.crear_productos(2)
+        self.contar_consultas_inicio()  # Primera visita: crea la sesión
+        consultas_pocos = self.contar_consultas_inicio()
+        self.crear_productos(10)
+        self.assertEqual(self.contar_consultas_inicio(), consultas_pocos)
+
+    def test_get_primary_image_url_usa_prefetch(self):
+        """Con para_listado() la imagen principal no dispara consultas adicionales."""
+        self.crear_productos(3)
+        productos = list(Producto.objects.para_listado())
+        with self.assertNumQueries(0):
+            for producto in productos:
+                producto.get_primary_image_url()
+
+
+class ArbolCategoriasTests(TestCase):
+    """El árbol de categorías se construye en una consulta y se invalida con señales."""
+
+    def setUp(self):
+        cache.clear()
+        self.maquillaje = Categoria.objects.create(nombre="Maquillaje", slug="maquillaje")
+        self.labios = Categoria.objects.create(
+            nombre="Labios", slug="labios", padre=self.maquillaje
+        )
+        self.labiales = Categoria.objects.create(
+            nombre="Labiales", slug="labiales", padre=self.labios
+        )
+
+    def test_arbol_precalcula_descendientes_y_rutas(self):
+        with self.assertNumQueries(1):
+            arbol = Categoria.objects.arbol()
+        with self.assertNumQueries(0):
+            Categoria.objects.arbol()
+            self.assertEqual(
+                arbol.descendientes_ids(self.maquillaje.id),
+                {self.maquillaje.id, self.labios.id, self.labiales.id},
+            )
+            self.assertEqual(
+                arbol.ruta_completa(self.labiales.id), "Maquillaje > Labios > Labiales"
+            )
+            self.assertEqual(arbol.get("labiales").ruta_completa, "Maquillaje > Labios > Labiales")
+            self.assertEqual([c.slug for c in arbol.principales], ["maquillaje"])
+
+    def test_guardar_categoria_invalida_arbol(self):
+        Categoria.objects.arbol()
+        Categoria.objects.create(nombre="Ojos", slug="ojos", padre=self.maquillaje)
+        arbol = Categoria.objects.arbol()
+        self.assertEqual(
+            [c.slug for c in arbol.hijos(self.maquillaje.id)], ["labios", "ojos"]
+        )
+
+    def test_productos_por_categoria_incluye_subcategorias_profundas(self):
+        Producto.objects.create(nombre="Rojo", categoria=self.labiales)
+        response = self.client.get(
+            reverse("categoria", args=["maquillaje"]), secure=True
+        )
+        self.assertContains(response, "Rojo")
+
+
+class RutaMaterializadaTests(TestCase):
+    """Categoria mantiene una ruta materializada para consultar ramas completas."""
+
+    def setUp(self):
+        cache.clear()
+        self.maquillaje = Categoria.objects.create(nombre="Maquillaje", slug="maquillaje")
+        self.ojos = Categoria.objects.create(nombre="Ojos", slug="ojos", padre=self.maquillaje)
+        self.sombras = Categoria.objects.create(nombre="Sombras", slug="sombras", padre=self.ojos)
+
+    def test_save_calcula_ruta_y_nivel(self):
+        self.assertEqual(
+            self.sombras.ruta, f"/{self.maquillaje.pk}/{self.ojos.pk}/{self.sombras.pk}/"
+        )
+        self.assertEqual(self.sombras.nivel, 2)
+
+    def test_mover_categoria_actualiza_descendientes(self):
+        rostro = Categoria.objects.create(nombre="Rostro", slug="rostro")
+        self.ojos.padre = rostro
+        self.ojos.save()
+        self.sombras.refresh_from_db()
+        self.assertEqual(self.sombras.ruta, f"/{rostro.pk}/{self.ojos.pk}/{self.sombras.pk}/")
+        self.assertEqual(self.sombras.nivel, 2)
+
+    def test_borrar_categoria_recalcula_rutas_de_hijas(self):
+        self.maquillaje.delete()
+        self.sombras.refresh_from_db()
+        self.assertEqual(self.sombras.ruta, f"/{self.ojos.pk}/{self.sombras.pk}/")
+        self.assertEqual(self.sombras.nivel, 1)
+
+    def test_productos_en_categoria_a_cualquier_profundidad(self):
+        producto = Producto.objects.create(nombre="Paleta", categoria=self.sombras)
+        Producto.objects.create(
+            nombre="Otro", categoria=Categoria.objects.create(nombre="Uñas", slug="unas")
+        )
+        with self.assertNumQueries(1):
+            ids = list(Producto.objects.en_categoria(self.maquillaje).values_list("id", flat=True))
+        self.assertEqual(ids, [producto.id])
+
+    def test_sin_ruta_no_devuelve_todo(self):
+        producto = Producto.objects.create(nombre="Paleta", categoria=self.sombras)
+        Producto.objects.create(nombre="Delineador", categoria=self.ojos)
+        Categoria.objects.filter(pk=self.sombras.pk).update(ruta="")
+        self.sombras.ruta = ""
+        self.assertEqual(list(Producto.objects.en_categoria(self.sombras)), [producto])
+        self.assertEqual(list(Categoria.objects.descendientes(self.sombras)), [self.sombras])
+        self.assertFalse(Producto.objects.en_categoria(Categoria(nombre="Nueva")).exists())
+
+    def test_ruta_completa_en_una_consulta(self):
+        sombras = Categoria.objects.get(pk=self.sombras.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(sombras.ruta_completa, "Maquillaje > Ojos > Sombras")
+
+
+class BusquedaTextoCompletoTests(TestCase):
+    """La búsqueda usa el índice de texto completo, sin tildes y con raíces en español."""
+
+    def setUp(self):
+        cache.clear()
+        self.labios = Categoria.objects.create(nombre="Labios", slug="labios")
+        self.rostro = Categoria.objects.create(nombre="Rostro", slug="rostro")
+        self.labial = Producto.objects.create(
+            nombre="Labial Mate Rojo", categoria=self.labios, descripcion="Larga duración"
+        )
+        self.base = Producto.objects.create(
+            nombre="Base Líquida", categoria=self.rostro, descripcion="Cobertura alta"
+        )
+
+    def buscar_ids(self, consulta):
+        return [p.id for p in buscar(Producto.objects.all(), consulta)]
+
+    def test_normaliza_tildes_y_plurales(self):
+        self.assertEqual(documento_busqueda("Bases Líquidas"), "bas liquid")
+        self.assertEqual(self.buscar_ids("liquida"), [self.base.id])
+        self.assertEqual(self.buscar_ids("labiales"), [self.labial.id])
+        self.assertEqual(self.buscar_ids("DURACIÓN"), [self.labial.id])
+
+    def test_busca_por_categoria_y_prefijo(self):
+        self.assertEqual(self.buscar_ids("rost"), [self.base.id])
+        self.assertEqual(self.buscar_ids("labial rojo"), [self.labial.id])
+        self.assertEqual(self.buscar_ids("azul"), [])
+
+    def test_renombrar_categoria_reindexa_productos(self):
+        self.rostro.nombre = "Cara"
+        self.rostro.save()
+        self.assertEqual(self.buscar_ids("cara"), [self.base.id])
+
+    def test_relevancia_en_subconsulta(self):
+        # Dentro de una subconsulta la tabla lleva alias (U0): la relevancia tiene
+        # que referirse a esa fila y no a la consulta externa
+        otro = Producto.objects.create(nombre="Labial Labial Gloss", categoria=self.labios)
+        mejores = buscar(Producto.objects.all(), "labial").values("pk")[:1]
+        self.assertEqual(
+            list(Producto.objects.filter(pk__in=Subquery(mejores)).values_list("pk", flat=True)),
+            [p.pk for p in buscar(Producto.objects.all(), "labial")][:1],
+        )
+        self.assertIn(otro.pk, self.buscar_ids("labial"))
+
+    def test_api_buscar_productos(self):
+        response = self.client.get(
+            reverse("api_buscar_productos"), {"q": "labial"}, secure=True
+        )
+        data = response.json()
+        self.assertEqual([p["id"] for p in data["productos"]], [self.labial.id])
+        self.assertEqual(data["productos"][0]["categoria"], "Labios")
+
+
+class TypeaheadTests(TestCase):
+    """Índice de trigramas en memoria para la búsqueda en vivo."""
+
+    def setUp(self):
+        cache.clear()
+        self.labios = Categoria.objects.create(nombre="Labios", slug="labios")
+        self.labial = Producto.objects.create(nombre="Labial Mate", categoria=self.labios)
+        self.gloss = Producto.objects.create(nombre="Gloss Brillante", categoria=self.labios)
+
+    def test_tolera_errores_de_escritura_sin_consultas(self):
+        indice = get_typeahead_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(indice.buscar("lavial"), [self.labial.id])
+            self.assertEqual(indice.buscar("lab mate"), [self.labial.id])
+            self.assertEqual(indice.buscar("brillamte"), [self.gloss.id])
+            self.assertEqual(indice.buscar("zzzz"), [])
+
+    def test_coincidencia_en_nombre_pesa_mas_que_en_categoria(self):
+        self.assertEqual(get_typeahead_index().buscar("labi")[0], self.labial.id)
+
+    def test_se_actualiza_con_senales(self):
+        get_typeahead_index()
+        nuevo = Producto.objects.create(nombre="Delineador", categoria=self.labios)
+        self.assertEqual(get_typeahead_index().buscar("delinador"), [nuevo.id])
+        nuevo.is_active = False
+        nuevo.save()
+        self.assertEqual(get_typeahead_index().buscar("delineador"), [])
+        self.labial.delete()
+        self.assertEqual(get_typeahead_index().buscar("labial mate"), [])
+
+    def test_otros_workers_aplican_cambios_sin_reconstruir(self):
+        from . import typeahead
+
+        get_typeahead_index()
+        # Otro worker (con su propio índice) guarda los cambios
+        with mock.patch.object(typeahead, "_indice", typeahead.TrigramIndex()):
+            nuevo = Producto.objects.create(nombre="Delineador", categoria=self.labios)
+            self.gloss.delete()
+        with self.assertNumQueries(0):
+            indice = get_typeahead_index()
+            self.assertEqual(indice.buscar("delinador"), [nuevo.id])
+            self.assertEqual(indice.buscar("gloss"), [])
+
+        with mock.patch.object(typeahead, "_indice", typeahead.TrigramIndex()):
+            self.labios.nombre = "Boca"
+            self.labios.save()
+        self.assertEqual(get_typeahead_index().buscar("boca"), [nuevo.id, self.labial.id])
+
+    def test_api_usa_typeahead(self):
+        response = self.client.get(
+            reverse("api_buscar_productos"), {"q": "lavial"}, secure=True
+        )
+        self.assertEqual([p["id"] for p in response.json()["productos"]], [self.labial.id])
+
+
+class CacheBusquedaTests(TestCase):
+    """La búsqueda en vivo se sirve desde caché hasta que cambia el catálogo."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Rostro", slug="rostro")
+        Producto.objects.create(nombre="Base Mate", categoria=self.categoria)
+
+    def buscar(self, consulta):
+        response = self.client.get(
+            reverse("api_buscar_productos"), {"q": consulta}, secure=True
+        )
+        return [p["nombre"] for p in response.json()["productos"]]
+
+    def test_consulta_repetida_no_toca_la_base_de_datos(self):
+        self.assertEqual(self.buscar("base"), ["Base Mate"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.buscar("  BASE "), ["Base Mate"])
+
+    def test_guardar_producto_invalida_la_cache(self):
+        self.buscar("base")
+        Producto.objects.create(nombre="Base Líquida", categoria=self.categoria)
+        self.assertCountEqual(self.buscar("base"), ["Base Mate", "Base Líquida"])
+
+    def test_lru_acotada_y_con_ttl(self):
+        lru = LRUCache(maxsize=2, ttl=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual((lru.get("a"), lru.get("c")), (1, 3))
+        lru.ttl = -1
+        lru.set("d", 4)
+        self.assertIsNone(lru.get("d"))
+
+
+class FacetasTests(TestCase):
+    """El índice de facetas filtra y cuenta con bitsets y se invalida con el catálogo."""
+
+    def setUp(self):
+        cache.clear()
+        self.rostro = Categoria.objects.create(nombre="Rostro", slug="rostro")
+        self.bases = Categoria.objects.create(
+            nombre="Bases", slug="bases", padre=self.rostro
+        )
+        self.ojos = Categoria.objects.create(nombre="Ojos", slug="ojos")
+        self.base = Producto.objects.create(
+            nombre="Base", categoria=self.bases, precio=Decimal("30000"), stock=5
+        )
+        self.sombra = Producto.objects.create(
+            nombre="Sombra",
+            categoria=self.ojos,
+            precio=Decimal("10000"),
+            badge="oferta",
+        )
+        Variacion.objects.create(
+            producto=self.base, nombre="Tono", valor="Claro", color_hex="#f0d0b0"
+        )
+        Variacion.objects.create(
+            producto=self.sombra, nombre="Tono", valor="Rosa", color_hex="#F0D0B0"
+        )
+
+    def facetas(self, **params):
+        response = self.client.get(reverse("api_facetas"), params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def conteos(self, data, faceta):
+        return {item["valor"]: item["total"] for item in data["facetas"][faceta]}
+
+    def test_filtra_y_cuenta_por_faceta(self):
+        data = self.facetas(categoria=self.rostro.id, color="#F0D0B0")
+        self.assertEqual(data["ids"], [self.base.id])
+        # La faceta seleccionada cuenta sin su propia selección
+        self.assertEqual(
+            self.conteos(data, "categoria"),
+            {self.rostro.id: 1, self.bases.id: 1, self.ojos.id: 1},
+        )
+        self.assertEqual(self.conteos(data, "precio"), {"20000-50000": 1})
+        self.assertEqual(self.conteos(data, "disponible"), {"1": 1})
+
+        data = self.facetas(precio=["0-20000", "20000-50000"], badge="oferta")
+        self.assertEqual((data["total"], data["ids"]), (1, [self.sombra.id]))
+
+    def test_segunda_consulta_no_toca_la_base_de_datos(self):
+        self.facetas()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.facetas(color="#F0D0B0")["total"], 2)
+
+    def test_cambio_en_el_catalogo_reconstruye_el_indice(self):
+        self.assertEqual(self.facetas(badge="oferta")["total"], 1)
+        self.base.badge = "oferta"
+        self.base.save()
+        self.assertEqual(self.facetas(badge="oferta")["total"], 2)
+
+
+class PaginacionCursorTests(TestCase):
+    """El listado se pagina por cursor: sin COUNT ni OFFSET y sin saltar productos."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Uñas", slug="unas")
+        self.productos = [
+            Producto.objects.create(
+                nombre=f"Esmalte {i}", categoria=self.categoria, precio=Decimal(i * 1000)
+            )
+            for i in range(1, 31)
+        ]
+
+    def recorrer(self, params):
+        """Sigue los cursores de /api/productos/ hasta el final y devuelve los IDs."""
+        response = self.client.get(reverse("home"), params, secure=True)
+        ids = [p.id for p in response.context["pagina_productos"]]
+        url = response.context["siguiente_url"]
+        while url:
+            data = self.client.get(url, secure=True).json()
+            ids += [int(i) for i in re.findall(r'data-product-id="(\d+)"', data["html"])]
+            url = data["siguiente_url"]
+        return list(dict.fromkeys(ids))
+
+    def test_recorre_todo_el_catalogo_en_orden(self):
+        esperados = [p.id for p in reversed(self.productos)]
+        self.assertEqual(self.recorrer({}), esperados)
+
+    def test_orden_por_precio(self):
+        self.assertEqual(
+            self.recorrer({"orden": "precio_asc", "precio_max": "20000"}),
+            [p.id for p in self.productos[:20]],
+        )
+
+    def test_pagina_siguiente_sin_count_ni_offset(self):
+        response = self.client.get(reverse("home"), secure=True)
+        url = response.context["siguiente_url"]
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url, secure=True).json()
+        self.assertEqual(data["cantidad"], 12)
+        sql = " ".join(q["sql"].upper() for q in ctx.captured_queries)
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    def test_cursor_invalido(self):
+        response = self.client.get(
+            reverse("api_productos"), {"cursor": "no-es-un-cursor"}, secure=True
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("home"), {"cursor": "xx"}, secure=True)
+        self.assertEqual(response.status_code, 200)
+
+    def test_total_estimado(self):
+        data = self.client.get(
+            reverse("api_productos"), {"contar": "1"}, secure=True
+        ).json()
+        self.assertEqual(data["total_estimado"], 30)
+
+
+class FragmentoListadoTests(TestCase):
+    """Con la cabecera X-Fragment los listados devuelven solo la cuadrícula."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Cejas", slug="cejas")
+        Producto.objects.create(nombre="Lápiz de cejas", categoria=self.categoria)
+
+    def test_fragmento_sin_base_ni_contexto_comun(self):
+        for url in (reverse("home"), reverse("categoria", args=["cejas"])):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, secure=True, headers={"X-Fragment": "1"})
+            html = response.content.decode()
+            self.assertIn('id="productos-grid"', html)
+            self.assertIn("Lápiz de cejas", html)
+            self.assertNotIn("<html", html)
+            self.assertIn("X-Fragment", response["Vary"])
+            sql = " ".join(q["sql"] for q in ctx.captured_queries)
+            self.assertNotIn("store_anuncio", sql)
+            self.assertNotIn("django_session", sql)
+
+    def test_pagina_completa_varia_por_fragmento(self):
+        response = self.client.get(reverse("home"), secure=True)
+        self.assertIn("<html", response.content.decode())
+        self.assertIn("X-Fragment", response["Vary"])
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)  # Solo la caché de fragmentos
+class FragmentosCacheadosTests(TestCase):
+    """Menú, pie y carrusel se cachean por generación y se regeneran con las señales."""
+
+    def setUp(self):
+        cache.clear()
+        Categoria.objects.create(nombre="Labios", slug="labios")
+        Anuncio.objects.create(titulo="Promo verano")
+
+    def get_home(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("home"), secure=True)
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        return response.content.decode(), sql
+
+    def test_carrusel_no_consulta_anuncios_con_cache_caliente(self):
+        html, sql = self.get_home()
+        self.assertIn("Anuncio: Promo verano", html)
+        self.assertIn("store_anuncio", sql)
+        html, sql = self.get_home()
+        self.assertIn("Anuncio: Promo verano", html)
+        self.assertNotIn("store_anuncio", sql)
+
+    def test_senales_regeneran_los_fragmentos(self):
+        self.get_home()
+        Anuncio.objects.create(titulo="Promo invierno")
+        Categoria.objects.create(nombre="Ojos", slug="ojos")
+        html, _ = self.get_home()
+        self.assertIn("Anuncio: Promo invierno", html)
+        self.assertIn(reverse("categoria", args=["ojos"]), html)
+
+    def test_csrf_token_fuera_del_pie_cacheado(self):
+        """Cada respuesta lleva su propio token aunque el pie venga de la caché."""
+        patron = r'name="csrfmiddlewaretoken" value="([^"]+)"'
+        primero = re.search(patron, self.get_home()[0]).group(1)
+        self.client.cookies.clear()
+        segundo = re.search(patron, self.get_home()[0]).group(1)
+        self.assertNotEqual(primero, segundo)
+
+
+class PaginaCacheTests(TestCase):
+    """Caché de página completa para anónimos (store.middleware.PaginaCacheMiddleware)."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Rostro", slug="rostro")
+        Producto.objects.create(nombre="Rubor", categoria=self.categoria)
+        self.url = reverse("categoria", args=["rostro"])
+
+    def get(self, url=None, **params):
+        return self.client.get(url or self.url, params, secure=True)
+
+    def test_acierto_sin_tocar_la_base_de_datos(self):
+        from . import metrics
+
+        aciertos = metrics.CACHE_PAGINAS.valores.get(("hit",), 0)
+        self.assertEqual(self.get()["X-Cache"], "MISS")
+        self.client.cookies.clear()
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertContains(response, "Rubor")
+        self.assertIn("csrftoken", response.cookies)
+        self.assertEqual(metrics.CACHE_PAGINAS.valores[("hit",)], aciertos + 1)
+
+    def test_clave_con_query_normalizado(self):
+        self.get(orden="precio_asc", utm_source="ig")
+        self.assertEqual(self.get(utm_campaign="x", orden="precio_asc")["X-Cache"], "HIT")
+        self.assertEqual(self.get(orden="precio_desc")["X-Cache"], "MISS")
+
+    def test_cambio_en_el_catalogo_invalida(self):
+        self.get()
+        Producto.objects.create(nombre="Iluminador", categoria=self.categoria)
+        response = self.get()
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertContains(response, "Iluminador")
+
+    def test_usuarios_identificados_no_usan_la_cache(self):
+        from django.contrib.auth.models import User
+
+        User.objects.create_user("admin", password="x")
+        self.client.login(username="admin", password="x")
+        self.get()
+        self.assertNotIn("X-Cache", self.get())
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class SesionPerezosaTests(TestCase):
+    """Leer el catálogo no crea sesión; solo las escrituras (favoritos, carrito)."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Uñas", slug="unas")
+        self.producto = Producto.objects.create(nombre="Esmalte", categoria=self.categoria)
+
+    def test_catalogo_anonimo_sin_sesion(self):
+        from django.contrib.sessions.models import Session
+
+        for url in (
+            reverse("home"),
+            reverse("categoria", args=["unas"]),
+            reverse("ver_favoritos"),
+        ):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("sessionid", response.cookies)
+            sql = " ".join(q["sql"] for q in ctx.captured_queries)
+            self.assertNotIn("django_session", sql)
+            self.assertNotIn("store_favorito", sql)
+        self.assertFalse(Session.objects.exists())
+
+    def test_toggle_favorito_crea_sesion_y_cookie_firmada(self):
+        url = reverse("toggle_favorito")
+        datos = {"producto_id": self.producto.pk}
+        response = self.client.post(url, datos, content_type="application/json", secure=True)
+        self.assertTrue(response.json()["is_favorito"])
+        self.assertIn("sessionid", response.cookies)
+        self.assertIn("favoritos", response.cookies)
+
+        response = self.client.get(reverse("ver_favoritos"), secure=True)
+        self.assertEqual(list(response.context["favoritos_productos"]), [self.producto])
+
+        response = self.client.post(url, datos, content_type="application/json", secure=True)
+        self.assertFalse(response.json()["is_favorito"])
+        response = self.client.get(reverse("ver_favoritos"), secure=True)
+        self.assertEqual(list(response.context["favoritos_productos"]), [])
+
+    def test_detalle_no_marca_favorito_en_el_html(self):
+        # La página de detalle se cachea para todos: el estado lo pone main.js
+        datos = {"producto_id": self.producto.pk}
+        self.client.post(
+            reverse("toggle_favorito"), datos, content_type="application/json", secure=True
+        )
+        response = self.client.get(
+            reverse("producto_detalle", args=[self.producto.pk]), secure=True
+        )
+        self.assertContains(response, f'data-product-id="{self.producto.pk}"')
+        self.assertNotContains(response, "btn-favorito active")
+
+    def test_recorte_de_favoritos_quita_los_mas_antiguos(self):
+        from .favoritos import FAVORITOS_COOKIE, FAVORITOS_SALT
+
+        otros = [
+            Producto.objects.create(nombre=f"Esmalte {i}", categoria=self.categoria)
+            for i in range(2)
+        ]
+        # El de ID más alto es el más antiguo: no debe sobrevivir al recorte
+        orden = [otros[1], self.producto, otros[0]]
+        with mock.patch("store.favoritos.MAX_FAVORITOS", 2):
+            for producto in orden:
+                response = self.client.post(
+                    reverse("toggle_favorito"),
+                    {"producto_id": producto.pk},
+                    content_type="application/json",
+                    secure=True,
+                )
+        firmante = signing.get_cookie_signer(salt=FAVORITOS_COOKIE + FAVORITOS_SALT)
+        valor = firmante.unsign(response.cookies[FAVORITOS_COOKIE].value)
+        self.assertEqual(valor, f"{otros[0].pk},{self.producto.pk}")
+
+    def test_tabla_de_favoritos_se_consulta_una_vez(self):
+        # Visitante antiguo: sesión (p. ej. por el carrito) pero sin cookie de favoritos
+        session = self.client.session
+        session["cart"] = []
+        session.save()
+        Favorito.objects.create(session_key=session.session_key, producto=self.producto)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("home"), secure=True)
+        self.assertNotIn("store_favorito", " ".join(q["sql"] for q in ctx.captured_queries))
+
+        response = self.client.get(reverse("ver_favoritos"), secure=True)
+        self.assertEqual(list(response.context["favoritos_productos"]), [self.producto])
+        self.assertIn("favoritos", response.cookies)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("ver_favoritos"), secure=True)
+        self.assertNotIn("store_favorito", " ".join(q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(list(response.context["favoritos_productos"]), [self.producto])
+
+    def test_cookie_manipulada_se_ignora(self):
+        self.client.cookies["favoritos"] = str(self.producto.pk)
+        response = self.client.get(reverse("ver_favoritos"), secure=True)
+        self.assertEqual(list(response.context["favoritos_productos"]), [])
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class ConfiguracionSitioTests(TestCase):
+    """Menú y SiteSetting llegan a las plantillas sin consultas por petición."""
+
+    def setUp(self):
+        cache.clear()
+        MenuItem.objects.create(nombre="Blog", url="/blog/", order=2)
+        MenuItem.objects.create(nombre="Tutoriales", url="/tutoriales/", order=1)
+        SiteSetting.objects.create(key="whatsapp_number", value="573001112233")
+
+    def test_contexto_sin_consultas_tras_la_primera_carga(self):
+        response = self.client.get(reverse("ver_favoritos"), secure=True)
+        self.assertEqual(
+            [item.nombre for item in response.context["menu_items"]], ["Tutoriales", "Blog"]
+        )
+        self.assertEqual(response.context["whatsapp_number"], "573001112233")
+        self.assertContains(response, "wa.me/573001112233")
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("ver_favoritos"), secure=True)
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("store_sitesetting", sql)
+        self.assertNotIn("store_menuitem", sql)
+
+    def test_guardar_invalida(self):
+        self.assertEqual(get_setting("whatsapp_number"), "573001112233")
+        SiteSetting.objects.filter(key="whatsapp_number").get().delete()
+        self.assertIsNone(get_setting("whatsapp_number"))
+        MenuItem.objects.create(nombre="Contacto", url="/contacto/", order=3)
+        self.assertEqual(
+            [item.nombre for item in get_configuracion().menu_items],
+            ["Tutoriales", "Blog", "Contacto"],
+        )
+
+
+class CacheConfigTests(TestCase):
+    """CACHE_URL elige el backend y benchmark_cache lo mide sin tocar la caché real."""
+
+    def test_backend_desde_url(self):
+        self.assertEqual(
+            cache_desde_url("redis://localhost:6379/0")["BACKEND"],
+            "django.core.cache.backends.redis.RedisCache",
+        )
+        self.assertEqual(cache_desde_url("file:///tmp/cache")["LOCATION"], "/tmp/cache")
+        self.assertIn("LocMemCache", cache_desde_url("")["BACKEND"])
+        for url in ("memcached://localhost:11211", "redis:/localhost", "file://"):
+            with self.subTest(url), self.assertRaises(ImproperlyConfigured):
+                cache_desde_url(url)
+
+    def test_clave_versionada(self):
+        from .cache import CATALOGO, clave
+
+        antes = clave(CATALOGO, "total", "abc")
+        Categoria.objects.create(nombre="Piel", slug="piel")
+        self.assertNotEqual(antes, clave(CATALOGO, "total", "abc"))
+
+    def test_benchmark(self):
+        categoria = Categoria.objects.create(nombre="Piel", slug="piel")
+        Producto.objects.create(nombre="Contorno", categoria=categoria)
+        cache.set("real", 1)
+        salida, _ = ejecutar("benchmark_cache", "--repeticiones", "2", "--operaciones", "10")
+        self.assertIn("hit ratio   50.0%", salida)
+        self.assertIn("file", salida)
+        self.assertEqual(cache.get("real"), 1)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class HidratacionTests(TestCase):
+    """Favoritos y carrito cargan sus productos en lote, no uno por uno."""
+
+    def setUp(self):
+        cache.clear()
+        categoria = Categoria.objects.create(nombre="Pestañas", slug="pestanas")
+        # El carrito trata variant_id == producto_id como "sin variación": se
+        # desfasan los IDs para que no coincidan por casualidad
+        base = Producto.objects.create(nombre="Base", categoria=categoria)
+        Variacion.objects.create(producto=base, nombre="Tono", valor="A")
+        Variacion.objects.create(producto=base, nombre="Tono", valor="B")
+        self.productos = []
+        self.variaciones = []
+        for i in range(5):
+            producto = Producto.objects.create(
+                nombre=f"Máscara {i}", categoria=categoria, precio=Decimal("10000")
+            )
+            self.productos.append(producto)
+            self.variaciones.append(
+                Variacion.objects.create(
+                    producto=producto,
+                    nombre="Tono",
+                    valor="Negro",
+                    color="Negro",
+                    price_override=Decimal("12000"),
+                )
+            )
+
+    def consultas_carrito(self, lineas):
+        session = self.client.session
+        session["cart"] = [
+            {"id": v.producto_id, "variant_id": v.id, "quantity": 2} for v in lineas
+        ]
+        session.save()
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("ver_carrito"), secure=True)
+        return response, len(ctx.captured_queries)
+
+    def test_carrito_con_consultas_constantes(self):
+        response, una_linea = self.consultas_carrito(self.variaciones[:1])
+        response, cinco_lineas = self.consultas_carrito(self.variaciones)
+        self.assertEqual(una_linea, cinco_lineas)
+        detalles = response.context["carrito_detalles"]
+        self.assertEqual([d["variant_id"] for d in detalles], [v.id for v in self.variaciones])
+        self.assertEqual(detalles[0]["subtotal"], 24000.0)
+        self.assertEqual(detalles[0]["color"], "Negro")
+
+    def test_carrito_salta_cantidades_corruptas(self):
+        session = self.client.session
+        v1, v2 = self.variaciones[:2]
+        session["cart"] = [
+            {"id": v1.producto_id, "variant_id": v1.id, "quantity": "x"},
+            {"id": v2.producto_id, "variant_id": v2.id, "quantity": "3"},
+        ]
+        session.save()
+        response = self.client.get(reverse("ver_carrito"), secure=True)
+        self.assertEqual(
+            [(d["variant_id"], d["quantity"]) for d in response.context["carrito_detalles"]],
+            [(v2.id, 3)],
+        )
+
+    def test_api_favoritos_acotado(self):
+        ids = ",".join(str(p.pk) for p in self.productos)
+        with mock.patch("store.views.MAX_FAVORITOS", 2):
+            response = self.client.get(reverse("api_favoritos"), {"ids": ids}, secure=True)
+        self.assertEqual(
+            [p["id"] for p in response.json()["productos"]],
+            [p.pk for p in self.productos[:2]],
+        )
+
+    def test_api_favoritos_en_lote_y_cacheado(self):
+        ids = ",".join(str(p.pk) for p in reversed(self.productos))
+        url = reverse("api_favoritos")
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {"ids": ids + ",999"}, secure=True)
+        nombres = [p["nombre"] for p in response.json()["productos"]]
+        self.assertEqual(nombres, [p.nombre for p in reversed(self.productos)])
+        with self.assertNumQueries(0):
+            self.client.get(url, {"ids": ids}, secure=True)
+
+    def test_variacion_de_otro_producto_se_ignora(self):
+        from .hydration import hidratar
+
+        producto, ajena = self.productos[0], self.variaciones[1]
+        (item, borrado) = hidratar([(producto.pk, ajena.pk), (999, None)])
+        self.assertIsNone(item["variacion"])
+        self.assertEqual(item["precio_final"], producto.precio_final)
+        self.assertIsNone(borrado)
+
+
+class UrlImagenTests(TestCase):
+    """URLs de Cloudinary en HTTPS, construidas una sola vez por imagen y transformación."""
+
+    def setUp(self):
+        import cloudinary
+
+        self.config_anterior = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name="demo")
+        limpiar_cache_imagenes()
+        self.recurso = CloudinaryResource("muestra/labial", format="jpg", version=123)
+
+    def tearDown(self):
+        import cloudinary
+
+        cloudinary.config(cloud_name=self.config_anterior)
+        limpiar_cache_imagenes()
+
+    def test_https_y_transformacion(self):
+        base = "https://res.cloudinary.com/demo/image/upload/"
+        self.assertEqual(url_imagen(self.recurso), base + "v123/muestra/labial.jpg")
+        self.assertEqual(
+            url_imagen(self.recurso, "w_400,c_fill"),
+            base + "w_400,c_fill/v123/muestra/labial.jpg",
+        )
+        self.assertEqual(url_imagen("http://ejemplo.com/a.jpg"), "https://ejemplo.com/a.jpg")
+        self.assertEqual(url_imagen(None), "")
+
+    def test_memorizada(self):
+        with mock.patch("store.images.cloudinary_url", wraps=cloudinary_url) as construir:
+            for _ in range(3):
+                url_imagen(self.recurso)
+            url_imagen(self.recurso, "w_200")
+        self.assertEqual(construir.call_count, 2)
+
+    def test_filtro_y_producto(self):
+        from django.template import Context, Template
+
+        html = Template('{% load store_tags %}{{ imagen|imagen_url:"w_100" }}').render(
+            Context({"imagen": self.recurso})
+        )
+        self.assertIn("/w_100/v123/muestra/labial.jpg", html)
+
+        categoria = Categoria.objects.create(nombre="Ojos", slug="ojos")
+        producto = Producto.objects.create(
+            nombre="Sombra", categoria=categoria, imagen="image/upload/v123/muestra/labial.jpg"
+        )
+        self.assertEqual(
+            Producto.objects.get(pk=producto.pk).get_primary_image_url(),
+            "https://res.cloudinary.com/demo/image/upload/v123/muestra/labial.jpg",
+        )
+
+
+@override_settings(CLOUDINARY_NUBE_LOCAL=True)
+class ImagenesResponsiveTests(TestCase):
+    """Variantes por ancho con f_auto/q_auto y srcset, sin cloud_name ni red."""
+
+    def setUp(self):
+        import cloudinary
+
+        self.config_anterior = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name=None)
+        limpiar_cache_imagenes()
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Labios", slug="labios")
+        self.producto = Producto.objects.create(
+            nombre="Labial", categoria=self.categoria, imagen="image/upload/v1/labial.jpg"
+        )
+
+    def tearDown(self):
+        import cloudinary
+
+        cloudinary.config(cloud_name=self.config_anterior)
+        limpiar_cache_imagenes()
+
+    def test_srcset_con_todos_los_anchos(self):
+        from .images import ANCHOS_RESPONSIVE, srcset
+
+        valor = srcset(Producto.objects.get(pk=self.producto.pk).get_primary_image())
+        self.assertEqual(valor.count("c_limit"), len(ANCHOS_RESPONSIVE))
+        self.assertIn(
+            "https://res.cloudinary.com/local/image/upload/c_limit,w_480,f_auto,q_auto/v1/labial.jpg 480w",
+            valor,
+        )
+        self.assertEqual(srcset(None), "")
+        self.assertEqual(srcset("/static/img/sin_imagen.jpg"), "")
+
+    def test_sin_cloud_name_falla_fuera_de_desarrollo(self):
+        import cloudinary
+
+        with override_settings(CLOUDINARY_NUBE_LOCAL=False):
+            with self.assertRaisesMessage(ValueError, "Must supply cloud_name"):
+                url_imagen("muestra/labial")
+        # La URL memorizada con la nube ficticia no se sirve con la real
+        self.assertIn("/local/", url_imagen("muestra/labial"))
+        cloudinary.config(cloud_name="demo")
+        self.assertIn("/demo/", url_imagen("muestra/labial"))
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_tarjeta_con_srcset(self):
+        response = self.client.get(reverse("categoria", args=["labios"]), secure=True)
+        self.assertContains(response, 'srcset="https://res.cloudinary.com/local/')
+        self.assertContains(response, "w_480,f_auto,q_auto/v1/labial.jpg")
+        response = self.client.get(
+            reverse("producto_detalle", args=[self.producto.pk]), secure=True
+        )
+        self.assertContains(response, "w_960,f_auto,q_auto/v1/labial.jpg")
+
+
+class FixCloudinaryUrlsTests(TestCase):
+    """fix_cloudinary_urls recorre por lotes, admite simulación y reanudación."""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre="Rostro", slug="rostro")
+        self.productos = [
+            Producto.objects.create(
+                nombre=f"Base {i}",
+                categoria=self.categoria,
+                imagen=f"http://res.cloudinary.com/demo/image/upload/v1/base{i}.jpg",
+            )
+            for i in range(3)
+        ]
+        Producto.objects.create(nombre="Sin imagen", categoria=self.categoria)
+
+    def crudos(self):
+        from django.db.models import TextField
+        from django.db.models.functions import Cast
+
+        return list(
+            Producto.objects.filter(pk__in=[p.pk for p in self.productos])
+            .order_by("pk")
+            .annotate(crudo=Cast("imagen", TextField()))
+            .values_list("crudo", flat=True)
+        )
+
+    def ejecutar(self, *args):
+        return ejecutar("fix_cloudinary_urls", "--model", "store.Producto", *args)[0]
+
+    def test_dry_run_no_escribe(self):
+        salida = self.ejecutar("--dry-run")
+        self.assertIn("Would update 3 fields across 3 objects", salida)
+        self.assertTrue(all(url.startswith("http://") for url in self.crudos()))
+
+    def test_lotes_y_reanudacion(self):
+        # Una ejecución interrumpida ya corrigió la primera fila: no se vuelve a leer
+        Producto.objects.filter(pk=self.productos[0].pk).update(
+            imagen="https://res.cloudinary.com/demo/image/upload/v1/base0.jpg"
+        )
+        with self.assertNumQueries(3):  # Lectura + dos bulk_update de un lote
+            salida = self.ejecutar("--batch-size", "1")
+        self.assertIn("Updated 2 fields across 2 objects", salida)
+        self.assertEqual(
+            self.crudos(),
+            [
+                f"https://res.cloudinary.com/demo/image/upload/v1/base{i}.jpg"
+                for i in range(3)
+            ],
+        )
+
+
+class CatalogoImportExportTests(TestCase):
+    """import_catalog / export_catalog: ida y vuelta, upsert por slug y lotes."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Labios", slug="labios")
+
+    def archivo(self, nombre, contenido):
+        ruta = os.path.join(directorio_temporal(self), nombre)
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            archivo.write(contenido)
+        return ruta
+
+    def jsonl(self, *registros):
+        return self.archivo(
+            "catalogo.jsonl", "".join(json.dumps(r) + "\n" for r in registros)
+        )
+
+    def test_crea_y_actualiza_por_slug(self):
+        existente = Producto.objects.create(
+            nombre="Labial Mate", categoria=self.categoria, precio=Decimal("100")
+        )
+        ruta = self.jsonl(
+            {"slug": existente.slug, "precio": "200", "descuento": "0.10",
+             "variaciones": [{"nombre": "Tono", "valor": "Rojo", "color_hex": "#f00"}]},
+            {"slug": "gloss", "nombre": "Gloss", "categoria": "labios", "precio": "50",
+             "imagenes": ["galeria/gloss1", {"image": "galeria/gloss2", "alt_text": "Gloss"}]},
+        )
+        salida, _ = ejecutar("import_catalog", ruta)
+        self.assertIn("1 created, 1 updated", salida)
+
+        existente.refresh_from_db()
+        self.assertEqual(existente.nombre, "Labial Mate")  # Sin valor no se modifica
+        self.assertEqual(existente.precio_final, Decimal("180.00"))
+        self.assertEqual(existente.variaciones.get().precio_final, Decimal("180.00"))
+        gloss = Producto.objects.get(slug="gloss")
+        self.assertEqual(gloss.precio_final, Decimal("50.00"))
+        self.assertEqual(
+            list(gloss.images.values_list("alt_text", "order")), [("", 0), ("Gloss", 1)]
+        )
+        self.assertEqual([p.pk for p in buscar(Producto.objects.all(), "gloss")], [gloss.pk])
+
+    def test_consultas_constantes_por_lote(self):
+        registros = [
+            {"slug": f"labial-{i}", "nombre": f"Labial {i}", "categoria": "labios",
+             "precio": "10", "variaciones": [{"nombre": "Tono", "valor": "Nude"}]}
+            for i in range(20)
+        ]
+        with CaptureQueriesContext(connection) as pocos:
+            ejecutar("import_catalog", self.jsonl(*registros[:2]))
+        with CaptureQueriesContext(connection) as muchos:
+            ejecutar("import_catalog", self.jsonl(*registros[2:]))
+        self.assertEqual(len(muchos), len(pocos))
+        self.assertEqual(Producto.objects.count(), 20)
+
+    def test_dry_run_y_errores(self):
+        ruta = self.jsonl(
+            {"slug": "nuevo", "nombre": "Nuevo", "categoria": "labios", "precio": "10"},
+            {"slug": "otro", "nombre": "Otro", "categoria": "ojos", "precio": "10"},
+            {"nombre": "Caro", "categoria": "labios", "precio": "mucho"},
+        )
+        salida, errores = ejecutar("import_catalog", ruta, "--dry-run")
+        self.assertIn("[dry-run] 3 records", salida)
+        self.assertIn("line 2: categoría inexistente: ojos", errores)
+        self.assertIn("line 3: precio: número inválido", errores)
+        self.assertFalse(Producto.objects.exists())
+
+    def test_ida_y_vuelta_csv(self):
+        producto = Producto.objects.create(
+            nombre="Delineador", categoria=self.categoria, precio=Decimal("80"),
+            imagen="productos/delineador",
+        )
+        producto.variaciones.create(nombre="Color", valor="Negro", price_override=Decimal("90"))
+        ruta = self.archivo("catalogo.csv", "")
+        salida, _ = ejecutar("export_catalog", ruta)
+        self.assertIn("Exported 1 products", salida)
+
+        Producto.objects.all().delete()
+        salida, _ = ejecutar("import_catalog", ruta)
+        self.assertIn("1 created", salida)
+        copia = Producto.objects.get(slug=producto.slug)
+        self.assertEqual(copia.precio, Decimal("80.00"))
+        self.assertEqual(copia.imagen.public_id, "productos/delineador")
+        self.assertEqual(copia.variaciones.get().precio_final, Decimal("90.00"))
+
+
+class BenchmarkCatalogoTests(TestCase):
+    """benchmark_catalog siembra, mide y descarta el catálogo sintético."""
+
+    def test_benchmark_reducido(self):
+        ruta = os.path.join(directorio_temporal(self), "benchmark.json")
+        ejecutar(
+            "benchmark_catalog", "--productos", "20", "--profundidad", "2", "--ramas", "2",
+            "--repeticiones", "1", "--salida", ruta,
+        )
+        with open(ruta) as archivo:
+            vistas = json.load(archivo)["vistas"]
+        self.assertEqual(
+            set(vistas),
+            {"inicio", "productos_por_categoria", "producto_detalle", "ver_carrito",
+             "api_buscar_productos", "api_favoritos"},
+        )
+        for vista, datos in vistas.items():
+            self.assertTrue(datos["escalado"]["ok"], (vista, datos["escalado"]))
+            self.assertGreater(datos["p50_ms"], 0)
+        self.assertFalse(Producto.objects.exists())
+        self.assertFalse(Categoria.objects.exists())
+
+    def test_detalle_con_variaciones(self):
+        categoria = Categoria.objects.create(nombre="Ojos", slug="ojos")
+        producto = Producto.objects.create(nombre="Sombra", categoria=categoria)
+        Variacion.objects.create(producto=producto, nombre="Tono", valor="Dorado")
+        response = self.client.get(reverse("producto_detalle", args=[producto.pk]), secure=True)
+        self.assertContains(response, 'data-color-name="Dorado"')
+
+
+@override_settings(INSTRUMENTACION_MUESTREO=1, PAGE_CACHE_TIMEOUT=0)
+class InstrumentacionTests(TestCase):
+    """InstrumentacionMiddleware publica Server-Timing y una línea de log."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre="Cejas", slug="cejas")
+        Producto.objects.create(nombre="Gel de cejas", categoria=self.categoria)
+
+    def test_server_timing_y_log(self):
+        with self.assertLogs("store.instrumentacion", "INFO") as logs:
+            response = self.client.get(reverse("categoria", args=["cejas"]), secure=True)
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn("tpl;dur=", timing)
+        self.assertRegex(timing, r'cache;desc="\d+ hits, [1-9]\d* misses"')
+        datos = logs.records[0].instrumentacion
+        self.assertEqual((datos["ruta"], datos["estado"]), ("/categoria/cejas/", 200))
+        self.assertGreater(datos["plantillas_ms"], 0)
+
+    @override_settings(INSTRUMENTACION_MUESTREO=0)
+    def test_desactivada(self):
+        response = self.client.get(reverse("categoria", args=["cejas"]), secure=True)
+        self.assertNotIn("Server-Timing", response)
+
+
+@override_settings(
+    INSPECCION_CONSULTAS="error", CONSULTAS_REPETIDAS_UMBRAL=2, PAGE_CACHE_TIMEOUT=0
+)
+class InspeccionConsultasTests(TestCase):
+    """El detector agrupa consultas por forma y hace fallar los N+1."""
+
+    def setUp(self):
+        cache.clear()
+        padre = Categoria.objects.create(nombre="Maquillaje", slug="maquillaje")
+        self.categoria = Categoria.objects.create(nombre="Rubor", slug="rubor", padre=padre)
+        self.productos = []
+        for i in range(4):
+            producto = Producto.objects.create(
+                nombre=f"Rubor {i}", categoria=self.categoria, imagen=f"productos/rubor{i}"
+            )
+            Variacion.objects.create(producto=producto, nombre="Tono", valor=f"Coral {i}")
+            ProductImage.objects.create(producto=producto, image=f"galeria/rubor{i}")
+            self.productos.append(producto)
+
+    def test_forma_sql(self):
+        from .query_inspection import forma_sql
+
+        self.assertEqual(
+            forma_sql("SELECT * FROM t WHERE a = 3 AND b = 'x''y' AND c IN (%s, %s)"),
+            "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)",
+        )
+
+    def test_detecta_n_mas_1(self):
+        from .query_inspection import ConsultasRepetidas, sin_consultas_repetidas
+
+        with self.assertRaises(ConsultasRepetidas) as error:
+            with sin_consultas_repetidas():
+                for producto in Producto.objects.all():
+                    producto.categoria.nombre
+        self.assertIn("4x", str(error.exception))
+        self.assertIn("store/tests.py", str(error.exception))
+
+    def test_vistas_sin_consultas_repetidas(self):
+        ids = ",".join(str(p.pk) for p in self.productos)
+        for url in (
+            reverse("home"),
+            reverse("categoria", args=["maquillaje"]),
+            reverse("producto_detalle", args=[self.productos[0].pk]),
+            reverse("ver_favoritos"),
+            f"{reverse('api_favoritos')}?ids={ids}",
+            f"{reverse('api_buscar_productos')}?q=rubor",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, secure=True).status_code, 200)
+
+
+@override_settings(METRICAS_ACTIVAS=True, PAGE_CACHE_TIMEOUT=0)
+class MetricasTests(TestCase):
+    """/metrics expone contadores e histogramas y suma los de otros procesos."""
+
+    def setUp(self):
+        from . import metrics
+
+        cache.clear()
+        metrics.limpiar()
+        self.addCleanup(metrics.limpiar)
+        categoria = Categoria.objects.create(nombre="Uñas", slug="unas")
+        self.producto = Producto.objects.create(nombre="Esmalte", categoria=categoria)
+
+    def test_exposicion(self):
+        self.client.get(reverse("home"), secure=True)
+        self.client.get(f"{reverse('api_buscar_productos')}?q=esmalte", secure=True)
+        datos = json.dumps({"producto_id": self.producto.pk})
+        self.client.post(reverse("toggle_favorito"), datos, content_type="application/json", secure=True)
+        self.client.post(reverse("agregar_al_carrito"), datos, content_type="application/json", secure=True)
+
+        texto = self.client.get(reverse("metrics"), secure=True).content.decode()
+        self.assertIn("# TYPE store_http_request_duration_seconds histogram", texto)
+        self.assertIn('store_http_requests_total{view="home",method="GET",status="200"} 1', texto)
+        self.assertIn('store_http_request_duration_seconds_bucket{view="home",le="+Inf"} 1', texto)
+        self.assertRegex(texto, r'store_db_queries_per_request_count\{view="home"\} 1\n')
+        self.assertIn('store_search_queries_total{endpoint="api"} 1', texto)
+        self.assertIn('store_favorite_toggles_total{action="added"} 1', texto)
+        self.assertIn("store_cart_adds_total 1", texto)
+
+    def test_multiproceso_y_token(self):
+        from . import metrics
+
+        directorio = directorio_temporal(self)
+        with open(os.path.join(directorio, "metricas-1.json"), "w") as archivo:
+            json.dump({"store_cart_adds_total": [[[], 4]]}, archivo)
+        metrics.CARRITO.inc()
+        with override_settings(METRICAS_DIR=directorio, METRICAS_TOKEN="secreto"):
+            self.assertEqual(self.client.get(reverse("metrics"), secure=True).status_code, 401)
+            response = self.client.get(
+                reverse("metrics"), secure=True, headers={"Authorization": "Bearer otro"}
+            )
+            self.assertEqual(response.status_code, 401)
+            response = self.client.get(
+                reverse("metrics"), secure=True, headers={"Authorization": "Bearer secreto"}
+            )
+        self.assertIn("store_cart_adds_total 5", response.content.decode())
+
+    def test_ganchos_de_gunicorn(self):
+        from . import metrics
+
+        directorio = directorio_temporal(self)
+        instantaneas = {"metricas-7-a.json": 2, "metricas-7-b.json": 3, "metricas-8-c.json": 1}
+        for nombre, cuenta in instantaneas.items():
+            with open(os.path.join(directorio, nombre), "w") as archivo:
+                json.dump({"store_cart_adds_total": [[[], cuenta]]}, archivo)
+
+        # El worker 7 termina: su total pasa al archivo de finalizados
+        metrics.consolidar(directorio, 7)
+        self.assertEqual(
+            sorted(os.listdir(directorio)), ["metricas-8-c.json", metrics.ARCHIVO_FINALIZADOS]
+        )
+        with override_settings(METRICAS_DIR=directorio):
+            self.assertEqual(metrics.agregadas()["store_cart_adds_total"], {(): 6})
+
+        # Arranque del master: nada de la ejecución anterior
+        metrics.limpiar_directorio(directorio)
+        self.assertEqual(os.listdir(directorio), [])
+
+    @override_settings(METRICAS_ACTIVAS=False)
+    def test_desactivadas(self):
+        self.assertEqual(self.client.get(reverse("metrics"), secure=True).status_code, 404)
+
+
+class IndicesCatalogoTests(TestCase):
+    """Las consultas calientes de la tienda usan un índice (EXPLAIN)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Cabello", slug="cabello")
+        for i in range(30):
+            Producto.objects.create(
+                nombre=f"Champú {i}",
+                categoria=cls.categoria,
+                precio=Decimal(1000 + i),
+                descuento=Decimal("0.10") if i % 3 == 0 else Decimal("0"),
+                badge="nuevo" if i % 2 else "",
+                is_active=i % 5 != 0,
+            )
+
+    def plan(self, queryset):
+        if connection.vendor == "postgresql":
+            # Con tablas tan pequeñas PostgreSQL prefiere leerlas enteras
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def assertUsaIndice(self, queryset, indices):
+        plan = self.plan(queryset)
+        self.assertTrue(any(indice in plan for indice in indices), plan)
+        # Ni recorrido completo de la tabla ni ordenación aparte
+        self.assertNotRegex(plan, r"(?m)\bSCAN store_\w+\s*$|Seq Scan")
+        self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan)
+
+    def test_listados(self):
+        activos = Producto.objects.filter(is_active=True).order_by(*ORDEN_CATALOGO)
+        casos = {
+            "inicio": (activos, ["producto_activo_fecha_idx"]),
+            "categoria": (
+                activos.en_categoria(self.categoria),
+                ["producto_cat_activo_fecha_idx", "producto_activo_fecha_idx"],
+            ),
+            "etiqueta": (activos.filter(badge="nuevo"), ["producto_badge_activo_idx"]),
+            "ofertas": (activos.filter(descuento__gt=0), ["producto_oferta_fecha_idx"]),
+            "precio_asc": (
+                Producto.objects.filter(is_active=True, precio_final__gte=1010).order_by(
+                    *ORDENES_PRECIO["precio_asc"]
+                ),
+                ["producto_activo_precio_idx"],
+            ),
+            "precio_desc": (
+                Producto.objects.filter(is_active=True, precio_final__lte=1020).order_by(
+                    *ORDENES_PRECIO["precio_desc"]
+                ),
+                ["producto_activo_precdesc_idx"],
+            ),
+        }
+        for nombre, (queryset, indices) in casos.items():
+            with self.subTest(nombre):
+                self.assertUsaIndice(queryset[:13], indices)
+
+    def test_anuncios_y_favoritos(self):
+        self.assertUsaIndice(
+            Anuncio.objects.filter(is_active=True).order_by("order"),
+            ["anuncio_activo_orden_idx"],
+        )
+        # unique_together (session_key, producto) ya empieza por session_key
+        self.assertUsaIndice(
+            Favorito.objects.filter(session_key="abc").values_list("producto_id", flat=True),
+            ["session_key"],
+        )
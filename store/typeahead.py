@@ -0,0 +1,293 @@
+"""
+Índice de trigramas en memoria para la búsqueda en vivo (typeahead).
+
+Se construye bajo demanda con una sola consulta (nombre del producto y de su
+categoría) y después responde sin tocar la base de datos, tolerando errores de
+escritura ("lavial" encuentra "Labial"). Las señales de store/signals.py lo
+publican cada alta, baja o cambio en un registro compartido en la caché
+(secuencia + un cambio por número) y cada worker aplica los que le faltan en su
+siguiente consulta, sin reconstruir el índice. Solo se reconstruye si cambia la
+versión compartida (invalidar(), caché vaciada) o si faltan cambios intermedios.
+"""
+
+import threading
+import uuid
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+
+from .search import tokenizar
+
+VERSION_KEY = "store:typeahead:version"
+SECUENCIA_KEY = "store:typeahead:secuencia:{}"
+CAMBIO_KEY = "store:typeahead:cambio:{}:{}"
+CAMBIOS_TTL = 60 * 60 * 24
+# Con más cambios pendientes sale más barato reconstruir con una consulta
+MAX_CAMBIOS = 500
+UMBRAL_SIMILITUD = 0.3
+PESO_CATEGORIA = 0.6  # Una coincidencia en la categoría pesa menos que en el nombre
+PUNTAJE_PREFIJO = 0.9  # "lab" -> "labial"; la palabra exacta puntúa 1.0
+
+
+def trigramas(palabra):
+    """Trigramas con relleno al inicio y al final: 'rojo' -> {'  r', ' ro', 'roj', 'ojo', 'jo '}."""
+    relleno = f"  {palabra} "
+    return frozenset(relleno[i : i + 3] for i in range(len(relleno) - 2))
+
+
+class TrigramIndex:
+    """Índice invertido palabra -> productos y trigrama -> palabras."""
+
+    def __init__(self):
+        self.version = None
+        self.secuencia = 0  # Último cambio del registro compartido aplicado
+        self._lock = threading.RLock()
+        self._documentos = {}  # producto_id -> {palabra: peso}
+        self._productos_por_palabra = defaultdict(set)
+        self._palabras_por_trigrama = defaultdict(set)
+        self._trigramas_por_palabra = {}
+
+    def __len__(self):
+        return len(self._documentos)
+
+    def construir(self, version=None):
+        """Carga todos los productos activos con una única consulta."""
+        from .models import Producto
+
+        filas = Producto.objects.filter(is_active=True).values_list(
+            "id", "nombre", "categoria__nombre"
+        )
+        with self._lock:
+            self._documentos.clear()
+            self._productos_por_palabra.clear()
+            self._palabras_por_trigrama.clear()
+            self._trigramas_por_palabra.clear()
+            for producto_id, nombre, categoria in filas:
+                self._agregar(producto_id, nombre, categoria)
+            self.version = version
+
+    def agregar(self, producto_id, nombre, categoria=""):
+        """Indexa (o reindexa) un producto."""
+        with self._lock:
+            self._quitar(producto_id)
+            self._agregar(producto_id, nombre, categoria)
+
+    def quitar(self, producto_id):
+        with self._lock:
+            self._quitar(producto_id)
+
+    def _agregar(self, producto_id, nombre, categoria):
+        pesos = {}
+        for palabra in tokenizar(categoria):
+            pesos[palabra] = PESO_CATEGORIA
+        for palabra in tokenizar(nombre):
+            pesos[palabra] = 1.0
+        if not pesos:
+            return
+        self._documentos[producto_id] = pesos
+        for palabra in pesos:
+            self._productos_por_palabra[palabra].add(producto_id)
+            if palabra not in self._trigramas_por_palabra:
+                self._trigramas_por_palabra[palabra] = trigramas(palabra)
+                for trigrama in self._trigramas_por_palabra[palabra]:
+                    self._palabras_por_trigrama[trigrama].add(palabra)
+
+    def _quitar(self, producto_id):
+        pesos = self._documentos.pop(producto_id, None)
+        if not pesos:
+            return
+        for palabra in pesos:
+            productos = self._productos_por_palabra[palabra]
+            productos.discard(producto_id)
+            if productos:
+                continue
+            # Ningún producto usa ya esta palabra: se limpia del índice de trigramas
+            del self._productos_por_palabra[palabra]
+            for trigrama in self._trigramas_por_palabra.pop(palabra, ()):
+                self._palabras_por_trigrama[trigrama].discard(palabra)
+                if not self._palabras_por_trigrama[trigrama]:
+                    del self._palabras_por_trigrama[trigrama]
+
+    def _palabras_similares(self, token):
+        """Palabras del índice parecidas a 'token' con su similitud (0-1)."""
+        trigramas_token = trigramas(token)
+        comunes = Counter()
+        for trigrama in trigramas_token:
+            for palabra in self._palabras_por_trigrama.get(trigrama, ()):
+                comunes[palabra] += 1
+
+        similares = {}
+        for palabra, n in comunes.items():
+            if palabra == token:
+                similitud = 1.0
+            elif palabra.startswith(token):
+                similitud = PUNTAJE_PREFIJO
+            else:
+                total = len(trigramas_token) + len(self._trigramas_por_palabra[palabra]) - n
+                similitud = n / total
+            if similitud >= UMBRAL_SIMILITUD:
+                similares[palabra] = similitud
+        return similares
+
+    def buscar(self, consulta, limite=8):
+        """
+        Devuelve los IDs de producto que mejor coinciden con la consulta, del más
+        al menos relevante. Cada palabra de la consulta debe coincidir (de forma
+        exacta, por prefijo o aproximada) con alguna palabra del producto.
+        """
+        tokens = list(dict.fromkeys(tokenizar(consulta)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            puntajes = None
+            for token in tokens:
+                por_producto = {}
+                for palabra, similitud in self._palabras_similares(token).items():
+                    for producto_id in self._productos_por_palabra[palabra]:
+                        puntaje = similitud * self._documentos[producto_id][palabra]
+                        if puntaje > por_producto.get(producto_id, 0):
+                            por_producto[producto_id] = puntaje
+                if puntajes is None:
+                    puntajes = por_producto
+                else:
+                    puntajes = {
+                        producto_id: puntajes[producto_id] + puntaje
+                        for producto_id, puntaje in por_producto.items()
+                        if producto_id in puntajes
+                    }
+                if not puntajes:
+                    return []
+
+        # Más relevantes primero; a igual puntaje, los productos más recientes
+        ordenados = sorted(puntajes.items(), key=lambda item: (-item[1], -item[0]))
+        return [producto_id for producto_id, _ in ordenados[:limite]]
+
+
+_indice = TrigramIndex()
+
+
+def _version_compartida():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _clave_cambio(version, numero):
+    return CAMBIO_KEY.format(version, numero)
+
+
+def _aplicar(cambio):
+    operacion, *datos = cambio
+    if operacion == "agregar":
+        _indice.agregar(*datos)
+    elif operacion == "quitar":
+        _indice.quitar(*datos)
+    elif operacion == "categoria":
+        from .models import Producto
+
+        filas = Producto.objects.filter(categoria_id=datos[0], is_active=True).values_list(
+            "id", "nombre", "categoria__nombre"
+        )
+        for producto_id, nombre, categoria in filas:
+            _indice.agregar(producto_id, nombre, categoria)
+
+
+def _reconstruir(version):
+    # La secuencia se lee antes de construir: los cambios publicados durante la
+    # construcción se vuelven a aplicar después (son idempotentes)
+    secuencia = cache.get(SECUENCIA_KEY.format(version), 0)
+    _indice.construir(version)
+    _indice.secuencia = secuencia
+
+
+def _ponerse_al_dia(version):
+    """Aplica los cambios publicados por otros procesos desde la última consulta."""
+    secuencia = cache.get(SECUENCIA_KEY.format(version), 0)
+    if secuencia <= _indice.secuencia:
+        return
+    if secuencia - _indice.secuencia > MAX_CAMBIOS:
+        _reconstruir(version)
+        return
+    numeros = range(_indice.secuencia + 1, secuencia + 1)
+    cambios = cache.get_many([_clave_cambio(version, n) for n in numeros])
+    pendientes = []
+    for numero in numeros:
+        cambio = cambios.get(_clave_cambio(version, numero))
+        if cambio is None:
+            if any(_clave_cambio(version, n) in cambios for n in range(numero + 1, secuencia + 1)):
+                # Un cambio intermedio caducó o fue expulsado: no se puede reproducir
+                _reconstruir(version)
+                return
+            # Publicado (incr) pero aún sin escribir: se aplicará en la próxima consulta
+            break
+        pendientes.append((numero, cambio))
+    with _indice._lock:
+        for numero, cambio in pendientes:
+            _aplicar(cambio)
+            _indice.secuencia = numero
+
+
+def get_index():
+    """
+    Devuelve el índice del proceso: lo reconstruye si la versión compartida
+    cambió y, si no, aplica los cambios incrementales de los demás workers.
+    """
+    version = _version_compartida()
+    if _indice.version != version:
+        _reconstruir(version)
+    else:
+        _ponerse_al_dia(version)
+    return _indice
+
+
+def _publicar(cambio):
+    """
+    Añade un cambio al registro compartido. Este proceso lo aplica ya si su
+    índice está al día; los demás lo aplican en su siguiente consulta, sin
+    reconstruir el índice completo.
+    """
+    version = _version_compartida()
+    clave_secuencia = SECUENCIA_KEY.format(version)
+    cache.add(clave_secuencia, 0, None)
+    numero = cache.incr(clave_secuencia)
+    cache.set(_clave_cambio(version, numero), cambio, CAMBIOS_TTL)
+    with _indice._lock:
+        if _indice.version == version and _indice.secuencia == numero - 1:
+            _aplicar(cambio)
+            _indice.secuencia = numero
+
+
+def indexar_producto(producto):
+    """Publica el alta o modificación de un producto guardado."""
+    if producto.is_active:
+        _publicar(
+            (
+                "agregar",
+                producto.id,
+                producto.nombre,
+                producto.categoria.nombre if producto.categoria_id else "",
+            )
+        )
+    else:
+        _publicar(("quitar", producto.id))
+
+
+def desindexar_producto(producto_id):
+    """Publica la baja de un producto eliminado."""
+    _publicar(("quitar", producto_id))
+
+
+def reindexar_categoria(categoria):
+    """Publica el renombrado de una categoría: cada worker reindexa sus productos."""
+    _publicar(("categoria", categoria.pk))
+
+
+def invalidar():
+    """
+    Obliga a todos los procesos, incluido este, a reconstruir el índice. Para
+    cargas masivas (bulk_create/bulk_update) que no disparan señales.
+    """
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
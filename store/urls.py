@@ -1,6 +1,7 @@
 # store/urls.py
 from django.urls import path
 from . import views  
+from .metrics import vista_metricas
 
 urlpatterns = [
     path("", views.inicio, name="home"),
@@ -27,6 +28,10 @@ urlpatterns = [
         name="productos_por_etiqueta",
     ),
     path('api/favoritos/', views.api_favoritos, name='api_favoritos'),
+    path('api/facetas/', views.api_facetas, name='api_facetas'),
+    path('api/productos/', views.api_productos, name='api_productos'),
     
     path('categoria/<slug:slug>/', views.productos_por_categoria, name='categoria'),
+    # Métricas para Prometheus (solo con METRICAS_ACTIVAS)
+    path('metrics', vista_metricas, name='metrics'),
 ]
@@ -1,15 +1,31 @@
 import json  # Importa el módulo json
-from decimal import Decimal  # Import Decimal para cálculos precisos
+import logging
+from decimal import Decimal, InvalidOperation  # Import Decimal para cálculos precisos
 
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.db.models import Q
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.vary import vary_on_headers
 from django.views.generic import ListView  # Importa ListView
 
-# Asegúrate de importar Producto, Categoria, Variacion y Favorito
+from .cache import CATALOGO, LRUCache, get_generacion
+from .facets import FACETAS, RANGOS_PRECIO, get_facet_index
+from .favoritos import (MAX_FAVORITOS, guardar_favoritos, leer_favoritos,
+                         sincronizar_cookie)
+from .hydration import hidratar, productos_serializados
+from .images import url_imagen
+from .metrics import BUSQUEDAS, CARRITO, FAVORITOS
 from .models import (Anuncio, Categoria, Favorito, MenuItem, Producto,
                      SiteSetting, Variacion)
+from .pagination import (ORDEN_CATALOGO, PRODUCTOS_POR_PAGINA, CursorInvalido,
+                         CursorPaginator, total_estimado)
+from .search import buscar, tokenizar
+from .typeahead import get_index as get_typeahead_index
+
+logger = logging.getLogger(__name__)
 
 
 def google_verification(request):
@@ -41,10 +57,8 @@ def format_precio(precio):
     return f"$ {precio_formateado}"
 
 
-from django.http import Http404, JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-
-# from django.db.models import Q # Ya importado arriba
+# Resultados de la búsqueda en vivo por consulta normalizada (acotada y con TTL)
+_cache_busquedas = LRUCache(maxsize=512, ttl=60 * 10)
 
 
 def api_buscar_productos(request):
@@ -61,20 +75,33 @@ def api_buscar_productos(request):
             }
         )
 
+    BUSQUEDAS.inc(endpoint="api")
+
+    # Consultas normalizadas ("Labial ", "labial") comparten entrada; la generación
+    # del catálogo cambia con cada alta/edición y deja obsoletas las anteriores.
+    clave_cache = (get_generacion(CATALOGO), " ".join(tokenizar(query)))
+    resultados = _cache_busquedas.get(clave_cache)
+    if resultados is not None:
+        return JsonResponse(
+            {"exito": True, "productos": resultados, "total": len(resultados)}
+        )
+
     try:
-        # Realizar búsqueda en varios campos
-        productos = Producto.objects.filter(
-            Q(nombre__icontains=query)
-            | Q(descripcion__icontains=query)
-            | Q(categoria__nombre__icontains=query),
-            is_active=True,  # Solo productos activos
-        ).distinct()[
-            :8
-        ]  # Limitar a 8 resultados
+        # Índice de trigramas en memoria: tolera errores de escritura y no consulta la BD
+        ids = get_typeahead_index().buscar(query, limite=8)  # Limitar a 8 resultados
+        if ids:
+            por_id = Producto.objects.para_listado().filter(is_active=True).in_bulk(ids)
+            productos = [por_id[pk] for pk in ids if pk in por_id]
+        else:
+            # Sin coincidencias en nombre/categoría: texto completo (incluye descripción)
+            productos = buscar(
+                Producto.objects.para_listado().filter(is_active=True),  # Solo productos activos
+                query,
+            )[:8]
 
         resultados = []
         for producto in productos:
-            precio = producto.get_precio_final()
+            precio = producto.precio_final
             resultados.append(
                 {
                     "id": producto.id,
@@ -88,6 +115,7 @@ def api_buscar_productos(request):
                     "descuento": True if producto.descuento else False,
                 }
             )
+        _cache_busquedas.set(clave_cache, resultados)
 
         return JsonResponse(
             {"exito": True, "productos": resultados, "total": len(resultados)}
@@ -112,12 +140,8 @@ def buscar_productos(request):
             }
         )
 
-    # Búsqueda en múltiples campos usando Q objects
-    productos = Producto.objects.filter(
-        Q(nombre__icontains=query)  # Busca en el nombre
-        | Q(descripcion__icontains=query)  # Busca en la descripción
-        | Q(categoria__nombre__icontains=query)  # Busca en el nombre de la categoría
-    ).distinct()[
+    # Búsqueda de texto completo en nombre, descripción y categoría
+    productos = buscar(Producto.objects.para_listado(), query)[
         :10
     ]  # Limita a 10 resultados para mejor rendimiento
 
@@ -129,8 +153,8 @@ def buscar_productos(request):
                 "id": producto.id,
                 "nombre": producto.nombre,
                 "precio": format_precio(
-                    producto.get_precio_final()
-                ),  # Usar el precio con descuento si existe
+                    producto.precio_final
+                ),  # Precio con descuento ya almacenado
                 "imagen": producto.get_primary_image_url(),  # Usa el método que ya tienes para obtener la imagen
                 "url": f"/producto/{producto.id}/",  # URL para el detalle del producto
                 "categoria": (
@@ -143,39 +167,52 @@ def buscar_productos(request):
 
 
 def get_common_context(request):
-    # Asegurar que exista una clave de sesión
-    if not request.session.session_key:
-        request.session.save()
-
-    # Obtener IDs de productos favoritos usando solo session_key
-    favoritos_ids = set(
-        Favorito.objects.filter(session_key=request.session.session_key).values_list(
-            "producto_id", flat=True
-        )
-    )
-    categorias_principales = Categoria.objects.filter(padre__isnull=True)
+    # Los favoritos no se leen aquí: main.js los marca desde localStorage, así
+    # que el catálogo no toca la sesión ni la tabla Favorito.
+    # Árbol de categorías desde la caché (incluye los hijos de cada categoría)
+    categorias_principales = Categoria.objects.arbol().principales
 
     return {
-        "favoritos_ids": favoritos_ids,
         "categorias_principales": categorias_principales,
     }
 
-def inicio(request):
-    """
-    Vista principal de la tienda virtual Lumiere Glamour.
-    Filtra productos por búsqueda, categoría, subcategoría y ofertas activas.
-    También maneja la paginación, la carga de anuncios y favoritos por sesión.
+ORDENES_PRECIO = {
+    "precio_asc": ("precio_final", "-fecha_creacion", "-id"),
+    "precio_desc": ("-precio_final", "-fecha_creacion", "-id"),
+}
+
+
+def _parse_precio(valor):
+    """Convierte un parámetro de precio de la URL en Decimal; None si no es válido."""
+    if not valor:
+        return None
+    try:
+        precio = Decimal(valor.replace(".", "").replace(",", ""))
+    except InvalidOperation:
+        return None
+    return precio if precio.is_finite() and precio >= 0 else None
+
+
+def _filtrar_catalogo(params):
     """
+    Aplica los filtros de la URL (q, categoria, subcategoria, ofertas, precio_min,
+    precio_max y orden) sobre los productos activos. Lo comparten 'inicio' y
+    'api_productos' para que el scroll infinito cargue exactamente el mismo listado.
 
+    Devuelve un dict con el QuerySet, el orden de paginación (None si se ordena por
+    relevancia) y los datos de la categoría actual para la plantilla.
+    """
     # --- 1. Obtener parámetros de búsqueda y filtrado desde la URL ---
-    query = request.GET.get("q")  # Término de búsqueda
-    categoria_id = request.GET.get("categoria")  # ID de categoría seleccionada
-    subcategoria_id = request.GET.get("subcategoria")  # ID de subcategoría seleccionada
-    ofertas_activas = request.GET.get("ofertas")  # Filtro de ofertas
-    page = request.GET.get("page", 1)  # Página de paginación actual
-
-    # --- 2. Filtrar productos activos ---
-    productos_queryset = Producto.objects.filter(is_active=True)
+    query = params.get("q")  # Término de búsqueda
+    categoria_id = params.get("categoria")  # ID de categoría seleccionada
+    subcategoria_id = params.get("subcategoria")  # ID de subcategoría seleccionada
+    ofertas_activas = params.get("ofertas")  # Filtro de ofertas
+    precio_min = _parse_precio(params.get("precio_min"))  # Rango de precio final
+    precio_max = _parse_precio(params.get("precio_max"))
+    orden = params.get("orden")  # "precio_asc" o "precio_desc"
+
+    # --- 2. Filtrar productos activos (con imágenes y variaciones precargadas) ---
+    productos_queryset = Producto.objects.para_listado().filter(is_active=True)
     nombre_categoria_actual = None
     categoria_actual_obj = None
 
@@ -184,13 +221,9 @@ def inicio(request):
         productos_queryset = productos_queryset.filter(descuento__gt=0)
         nombre_categoria_actual = "Ofertas Especiales"
 
-    # --- 4. Filtro por búsqueda (nombre, descripción o categoría) ---
+    # --- 4. Filtro por búsqueda (nombre, descripción o categoría, por relevancia) ---
     if query:
-        productos_queryset = productos_queryset.filter(
-            Q(nombre__icontains=query)
-            | Q(descripcion__icontains=query)
-            | Q(categoria__nombre__icontains=query)
-        ).distinct()
+        productos_queryset = buscar(productos_queryset, query)
 
     # --- 5. Filtro por categoría ---
     if categoria_id:
@@ -200,17 +233,14 @@ def inicio(request):
                 categoria=categoria_actual_obj
             )
             nombre_categoria_actual = categoria_actual_obj.nombre
-        except Categoria.DoesNotExist:
+        except (Categoria.DoesNotExist, ValueError):
             pass
 
-    # --- 6. Filtro por subcategoría (incluye productos de subcategorías hijas) ---
+    # --- 6. Filtro por subcategoría (incluye subcategorías a cualquier profundidad) ---
     if subcategoria_id:
         try:
             subcategoria_actual_obj = Categoria.objects.get(id=subcategoria_id)
-            productos_queryset = productos_queryset.filter(
-                Q(categoria=subcategoria_actual_obj)
-                | Q(categoria__padre=subcategoria_actual_obj)
-            ).distinct()
+            productos_queryset = productos_queryset.en_categoria(subcategoria_actual_obj)
             if nombre_categoria_actual:
                 nombre_categoria_actual = (
                     f"{subcategoria_actual_obj.nombre} ({nombre_categoria_actual})"
@@ -221,140 +251,223 @@ def inicio(request):
             if subcategoria_actual_obj.padre:
                 categoria_actual_obj = subcategoria_actual_obj.padre
 
-        except Categoria.DoesNotExist:
+        except (Categoria.DoesNotExist, ValueError):
             pass
 
-    # --- 7. Paginación de productos (12 por página) ---
-    paginator = Paginator(productos_queryset, 12)
+    # --- 7. Rango y orden por precio final (columna indexada, sin cálculo en Python) ---
+    if precio_min is not None or precio_max is not None:
+        productos_queryset = productos_queryset.en_rango_precio(precio_min, precio_max)
+    if orden in ORDENES_PRECIO:
+        orden_paginacion = ORDENES_PRECIO[orden]
+    elif query:
+        orden_paginacion = None  # Relevancia: no admite cursor, se pagina por número
+    else:
+        orden_paginacion = ORDEN_CATALOGO
+
+    return {
+        "queryset": productos_queryset,
+        "orden": orden_paginacion,
+        "query": query or "",
+        "categoria_actual_obj": categoria_actual_obj,
+        "nombre_categoria_actual": nombre_categoria_actual,
+        "ofertas_activas": ofertas_activas == "true",
+        "precio_min": precio_min,
+        "precio_max": precio_max,
+        "orden_precio": orden if orden in ORDENES_PRECIO else "",
+    }
+
+
+def _paginar_listado(request, queryset, orden):
+    """
+    Pagina un listado. Por defecto usa cursor (una consulta por rango, sin COUNT);
+    los enlaces antiguos con ?page=N y el orden por relevancia siguen usando el
+    Paginator numerado de Django.
+    """
+    if orden is not None and "page" not in request.GET:
+        paginador = CursorPaginator(queryset, PRODUCTOS_POR_PAGINA, orden)
+        try:
+            return paginador.pagina(request.GET.get("cursor"))
+        except CursorInvalido:
+            return paginador.pagina()
+
+    paginator = Paginator(queryset, PRODUCTOS_POR_PAGINA)
+    page = request.GET.get("page", 1)  # Página de paginación actual
     try:
-        productos_paginados = paginator.page(page)
+        return paginator.page(page)
     except PageNotAnInteger:
-        productos_paginados = paginator.page(1)
+        return paginator.page(1)
     except EmptyPage:
-        productos_paginados = paginator.page(paginator.num_pages)
+        return paginator.page(paginator.num_pages)
 
-    # --- 8. Obtener session_key única por usuario ---
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.save()
-        session_key = request.session.session_key
 
-    # --- 9. Obtener productos marcados como favoritos por el usuario ---
-    favoritos = Favorito.objects.filter(session_key=session_key).values_list(
-        "producto_id", flat=True
-    )
+def _contexto_paginacion(request, pagina):
+    """extra_query para el paginador numerado y URLs de la página siguiente por cursor."""
+    params = request.GET.copy()
+    params.pop("page", None)
+    params.pop("cursor", None)
+    contexto = {
+        "extra_query": ("&" + params.urlencode()) if params else "",
+        "siguiente_url": "",
+        "siguiente_pagina_url": "",
+    }
+    if getattr(pagina, "es_cursor", False) and pagina.has_next:
+        params["cursor"] = pagina.siguiente_cursor
+        contexto["siguiente_pagina_url"] = f"{request.path}?{params.urlencode()}"
+        resolver = request.resolver_match
+        if resolver is not None and resolver.url_name == "categoria":
+            params["slug"] = resolver.kwargs["slug"]
+        contexto["siguiente_url"] = f"{reverse('api_productos')}?{params.urlencode()}"
+    return contexto
 
-    # --- 10. Cargar contexto común (categorías, subcategorías, menú, etc.) ---
-    context = get_common_context(request)
 
-    # --- 11. Procesar productos para el template (formato y favoritos) ---
-    productos_procesados = []
-    for producto in productos_paginados:
-        productos_procesados.append(
-            {
-                "id": producto.id,
-                "nombre": producto.nombre,
-                "descripcion": producto.descripcion,
-                "precio": format_precio(producto.precio),
-                "descuento": (
-                    format_precio(producto.descuento) if producto.descuento else "0"
-                ),
-                "get_precio_final": format_precio(producto.get_precio_final()),
-                "imagen": producto.get_primary_image_url(),
-                "is_favorito": producto.id
-                in favoritos,  # ✅ Activa el corazón si es favorito
-            }
-        )
+# Plantilla que se devuelve sola cuando la petición trae la cabecera X-Fragment
+FRAGMENTO_LISTADO = "store/components/listado_productos.html"
 
-    # --- 12. Obtener anuncios activos (banners del carrusel) ---
-    anuncios = Anuncio.objects.filter(is_active=True).order_by("order")
 
-   # --- 13. Actualizar el contexto con los datos dinámicos de esta vista ---
-    context.update(
-        {
-            "productos": productos_procesados,
-            "pagina_productos": productos_paginados,
-            "query": query or "",
-            "categoria_actual": (categoria_actual_obj.id if categoria_actual_obj else None),
-            "nombre_categoria_actual": nombre_categoria_actual or "Todos los productos",
-            "ofertas_activas": ofertas_activas == "true",
-            "anuncios": anuncios,
-            "favoritos": list(favoritos),  # 🔐 Necesario para la función de favoritos en JS
-        }
-    )
+def _es_fragmento(request):
+    """Indica si pagination.js pidió solo la cuadrícula (cabecera 'X-Fragment: 1')."""
+    return request.headers.get("X-Fragment") == "1"
 
-    # ➕ NUEVO: construir querystring extra sin 'page'
-    params = request.GET.copy()          # <-- aquí va request, no self.request
-    params.pop("page", None)
-    context["extra_query"] = ("&" + params.urlencode()) if params else ""
+
+@vary_on_headers("X-Fragment")
+def inicio(request):
+    """
+    Vista principal de la tienda virtual Lumiere Glamour.
+    Filtra productos por búsqueda, categoría, subcategoría y ofertas activas.
+    También maneja la paginación, la carga de anuncios y favoritos por sesión.
+    """
+
+    # --- 1 a 7. Filtros de la URL (ver _filtrar_catalogo) ---
+    filtros = _filtrar_catalogo(request.GET)
+    categoria_actual_obj = filtros["categoria_actual_obj"]
+    if filtros["query"]:
+        BUSQUEDAS.inc(endpoint="catalog")
+
+    # --- 8. Paginación de productos (12 por página, por cursor salvo ?page=N) ---
+    productos_paginados = _paginar_listado(request, filtros["queryset"], filtros["orden"])
+
+    # --- 9. Datos del listado (lo único que necesita el modo fragmento) ---
+    context = {
+        "productos": productos_paginados.object_list,
+        "pagina_productos": productos_paginados,
+        "query": filtros["query"],
+        "categoria_actual": (categoria_actual_obj.id if categoria_actual_obj else None),
+        "nombre_categoria_actual": filtros["nombre_categoria_actual"] or "Todos los productos",
+        "ofertas_activas": filtros["ofertas_activas"],
+        "precio_min": filtros["precio_min"],
+        "precio_max": filtros["precio_max"],
+        "orden": filtros["orden_precio"],
+    }
+    # ➕ querystring extra sin 'page' y URLs del cursor siguiente
+    context.update(_contexto_paginacion(request, productos_paginados))
+
+    # --- 10. pagination.js solo necesita la cuadrícula: sin navbar, anuncios ni sesión ---
+    if _es_fragmento(request):
+        return render(request, FRAGMENTO_LISTADO, context)
+
+    # --- 11. Obtener anuncios activos (banners del carrusel) ---
+    anuncios = Anuncio.objects.filter(is_active=True).order_by("order")
+
+    # --- 12. Contexto común (categorías, menú, etc.) + el del listado ---
+    listado = context
+    context = get_common_context(request)
+    context.update(listado)
+    context["anuncios"] = anuncios
 
     # ✅ Se establece 'inicio' como la página activa para el menú de navegación principal.
     context["active_page"] = "inicio"
 
-    # --- 14. Renderizar la plantilla con todos los datos ---
+    # --- 13. Renderizar la plantilla con todos los datos ---
     return render(request, "store/index.html", context)
 
+
+def api_productos(request):
+    """
+    Siguiente página de un listado para el scroll infinito: acepta los mismos
+    filtros que 'inicio' (más 'slug' para una categoría) y el parámetro 'cursor'.
+    Devuelve solo el HTML de las tarjetas y la URL de la página siguiente; con
+    contar=1 incluye además el total aproximado.
+    """
+    filtros = _filtrar_catalogo(request.GET)
+    queryset = filtros["queryset"]
+    slug = request.GET.get("slug")
+    if slug:
+        categoria = Categoria.objects.arbol().get(slug)
+        if categoria is None:
+            raise Http404("Categoría no encontrada")
+        queryset = queryset.en_categoria(categoria)
+
+    paginador = CursorPaginator(
+        queryset, PRODUCTOS_POR_PAGINA, filtros["orden"] or ORDEN_CATALOGO
+    )
+    try:
+        pagina = paginador.pagina(request.GET.get("cursor"))
+    except CursorInvalido:
+        return JsonResponse({"error": "Cursor inválido"}, status=400)
+
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    params.pop("page", None)
+    params.pop("contar", None)
+    siguiente_url = ""
+    if pagina.has_next:
+        params["cursor"] = pagina.siguiente_cursor
+        siguiente_url = f"{request.path}?{params.urlencode()}"
+
+    data = {
+        "html": render_to_string(
+            "store/components/product_grid_items.html",
+            {"productos": pagina},
+            request=request,
+        ),
+        "cantidad": len(pagina),
+        "siguiente": pagina.siguiente_cursor,
+        "siguiente_url": siguiente_url,
+    }
+    if request.GET.get("contar") == "1":
+        data["total_estimado"] = total_estimado(queryset)
+    return JsonResponse(data)
+
+
+@vary_on_headers("X-Fragment")
 def productos_por_categoria(request, slug):
     """
     Vista para mostrar los productos de una categoría específica,
     manejando paginación con la misma lógica que la vista de inicio.
     """
-     # ------------------ AÑADE ESTAS LÍNEAS ------------------
-    print(f"DEBUG: Vista 'productos_por_categoria' llamada.")
-    print(f"DEBUG: Slug de la categoría: {slug}")
-    print(f"DEBUG: Parámetros GET de la solicitud: {request.GET}")
-    # ---------------------------------------------------------
-
-    # 1. Obtener la categoría por su slug
-    categoria_actual = get_object_or_404(Categoria, slug=slug)
-
-    # 2. Obtener productos de la categoría y subcategorías
-    categorias_a_incluir = [categoria_actual]
-
-    def get_all_subcategories(category, visited=None):
-        if visited is None:
-            visited = set()
-        subcategories = []
-        for sub in category.subcategorias.all():
-            if sub.id not in visited:
-                visited.add(sub.id)
-                subcategories.append(sub)
-                subcategories.extend(get_all_subcategories(sub, visited))
-        return subcategories
-
-    categorias_a_incluir.extend(get_all_subcategories(categoria_actual))
-
-    productos_queryset = Producto.objects.filter(
-        categoria__in=categorias_a_incluir,
-        is_active=True
-    ).order_by('-fecha_creacion')
-
-    # 3. Paginación de productos
-    page = request.GET.get("page", 1)
-    paginator = Paginator(productos_queryset, 12)
-    try:
-        productos_paginados = paginator.page(page)
-    except PageNotAnInteger:
-        productos_paginados = paginator.page(1)
-    except EmptyPage:
-        productos_paginados = paginator.page(paginator.num_pages)
+    logger.debug("productos_por_categoria: slug=%s GET=%s", slug, request.GET)
 
-    # 4. Construir el contexto para la plantilla
-    context = get_common_context(request)
-    context.update({
+    # 1. Obtener la categoría por su slug desde el árbol cacheado
+    arbol = Categoria.objects.arbol()
+    categoria_actual = arbol.get(slug)
+    if categoria_actual is None:
+        raise Http404("Categoría no encontrada")
+
+    # 2. Obtener productos de la categoría y de todas sus subcategorías (con los
+    # mismos filtros opcionales de la URL que la página de inicio)
+    filtros = _filtrar_catalogo(request.GET)
+    productos_queryset = filtros["queryset"].en_categoria(categoria_actual)
+
+    # 3. Paginación de productos (por cursor salvo ?page=N)
+    productos_paginados = _paginar_listado(request, productos_queryset, filtros["orden"])
+
+    # 4. Contexto del listado, con extra_query y las URLs del cursor siguiente
+    context = {
         "categoria": categoria_actual,
         "productos": productos_paginados.object_list, # Usa la lista de productos
         "pagina_productos": productos_paginados, # Usa el objeto paginador
         "nombre_categoria_actual": categoria_actual.nombre,
         "active_page": categoria_actual.slug,
-    })
+    }
+    context.update(_contexto_paginacion(request, productos_paginados))
 
-    # 5. Calcular extra_query para el paginador
-    params = request.GET.copy()
-    if 'page' in params:
-        del params['page']
-    extra_query = ("&" + params.urlencode()) if params else ""
-    context["extra_query"] = extra_query
+    # 5. Modo fragmento: solo la cuadrícula y el paginador, sin get_common_context
+    if _es_fragmento(request):
+        return render(request, FRAGMENTO_LISTADO, context)
+
+    listado = context
+    context = get_common_context(request)
+    context.update(listado)
 
     return render(request, "store/categoria.html", context)
 
@@ -364,7 +477,9 @@ def producto_detalle(request, pk):
     También pasa el contexto común para la barra de navegación y el footer.
     """
     # Obtiene el producto por su ID, o devuelve un 404 si no se encuentra.
-    producto = get_object_or_404(Producto, pk=pk)
+    # Con categoría, imágenes y variaciones precargadas: la plantilla recorre
+    # producto.images.all dos veces
+    producto = get_object_or_404(Producto.objects.para_listado(), pk=pk)
 
     # Obtener el contexto común
     common_context = get_common_context(request)  # CAMBIO: Pasar request aquí
@@ -372,32 +487,16 @@ def producto_detalle(request, pk):
     # Añadir el producto específico al contexto
     context = {
         "producto": producto,
-        # Determinar si el producto específico es favorito
-        "is_favorito": producto.id
-        in common_context["favoritos_ids"],  # Usar favoritos_ids del contexto común
     }
     context.update(
         common_context
     )  # Fusionar el contexto común con el contexto específico
 
-    # Obtener las variaciones del producto
-    variaciones = (
-        producto.variaciones.all()
-    )  # Corrected: use related_name 'variaciones'
-
-    # Preparar las variaciones para el contexto
-    context["variaciones"] = [
-        {
-            "id": var.id,
-            "tono": var.tono,
-            "color_hex": var.color_hex,
-            "imagen": var.imagen.url if var.imagen else "",
-            "precio_formateado": format_precio(
-                var.precio_final
-            ),  # Use var.precio_final
-        }
-        for var in variaciones
-    ]
+    # Variaciones del producto: la plantilla usa nombre, valor, color, imagen y
+    # precio_final, y las agrupa con {% regroup %} por nombre (deben ir ordenadas)
+    context["variaciones"] = sorted(
+        producto.variaciones.all(), key=lambda variacion: (variacion.nombre, variacion.id)
+    )
 
     # Renderiza la plantilla de detalle del producto.
     # Asegúrate de que 'store/producto.html' sea la ruta correcta a tu plantilla de detalle.
@@ -408,6 +507,8 @@ def producto_detalle(request, pk):
 def toggle_favorito(request):
     """
     Vista para añadir o quitar un producto de favoritos (basado en session_key).
+    Es la única escritura que crea la sesión; además actualiza la cookie firmada
+    que leen las páginas del catálogo.
     """
     if request.method == "POST":
         try:
@@ -430,9 +531,13 @@ def toggle_favorito(request):
                 session_key=session_key, producto_id=producto_id
             )
 
+            favoritos_ids = leer_favoritos(request)
+            producto_id = int(favorito.producto_id)
             if not created:
                 favorito.delete()
-                return JsonResponse(
+                favoritos_ids = [i for i in favoritos_ids if i != producto_id]
+                FAVORITOS.inc(action="removed")
+                response = JsonResponse(
                     {
                         "success": True,
                         "mensaje": "Producto eliminado de favoritos",
@@ -440,13 +545,17 @@ def toggle_favorito(request):
                     }
                 )
             else:
-                return JsonResponse(
+                # Al principio: el recorte de guardar_favoritos quita los más antiguos
+                favoritos_ids.insert(0, producto_id)
+                FAVORITOS.inc(action="added")
+                response = JsonResponse(
                     {
                         "success": True,
                         "mensaje": "Producto añadido a favoritos",
                         "is_favorito": True,
                     }
                 )
+            return guardar_favoritos(response, favoritos_ids)
 
         except json.JSONDecodeError:
             return JsonResponse({"error": "Formato JSON inválido"}, status=400)
@@ -486,7 +595,7 @@ def agregar_al_carrito(request):
                 "price": (
                     float(variante.precio_final)
                     if variante
-                    else float(producto.get_precio_final())
+                    else float(producto.precio_final)
                 ),
                 "quantity": int(quantity),
                 "variant_id": variante.id if variante else producto.id,
@@ -494,7 +603,7 @@ def agregar_al_carrito(request):
                     variante.color if variante else color
                 ),  # Preferir el color de la variante, si no, usar el color pasado
                 "imageUrl": (
-                    variante.imagen.url
+                    url_imagen(variante.imagen)
                     if variante and variante.imagen
                     else producto.get_primary_image_url()
                 ),
@@ -517,6 +626,7 @@ def agregar_al_carrito(request):
             request.session.modified = (
                 True  # Marca la sesión como modificada para que se guarde
             )
+            CARRITO.inc()
 
             return JsonResponse(
                 {
@@ -543,78 +653,50 @@ def ver_carrito(request):
     """
     Vista para mostrar el contenido del carrito de la sesión con detalles completos.
     """
-    raw_cart = request.session.get("cart", [])
+    # Líneas válidas del carrito (las que no tienen ID de producto se saltan)
+    raw_cart = [
+        item
+        for item in request.session.get("cart", [])
+        if str(item.get("id", "")).isdigit()
+    ]
     productos_carrito_detalles = []
 
-    for item in raw_cart:
-        try:
-            # Asegúrate de que los campos necesarios existen en el item del carrito
-            producto_id = item.get("id")
-            variant_id = item.get("variant_id")
-            quantity = item.get("quantity", 1)
-            item_color = item.get(
-                "color", "N/A"
-            )  # Obtener el color del item del carrito
+    # Todos los productos y variaciones del carrito en un solo lote (y desde la
+    # caché por producto), en lugar de dos consultas por línea
+    hidratados = hidratar((item["id"], item.get("variant_id")) for item in raw_cart)
 
-            if not producto_id:
-                continue  # Saltar si falta el ID del producto
+    for item, datos in zip(raw_cart, hidratados):
+        if datos is None:
+            continue  # El producto ya no existe: se omite la línea
 
-            producto = get_object_or_404(Producto, id=producto_id)
-            variante = None
+        try:
+            quantity = int(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            continue  # Cantidad corrupta en la sesión: se omite la línea
+        item_color = item.get("color", "N/A")  # Obtener el color del item del carrito
 
-            # Si hay un variant_id y es diferente al producto_id (indicando que es una variación real)
-            if variant_id and str(variant_id) != str(producto_id):
-                variante = Variacion.objects.filter(
-                    id=variant_id, producto=producto
-                ).first()
+        producto = datos["producto"]
+        variante = datos["variacion"]
+        final_price = datos["precio_final"]
 
-            # Determinar el precio y la imagen final
-            final_price = (
-                variante.precio_final if variante else producto.get_precio_final()
-            )
-            image_url = (
-                variante.imagen.url
-                if variante and variante.imagen
-                else producto.get_primary_image_url()
-            )
-
-            # Calcular el subtotal aquí
-            subtotal_item = final_price * Decimal(
-                quantity
-            )  # Usar Decimal para cálculos precisos
+        # Calcular el subtotal aquí
+        subtotal_item = final_price * Decimal(quantity)  # Usar Decimal para cálculos precisos
 
-            productos_carrito_detalles.append(
-                {
-                    "id": producto.id,
-                    "name": producto.nombre,
-                    "price": float(final_price),  # Asegurarse de que sea float para JS
-                    "quantity": int(quantity),
-                    "variant_id": variante.id if variante else producto.id,
-                    "color": (
-                        variante.color if variante else item_color
-                    ),  # Preferir el color de la variante, si no, usar el color del item
-                    "imageUrl": image_url,
-                    "price_formatted": format_precio(
-                        final_price
-                    ),  # Precio formateado para mostrar
-                    "subtotal": float(subtotal_item),  # Añadir el subtotal aquí
-                }
-            )
-        except Producto.DoesNotExist:
-            # Puedes añadir lógica para limpiar el carrito si un producto ya no existe
-            print(
-                f"Producto con ID {item.get('id')} no encontrado en la DB. Eliminando del carrito de sesión."
-            )
-            # Opcional: request.session['cart'].remove(item) - Requiere manejo cuidadoso de iteración
-            pass  # Continúa con el siguiente item si el producto no existe
-        except Variacion.DoesNotExist:
-            print(
-                f"Variación con ID {item.get('variant_id')} no encontrada para el producto {item.get('id')}. Continua."
-            )
-            pass
-        except Exception as e:
-            print(f"Error procesando item del carrito: {e}")
-            pass
+        productos_carrito_detalles.append(
+            {
+                "id": producto["id"],
+                "name": producto["nombre"],
+                "price": float(final_price),  # Asegurarse de que sea float para JS
+                "quantity": quantity,
+                "variant_id": variante["id"] if variante else producto["id"],
+                "color": (
+                    variante["color"] if variante else item_color
+                ),  # Preferir el color de la variante, si no, usar el color del item
+                "imageUrl": datos["imagen"],
+                "price_formatted": format_precio(final_price),  # Precio formateado para mostrar
+                "subtotal": float(subtotal_item),  # Añadir el subtotal aquí
+            }
+        )
 
     context = get_common_context(request)  # CAMBIO: Pasar request aquí
     context["carrito_detalles"] = productos_carrito_detalles  # Renombrado para claridad
@@ -626,28 +708,21 @@ def ver_favoritos(request):
     """
     context = get_common_context(request)
 
-    # Asegurarse de que exista clave de sesión
-    if not request.session.session_key:
-        request.session.save()
-
-    # Obtener los IDs de productos favoritos para esta sesión
-    favoritos_ids = set(
-        Favorito.objects.filter(session_key=request.session.session_key).values_list(
-            "producto_id", flat=True
-        )
-    )
+    # IDs de favoritos de la cookie firmada (no crea sesión)
+    favoritos_ids = leer_favoritos(request)
 
     # Obtener productos activos cuyos IDs estén en la lista de favoritos
-    favoritos_productos = Producto.objects.filter(id__in=favoritos_ids, is_active=True)
+    favoritos_productos = Producto.objects.para_listado().filter(
+        id__in=favoritos_ids, is_active=True
+    )
 
     context["favoritos_productos"] = favoritos_productos  # ✅ Pasar directamente instancias
     context["active_page"] = "favoritos"
-    return render(request, "store/favoritos.html", context)
+    response = render(request, "store/favoritos.html", context)
+    return sincronizar_cookie(request, response)
 
-#mostrar productos por etiqueta
-from django.shortcuts import render
-from .models import Producto
 
+#mostrar productos por etiqueta
 def productos_por_etiqueta(request, badge):
     """
     Vista para mostrar productos filtrados por etiqueta (badge).
@@ -659,7 +734,7 @@ def productos_por_etiqueta(request, badge):
         "oferta": "Ofertas Especiales",
     }
 
-    productos = Producto.objects.filter(badge=badge, is_active=True)
+    productos = Producto.objects.para_listado().filter(badge=badge, is_active=True)
 
     context = get_common_context(request)
     context.update({
@@ -673,19 +748,101 @@ def productos_por_etiqueta(request, badge):
 
 def api_favoritos(request):
     ids = request.GET.get("ids", "")
-    id_list = [int(i) for i in ids.split(",") if i.isdigit()]
-    productos = Producto.objects.filter(id__in=id_list)
+    # Acotado como la cookie de favoritos: una URL larga no dispara un lote enorme
+    id_list = list(dict.fromkeys(int(i) for i in ids.split(",") if i.isdigit()))[
+        :MAX_FAVORITOS
+    ]
+    # Un lote para todos los IDs (y caché por producto), no consultas por favorito
+    productos = productos_serializados(id_list)
 
     data = {
         "productos": [
             {
-                "id": p.id,
-                "nombre": p.nombre,
-                "precio": f"${p.get_precio_final():,.0f}",
-                "imagen": p.get_primary_image_url() or "/static/img/sin_imagen.jpg",
-                "url": p.get_absolute_url() if hasattr(p, "get_absolute_url") else f"/producto/{p.id}/"
+                "id": p["id"],
+                "nombre": p["nombre"],
+                "precio": f"${p['precio_final']:,.0f}",
+                "imagen": p["imagen"] or "/static/img/sin_imagen.jpg",
+                "url": p["url"],
             }
-            for p in productos
+            for p in (productos[pk] for pk in id_list if pk in productos)
         ]
     }
-    return JsonResponse(data)
\ No newline at end of file
+    return JsonResponse(data)
+
+
+def _entero(valor, defecto, maximo=None):
+    try:
+        numero = max(int(valor), 0)
+    except (TypeError, ValueError):
+        return defecto
+    return min(numero, maximo) if maximo is not None else numero
+
+
+def api_facetas(request):
+    """
+    Filtrado facetado del catálogo. Parámetros (repetibles dentro de una faceta):
+    categoria (ID, incluye subcategorías), badge, precio (clave de RANGOS_PRECIO),
+    color (HEX), tono, disponible=1 y q (búsqueda de texto completo). Devuelve los
+    IDs filtrados, paginados con offset/limite, y los conteos por valor de faceta.
+    """
+    indice = get_facet_index()
+
+    selecciones = {}
+    for faceta in FACETAS:
+        valores = [v.strip() for v in request.GET.getlist(faceta) if v.strip()]
+        if faceta == "categoria":
+            valores = [int(v) for v in valores if v.isdigit()]
+        elif faceta == "color":
+            valores = [v.upper() for v in valores]
+        if valores:
+            selecciones[faceta] = valores
+
+    base = None
+    query = request.GET.get("q", "").strip()
+    if query:
+        ids_busqueda = buscar(Producto.objects.activos(), query).values_list("id", flat=True)
+        base = indice.mascara_ids(ids_busqueda)
+
+    mascara, conteos = indice.filtrar(selecciones, base=base)
+    offset = _entero(request.GET.get("offset"), 0)
+    limite = _entero(request.GET.get("limite"), 48, maximo=200)
+
+    arbol = Categoria.objects.arbol()
+    etiquetas = {
+        "categoria": {
+            categoria_id: categoria.nombre for categoria_id, categoria in arbol.por_id.items()
+        },
+        "badge": dict(Producto.BADGE_CHOICES),
+        "precio": {
+            clave: f"{format_precio(minimo)} - {format_precio(maximo)}"
+            if maximo is not None
+            else f"Desde {format_precio(minimo)}"
+            for clave, minimo, maximo in RANGOS_PRECIO
+        },
+        "disponible": {"1": "Disponible"},
+    }
+
+    facetas = {}
+    for faceta, por_valor in conteos.items():
+        nombres = etiquetas.get(faceta, {})
+        facetas[faceta] = sorted(
+            (
+                {
+                    "valor": valor,
+                    "etiqueta": nombres.get(valor, valor),
+                    "total": total,
+                    "seleccionado": valor in selecciones.get(faceta, ()),
+                }
+                for valor, total in por_valor.items()
+            ),
+            key=lambda item: (-item["total"], str(item["etiqueta"])),
+        )
+
+    return JsonResponse(
+        {
+            "exito": True,
+            "total": mascara.bit_count(),
+            "ids": indice.ids_de(mascara, offset=offset, limite=limite),
+            "facetas": facetas,
+        }
+    )